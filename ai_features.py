@@ -2,101 +2,48 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
-from database import Database
+from database import (
+    Database, CensusModel, DiseaseAggregator, PatientModel, PatientRiskModel, WardModel,
+    versioned_cache
+)
+from cache import single_flight
+from config import Config
+from analytics_snapshot import snapshot_analytics
+from forecasting import occupancy_forecaster
+from risk_model import readmission_model
+import risk_scoring
 import json
 
 class HealthAI:
     """AI-powered health analytics and predictions"""
     
     @staticmethod
+    def _from_snapshot(name):
+        """Aggregate ``name`` from the Parquet snapshot, or None to query live"""
+        if Config.ANALYTICS_SOURCE != 'snapshot':
+            return None
+        return snapshot_analytics.compute(name)
+    
+    @staticmethod
+    @single_flight
     def predict_patient_risk(patient_id):
         """
         Predict patient risk level based on medical history and current condition
         Returns: risk_score (0-100), risk_level (Low/Medium/High), recommendations
         """
         try:
-            # Get patient data
-            query = """
-                SELECT p.age, p.gender, 
-                       COUNT(DISTINCT mh.history_id) as history_count,
-                       COUNT(DISTINCT pr.report_id) as admission_count
-                FROM patient p
-                LEFT JOIN medicalhistory mh ON p.patient_id = mh.patient_id
-                LEFT JOIN patientreport pr ON p.patient_id = pr.patient_id
-                WHERE p.patient_id = %s
-                GROUP BY p.patient_id
-            """
-            result = Database.execute_query(query, (patient_id,))
+            # Precomputed and kept current by PatientRiskModel on every write
+            risk = PatientRiskModel.get(patient_id)
             
-            if not result:
+            if not risk:
                 return {'risk_score': 0, 'risk_level': 'Unknown', 'recommendations': []}
             
-            data = result[0]
-            age = data['age'] or 30
-            history_count = data['history_count'] or 0
-            admission_count = data['admission_count'] or 0
-            
-            # Simple risk scoring algorithm
-            risk_score = 0
-            
-            # Age factor (0-30 points)
-            if age > 70:
-                risk_score += 30
-            elif age > 60:
-                risk_score += 20
-            elif age > 50:
-                risk_score += 10
-            elif age < 5:
-                risk_score += 15
-            
-            # Medical history factor (0-35 points)
-            risk_score += min(history_count * 5, 35)
-            
-            # Admission history factor (0-35 points)
-            risk_score += min(admission_count * 7, 35)
-            
-            # Determine risk level
-            if risk_score >= 70:
-                risk_level = 'High'
-                color = 'danger'
-            elif risk_score >= 40:
-                risk_level = 'Medium'
-                color = 'warning'
-            else:
-                risk_level = 'Low'
-                color = 'success'
-            
-            # Generate recommendations
-            recommendations = []
-            if risk_score >= 70:
-                recommendations.append('Immediate medical attention recommended')
-                recommendations.append('Consider ICU monitoring')
-                recommendations.append('Frequent vital signs monitoring required')
-            elif risk_score >= 40:
-                recommendations.append('Regular medical check-ups advised')
-                recommendations.append('Monitor for any symptom changes')
-                recommendations.append('Maintain prescribed medication schedule')
-            else:
-                recommendations.append('Maintain healthy lifestyle')
-                recommendations.append('Annual check-up recommended')
-                recommendations.append('Continue preventive care')
-            
-            if age > 65:
-                recommendations.append('Age-specific health screening advised')
-            
-            return {
-                'risk_score': min(risk_score, 100),
-                'risk_level': risk_level,
-                'color': color,
-                'recommendations': recommendations,
-                'factors': {
-                    'age': age,
-                    'history_count': history_count,
-                    'admission_count': admission_count
-                }
-            }
+            result = risk_scoring.describe(
+                risk['risk_score'], risk['age'], risk['history_count'], risk['admission_count']
+            )
+            # Trained model's view, when one has been trained and the patient was admitted
+            result['readmission'] = readmission_model.predict([patient_id]).get(patient_id)
+            return result
         except Exception as e:
             print(f"Error in predict_patient_risk: {e}")
             return {
@@ -108,64 +55,91 @@ class HealthAI:
             }
     
     @staticmethod
-    def predict_bed_occupancy(days_ahead=7):
+    def predict_patient_risk_batch(patient_ids):
+        """
+        Risk for many patients in one query. Returns one entry per requested
+        id, in request order, with the same fields as predict_patient_risk()
+        plus the points each factor contributed.
+        """
+        ids = list(dict.fromkeys(int(pid) for pid in patient_ids))
+        if not ids:
+            return []
+        
+        # Stored rows; patients without one are scored together (vectorised,
+        # see PatientRiskModel._score) and stored
+        rows = PatientRiskModel.get_many(ids)
+        found = [pid for pid in ids if pid in rows]
+        points = risk_scoring.score_arrays(
+            [rows[pid]['age'] for pid in found],
+            [rows[pid]['history_count'] for pid in found],
+            [rows[pid]['admission_count'] for pid in found]
+        )
+        readmissions = readmission_model.predict(found)
+        
+        scored = {}
+        for i, pid in enumerate(found):
+            row = rows[pid]
+            result = risk_scoring.describe(
+                row['risk_score'], row['age'], row['history_count'], row['admission_count']
+            )
+            result['patient_id'] = pid
+            result['breakdown'] = {
+                'age': int(points['age'][i]),
+                'medical_history': int(points['medical_history'][i]),
+                'admissions': int(points['admissions'][i])
+            }
+            result['readmission'] = readmissions.get(pid)
+            scored[pid] = result
+        
+        unknown = {'risk_score': 0, 'risk_level': 'Unknown', 'color': 'secondary',
+                   'recommendations': [], 'factors': {}, 'breakdown': {}, 'readmission': None}
+        return [scored.get(pid, dict(unknown, patient_id=pid)) for pid in ids]
+    
+    @staticmethod
+    @single_flight
+    def predict_bed_occupancy(days_ahead=7, ward='general'):
         """
         Predict bed occupancy for next N days
-        Returns: list of predicted occupancy rates
+        Returns: list of predicted census counts and occupancy rates
         """
         try:
-            # Get historical admission data
-            query = """
-                SELECT DATE(in_date_time) as date, COUNT(*) as admissions
-                FROM patientreport
-                WHERE in_date_time >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-                GROUP BY DATE(in_date_time)
-                ORDER BY date
-            """
-            historical_data = Database.execute_query(query)
-            
-            if not historical_data or len(historical_data) < 7:
-                # Not enough data, return default predictions
-                return [{'date': (datetime.now() + timedelta(days=i)).strftime('%Y-%m-%d'), 
-                        'predicted_occupancy': 65 + (i * 2)} for i in range(days_ahead)]
-            
-            # Calculate average and trend
-            admissions = [d['admissions'] for d in historical_data]
-            avg_admissions = np.mean(admissions)
-            
-            # Simple linear trend
-            if len(admissions) > 1:
-                trend = (admissions[-1] - admissions[0]) / len(admissions)
-            else:
-                trend = 0
-            
-            # Generate predictions
-            predictions = []
-            total_beds = 50  # Assuming 50 general ward beds
-            
-            for i in range(days_ahead):
-                predicted_admissions = avg_admissions + (trend * i)
-                predicted_occupancy = (predicted_admissions / total_beds) * 100
-                predicted_occupancy = min(max(predicted_occupancy, 40), 95)  # Clamp between 40-95%
-                
-                predictions.append({
-                    'date': (datetime.now() + timedelta(days=i+1)).strftime('%Y-%m-%d'),
-                    'predicted_occupancy': round(predicted_occupancy, 1),
-                    'predicted_count': round(predicted_admissions)
-                })
-            
-            return predictions
+            # Seasonal model over the daily census, see forecasting.py
+            return occupancy_forecaster.forecast(ward, days_ahead)
         except Exception as e:
             print(f"Error in predict_bed_occupancy: {e}")
-            return [{'date': (datetime.now() + timedelta(days=i)).strftime('%Y-%m-%d'), 
-                    'predicted_occupancy': 65} for i in range(days_ahead)]
+            return []
     
     @staticmethod
-    def analyze_disease_patterns():
+    def analyze_disease_patterns(days=None, months=None):
         """
-        Analyze common disease patterns from medical history
+        Analyze common disease patterns from medical history, overall or over
+        the last ``days`` days / ``months`` months
         Returns: top diseases and their frequencies
         """
+        try:
+            # Served from the in-memory counters (see DiseaseAggregator)
+            results = DiseaseAggregator.top(10, days=days, months=months)
+        except Exception as e:
+            print(f"Disease counters unavailable, querying live: {e}")
+            return [] if days or months else HealthAI._disease_patterns_live()
+        
+        total = sum(r['frequency'] for r in results)
+        return [{
+            'disease': result['disease'],
+            'frequency': result['frequency'],
+            'percentage': round((result['frequency'] / total) * 100, 1) if total > 0 else 0,
+            'avg_age': int(result['avg_age'] + 0.5) if result['avg_age'] else 0
+        } for result in results]
+    
+    @staticmethod
+    @versioned_cache('medicalhistory', 'patient')
+    @single_flight
+    def _disease_patterns_live():
+        """analyze_disease_patterns() as one aggregate query"""
+        snapshot = HealthAI._from_snapshot('disease_patterns')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT mh.disease, COUNT(*) as frequency,
@@ -195,12 +169,18 @@ class HealthAI:
             
             return patterns
         except Exception as e:
-            print(f"Error in analyze_disease_patterns: {e}")
+            print(f"Error in _disease_patterns_live: {e}")
             return []
     
     @staticmethod
+    @versioned_cache('patient')
+    @single_flight
     def get_age_wise_distribution():
         """Get age-wise patient distribution"""
+        snapshot = HealthAI._from_snapshot('age_distribution')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT 
@@ -230,8 +210,14 @@ class HealthAI:
             return []
     
     @staticmethod
+    @versioned_cache('patient')
+    @single_flight
     def get_gender_distribution():
         """Get gender-wise patient distribution"""
+        snapshot = HealthAI._from_snapshot('gender_distribution')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT gender, COUNT(*) as count
@@ -244,8 +230,14 @@ class HealthAI:
             return []
     
     @staticmethod
+    @versioned_cache('patientreport', daily=True)
+    @single_flight
     def get_monthly_admissions():
         """Get monthly admission trends"""
+        snapshot = HealthAI._from_snapshot('monthly_admissions')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT 
@@ -262,8 +254,14 @@ class HealthAI:
             return []
     
     @staticmethod
+    @versioned_cache('ot')
+    @single_flight
     def get_operation_statistics():
         """Get operation theatre statistics"""
+        snapshot = HealthAI._from_snapshot('operation_statistics')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT 
@@ -278,8 +276,14 @@ class HealthAI:
             return []
     
     @staticmethod
+    @versioned_cache('staff', 'staffrole', 'opdappointment', 'ot_staff_assignment')
+    @single_flight
     def get_staff_workload():
         """Analyze staff workload"""
+        snapshot = HealthAI._from_snapshot('staff_workload')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT 
@@ -303,8 +307,14 @@ class HealthAI:
             return []
     
     @staticmethod
+    @versioned_cache('patientreport')
+    @single_flight
     def get_average_stay_duration():
         """Calculate average hospital stay duration"""
+        snapshot = HealthAI._from_snapshot('average_stay_duration')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT 
@@ -320,8 +330,14 @@ class HealthAI:
             return 0
     
     @staticmethod
+    @versioned_cache('patientreport')
+    @single_flight
     def get_readmission_rate():
         """Calculate patient readmission rate"""
+        snapshot = HealthAI._from_snapshot('readmission_rate')
+        if snapshot is not None:
+            return snapshot
+        
         try:
             query = """
                 SELECT 
@@ -447,64 +463,37 @@ class HealthAI:
         return duration_map['default']
     
     @staticmethod
+    @single_flight
     def generate_health_insights(patient_id):
         """
         Generate comprehensive health insights for a patient
         """
         try:
             # Get patient basic info
-            patient_query = "SELECT * FROM patient WHERE patient_id = %s"
-            patient = Database.execute_query(patient_query, (patient_id,))
+            patient = PatientModel.get_patient_by_id(patient_id)
             
             if not patient:
                 return None
             
-            patient = patient[0]
-            
-            # Get medical history
-            history_query = """
-                SELECT COUNT(*) as total_visits,
-                       MAX(date_time) as last_visit
-                FROM medicalhistory
-                WHERE patient_id = %s
-            """
-            history = Database.execute_query(history_query, (patient_id,))[0]
-            
-            # Get admission history
-            admission_query = """
-                SELECT COUNT(*) as total_admissions,
-                       MAX(in_date_time) as last_admission
-                FROM patientreport
-                WHERE patient_id = %s
-            """
-            admissions = Database.execute_query(admission_query, (patient_id,))[0]
-            
-            # Calculate health score (0-100)
-            health_score = 100
-            age = patient['age'] or 30
-            
-            if age > 70:
-                health_score -= 15
-            elif age > 60:
-                health_score -= 10
-            
-            health_score -= min(history['total_visits'] * 3, 30)
-            health_score -= min(admissions['total_admissions'] * 5, 25)
-            health_score = max(health_score, 40)
+            # Visit/admission counts and the health score are precomputed
+            risk = PatientRiskModel.get(patient_id)
+            if not risk:
+                return None
             
             return {
                 'patient': patient,
-                'health_score': health_score,
-                'total_visits': history['total_visits'],
-                'total_admissions': admissions['total_admissions'],
-                'last_visit': history['last_visit'],
-                'last_admission': admissions['last_admission']
+                'health_score': risk['health_score'],
+                'total_visits': risk['history_count'],
+                'total_admissions': risk['admission_count'],
+                'last_visit': risk['last_visit'],
+                'last_admission': risk['last_admission']
             }
         except Exception as e:
             print(f"Error generating health insights: {e}")
             return None
     
     @staticmethod
+    @single_flight
     def get_resource_optimization_suggestions():
         """
         AI-powered suggestions for resource optimization
@@ -513,11 +502,10 @@ class HealthAI:
         
         try:
             # Check bed utilization
-            ward_query = "SELECT COUNT(*) as occupied FROM generalward WHERE patient_id IS NOT NULL"
-            ward_result = Database.execute_query(ward_query)
-            occupied = ward_result[0]['occupied'] if ward_result else 0
-            total_beds = 50
-            utilization = (occupied / total_beds) * 100
+            census = CensusModel.get_all()
+            occupied = census['general_ward_occupied']
+            total_beds = WardModel.get_general_ward_capacity()
+            utilization = min(occupied / total_beds, 1) * 100
             
             if utilization > 90:
                 suggestions.append({
@@ -535,9 +523,7 @@ class HealthAI:
                 })
             
             # Check pending operations
-            ot_query = "SELECT COUNT(*) as pending FROM ot WHERE status = 'Scheduled'"
-            ot_result = Database.execute_query(ot_query)
-            pending = ot_result[0]['pending'] if ot_result else 0
+            pending = census['scheduled_operations']
             
             if pending > 10:
                 suggestions.append({
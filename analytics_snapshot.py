@@ -0,0 +1,404 @@
+# analytics_snapshot.py
+# Columnar (Parquet) snapshot of the OLTP tables and the analytics computed over it
+
+import json
+import math
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cache import TTLSnapshot
+from config import Config
+from database import Database, DataVersion
+
+# Exported tables: primary key used as the watermark, whether the table is
+# always exported whole (small tables, and those whose rows are edited after
+# they are written), the tables whose deletes may cascade into it, an optional
+# test for rows that are still "open" and may be updated (re-exported on every
+# run until they close), and the columns the analytics need (names and
+# contact details stay behind)
+TABLES = {
+    'patient': {
+        'key': 'patient_id',
+        'whole': True,
+        'schema': pa.schema([('patient_id', pa.int64()), ('age', pa.int32()), ('gender', pa.string())])
+    },
+    'medicalhistory': {
+        'key': 'history_id',
+        'parents': ('patient',),
+        'schema': pa.schema([('history_id', pa.int64()), ('patient_id', pa.int64()),
+                             ('date_time', pa.timestamp('s')), ('disease', pa.string())])
+    },
+    'patientreport': {
+        'key': 'report_id',
+        'parents': ('patient',),
+        # Until discharged, when out_date_time is set
+        'open': lambda row: row['out_date_time'] is None,
+        'schema': pa.schema([('report_id', pa.int64()), ('patient_id', pa.int64()),
+                             ('diagnosis', pa.string()), ('in_date_time', pa.timestamp('s')),
+                             ('out_date_time', pa.timestamp('s'))])
+    },
+    'opdappointment': {
+        'key': 'app_id',
+        'parents': ('patient', 'staff'),
+        'schema': pa.schema([('app_id', pa.int64()), ('patient_id', pa.int64()),
+                             ('staff_id', pa.int64()), ('appointment_date', pa.timestamp('s'))])
+    },
+    'ot': {
+        'key': 'ot_id',
+        'whole': True,
+        'parents': ('patient',),
+        'schema': pa.schema([('ot_id', pa.int64()), ('patient_id', pa.int64()),
+                             ('date', pa.timestamp('s')), ('procedure_name', pa.string()),
+                             ('status', pa.string())])
+    },
+    'staff': {
+        'key': 'staff_id',
+        'whole': True,
+        'schema': pa.schema([('staff_id', pa.int64()), ('name', pa.string()), ('role_id', pa.int64())])
+    },
+    # Small lookup tables the staff workload report joins
+    'staffrole': {
+        'key': 'role_id',
+        'whole': True,
+        'schema': pa.schema([('role_id', pa.int64()), ('role_name', pa.string())])
+    },
+    'ot_staff_assignment': {
+        'key': None,
+        'whole': True,
+        'parents': ('ot', 'staff'),
+        'schema': pa.schema([('ot_id', pa.int64()), ('staff_id', pa.int64())])
+    }
+}
+
+MANIFEST = 'manifest.json'
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(path, manifest):
+    # Write then rename, so readers never see a half-written manifest
+    manifest_path = os.path.join(path, MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def _write_part(path, table, part, query, params=()):
+    """
+    Stream a query's rows into one zstd-compressed Parquet file. Returns the
+    file name, row count, largest key and the keys of rows still open.
+    """
+    spec = TABLES[table]
+    schema = spec['schema']
+    filename = f"{table}/part-{part:06d}.parquet"
+    os.makedirs(os.path.join(path, table), exist_ok=True)
+    rows = 0
+    max_key = None
+    open_keys = []
+    batch = []
+    with pq.ParquetWriter(os.path.join(path, filename), schema, compression='zstd') as writer:
+        for row in Database.stream_query(query, params):
+            batch.append(row)
+            if len(batch) >= Config.DB_STREAM_BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                rows += len(batch)
+                batch = []
+            if spec['key'] and (max_key is None or row[spec['key']] > max_key):
+                max_key = row[spec['key']]
+            if spec.get('open') and spec['open'](row):
+                open_keys.append(row[spec['key']])
+        if batch or rows == 0:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            rows += len(batch)
+    return filename, rows, max_key, open_keys
+
+
+def _write_keys(path, table, part):
+    """Write the primary keys the table holds now; returns the file name"""
+    key = TABLES[table]['key']
+    schema = pa.schema([TABLES[table]['schema'].field(key)])
+    filename = f"{table}/keys-{part:06d}.parquet"
+    with pq.ParquetWriter(os.path.join(path, filename), schema, compression='zstd') as writer:
+        batch = []
+        for row in Database.stream_query(f"SELECT {key} FROM {table}"):
+            batch.append(row)
+            if len(batch) >= Config.DB_STREAM_BATCH_SIZE:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                batch = []
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    return filename
+
+
+def export(path=None, full=False):
+    """
+    Bring the snapshot under ``path`` up to date and return its manifest.
+
+    A table whose data version (and its parents') has not moved since the
+    last run is skipped, unless its periodic full rewrite is due. Tables marked ``whole`` are rewritten. Otherwise rows
+    past the table's primary-key watermark, plus the rows that were still
+    open at the last export, are appended as a new part, and the table's
+    current key set is written alongside; readers keep the last copy of each
+    key and drop keys that are no longer present (deleted rows). Each table
+    is rewritten in full every ANALYTICS_SNAPSHOT_FULL_HOURS, or when it has
+    more than ANALYTICS_SNAPSHOT_MAX_PARTS parts.
+    """
+    path = path or Config.ANALYTICS_SNAPSHOT_PATH
+    os.makedirs(path, exist_ok=True)
+    manifest = _read_manifest(path) or {'generation': 0, 'tables': {}}
+    started = datetime.now().replace(microsecond=0)
+    stale_files = []
+
+    for table, spec in TABLES.items():
+        state = manifest['tables'].get(table)
+        version = list(DataVersion.get((table,) + spec.get('parents', ())))
+        # Deletes and updates made outside the app do not move the version,
+        # so the periodic full rewrite runs whether or not it has changed
+        periodic_due = (state is not None and started - datetime.fromisoformat(state['full_at'])
+                        >= timedelta(hours=Config.ANALYTICS_SNAPSHOT_FULL_HOURS))
+        if state is not None and state['version'] == version and not (full or periodic_due):
+            continue
+
+        columns = ', '.join(spec['schema'].names)
+        part = state['next_part'] if state else 0
+        full_due = (full or periodic_due or state is None or spec.get('whole')
+                    or len(state['parts']) >= Config.ANALYTICS_SNAPSHOT_MAX_PARTS)
+        if full_due:
+            filename, rows, max_key, open_keys = _write_part(
+                path, table, part, f"SELECT {columns} FROM {table}"
+            )
+            if state is not None:
+                stale_files.extend(state['parts'])
+                if state.get('keys'):
+                    stale_files.append(state['keys'])
+            state = {'parts': [filename], 'rows_written': rows, 'watermark': max_key,
+                     'full_at': started.isoformat()}
+        else:
+            query = f"SELECT {columns} FROM {table} WHERE {spec['key']} > %s"
+            params = [state['watermark'] or 0]
+            if state.get('open_keys'):
+                query += f" OR {spec['key']} IN ({', '.join(['%s'] * len(state['open_keys']))})"
+                params.extend(state['open_keys'])
+            filename, rows, max_key, open_keys = _write_part(
+                path, table, part, query + f" ORDER BY {spec['key']}", tuple(params)
+            )
+            if rows:
+                state['parts'].append(filename)
+                state['rows_written'] += rows
+            else:
+                # Only updates to columns without a watermark; nothing to add
+                os.remove(os.path.join(path, filename))
+            if max_key is not None and max_key > (state['watermark'] or 0):
+                state['watermark'] = max_key
+            if state.get('keys'):
+                stale_files.append(state['keys'])
+            state['keys'] = _write_keys(path, table, part)
+        if spec.get('open'):
+            state['open_keys'] = open_keys
+        state['version'] = version
+        state['next_part'] = part + 1
+        state['exported_at'] = started.isoformat()
+        manifest['tables'][table] = state
+
+    manifest['generation'] += 1
+    manifest['exported_at'] = started.isoformat()
+    _write_manifest(path, manifest)
+    # Old parts go only after the manifest stops naming them
+    for filename in stale_files:
+        try:
+            os.remove(os.path.join(path, filename))
+        except OSError:
+            pass
+    return manifest
+
+
+def _mysql_round(value):
+    """ROUND(x, 0) as MySQL does it (halves away from zero)"""
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1)
+
+
+def _records(frame):
+    """DataFrame rows as dicts of plain Python values (jsonify-able)"""
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [{key: (value.item() if hasattr(value, 'item') else value) for key, value in row.items()}
+            for row in frame.to_dict('records')]
+
+
+class SnapshotAnalytics:
+    """
+    The HealthAI aggregates computed with pandas over the Parquet snapshot.
+
+    Parts are read memory-mapped and each table is loaded once per snapshot
+    generation; the manifest is re-checked at most every
+    ``ANALYTICS_SNAPSHOT_RELOAD`` seconds. Each method returns the same shape
+    as its live-query counterpart in ai_features.py, or None when there is no
+    snapshot yet so the caller can fall back to the database.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._manifest = TTLSnapshot(Config.ANALYTICS_SNAPSHOT_RELOAD)
+        self._lock = threading.Lock()
+        self._generation = None
+        self._frames = {}
+
+    def _table(self, name):
+        manifest = self._manifest.get(lambda: _read_manifest(self.path))
+        if manifest is None or name not in manifest['tables']:
+            return None
+        with self._lock:
+            if self._generation != manifest['generation']:
+                self._frames = {}
+                self._generation = manifest['generation']
+            frame = self._frames.get(name)
+            if frame is None:
+                state = manifest['tables'][name]
+                parts = [pq.read_table(os.path.join(self.path, part), memory_map=True)
+                         for part in state['parts']]
+                frame = pa.concat_tables(parts).to_pandas()
+                key = TABLES[name]['key']
+                if key and len(parts) > 1:
+                    # Rows re-exported after an update: the newest copy wins
+                    frame = frame.drop_duplicates(key, keep='last').reset_index(drop=True)
+                if state.get('keys'):
+                    # Rows deleted since they were exported
+                    keys = pq.read_table(os.path.join(self.path, state['keys']))[key].to_pandas()
+                    frame = frame[frame[key].isin(keys)].reset_index(drop=True)
+                self._frames[name] = frame
+            return frame
+
+    def compute(self, name):
+        """Result of the analytic ``name`` (a method of this class), None if unavailable"""
+        try:
+            return getattr(self, name)()
+        except Exception as e:
+            print(f"Snapshot analytics '{name}' failed, using live queries: {e}")
+            return None
+
+    def disease_history(self):
+        """
+        Medical history rows with the patient's age, in history_id order, as
+        DiseaseAggregator reads them from the database; None without a snapshot
+        """
+        history = self._table('medicalhistory')
+        patients = self._table('patient')
+        if history is None or patients is None:
+            return None
+        history = history[history['disease'].notna() & (history['disease'] != '')]
+        history = history.sort_values('history_id', kind='stable')
+        ages = history['patient_id'].map(patients.set_index('patient_id')['age'])
+        return ({
+            'history_id': int(history_id),
+            'disease': disease,
+            'date_time': None if pd.isna(when) else when.to_pydatetime(),
+            'age': None if pd.isna(age) else int(age)
+        } for history_id, disease, when, age in zip(
+            history['history_id'], history['disease'], history['date_time'], ages))
+
+    def disease_patterns(self):
+        history = self._table('medicalhistory')
+        patients = self._table('patient')
+        if history is None or patients is None:
+            return None
+        history = history[history['disease'].notna() & (history['disease'] != '')]
+        if history.empty:
+            return []
+        ages = history['patient_id'].map(patients.set_index('patient_id')['age'])
+        grouped = pd.DataFrame({'disease': history['disease'], 'age': ages}).groupby('disease')
+        top = pd.DataFrame({'frequency': grouped.size(), 'avg_age': grouped['age'].mean()})
+        top = top.sort_values('frequency', ascending=False, kind='stable').head(10)
+        total = int(top['frequency'].sum())
+        return [{
+            'disease': disease,
+            'frequency': int(row['frequency']),
+            'percentage': round(float(row['frequency']) / total * 100, 1) if total > 0 else 0,
+            'avg_age': _mysql_round(row['avg_age']) if pd.notna(row['avg_age']) else 0
+        } for disease, row in top.iterrows()]
+
+    def age_distribution(self):
+        patients = self._table('patient')
+        if patients is None:
+            return None
+        labels = ['0-17', '18-30', '31-45', '46-60']
+        # NULL ages fall into the last group, as in the SQL CASE
+        groups = pd.cut(patients['age'], bins=[-math.inf, 17, 30, 45, 60], labels=labels)
+        groups = groups.cat.add_categories('60+').fillna('60+')
+        counts = groups.value_counts()
+        return [{'age_group': group, 'count': int(counts[group])}
+                for group in labels + ['60+'] if counts.get(group, 0)]
+
+    def gender_distribution(self):
+        patients = self._table('patient')
+        if patients is None:
+            return None
+        counts = patients.groupby('gender', dropna=False).size().reset_index(name='count')
+        return _records(counts)
+
+    def monthly_admissions(self):
+        reports = self._table('patientreport')
+        if reports is None:
+            return None
+        since = pd.Timestamp.today().normalize() - pd.DateOffset(months=6)
+        admitted = reports.loc[reports['in_date_time'] >= since, 'in_date_time']
+        counts = admitted.dt.strftime('%Y-%m').value_counts().sort_index()
+        return [{'month': month, 'admissions': int(count)} for month, count in counts.items()]
+
+    def operation_statistics(self):
+        operations = self._table('ot')
+        if operations is None:
+            return None
+        counts = operations.groupby('status', dropna=False).size().reset_index(name='count')
+        return _records(counts)
+
+    def staff_workload(self):
+        staff = self._table('staff')
+        roles = self._table('staffrole')
+        appointments = self._table('opdappointment')
+        assignments = self._table('ot_staff_assignment')
+        if any(frame is None for frame in (staff, roles, appointments, assignments)):
+            return None
+        opd = appointments.groupby('staff_id')['app_id'].nunique()
+        ot = assignments.groupby('staff_id')['ot_id'].nunique()
+        workload = staff.merge(roles, on='role_id', how='left')
+        workload['opd_count'] = workload['staff_id'].map(opd).fillna(0).astype(int)
+        workload['ot_count'] = workload['staff_id'].map(ot).fillna(0).astype(int)
+        workload['total_workload'] = workload['opd_count'] + workload['ot_count']
+        workload = workload.sort_values('total_workload', ascending=False, kind='stable').head(10)
+        return _records(workload.rename(columns={'name': 'staff_name'})[
+            ['staff_name', 'role_name', 'opd_count', 'ot_count', 'total_workload']
+        ])
+
+    def average_stay_duration(self):
+        reports = self._table('patientreport')
+        if reports is None:
+            return None
+        discharged = reports[reports['out_date_time'].notna() & reports['in_date_time'].notna()]
+        # DATEDIFF counts calendar days
+        days = (discharged['out_date_time'].dt.normalize()
+                - discharged['in_date_time'].dt.normalize()).dt.days
+        average = days.mean()
+        return round(float(average), 1) if pd.notna(average) and average else 0
+
+    def readmission_rate(self):
+        reports = self._table('patientreport')
+        if reports is None:
+            return None
+        total_patients = reports['patient_id'].nunique()
+        if total_patients == 0:
+            return 0
+        rate = (len(reports) - total_patients) / total_patients * 100
+        return round(max(0, rate), 1)
+
+
+# Initialize global instance
+snapshot_analytics = SnapshotAnalytics(Config.ANALYTICS_SNAPSHOT_PATH)
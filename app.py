@@ -1,40 +1,254 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from datetime import datetime
+from flask import (
+    Flask, render_template, request, jsonify, redirect, url_for, flash, g,
+    has_request_context, Response, stream_with_context, session
+)
+from datetime import datetime, date, timezone
 from database import (
-    PatientModel, MedicalHistoryModel, PatientReportModel, 
-    OPDModel, StaffModel, OTModel, WardModel, DashboardModel
+    Database, DatabaseSession, DataVersion, PatientModel, MedicalHistoryModel, PatientReportModel, 
+    OPDModel, StaffModel, OTModel, WardModel, DashboardModel, CensusModel, PatientRiskModel
 )
 from ai_features import HealthAI
+from forecasting import WARD_TYPES
 from gemini_ai import gemini_ai
+import risk_model
+import analytics_snapshot
+from cache import LRUCache, MISSING, single_flight_stats
+from query_stats import QueryStats
 from config import Config
+import click
+import csv
+import functools
+import hashlib
+import hmac
+import io
 import json
+import time
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# ==================== DATABASE SESSION ====================
+def get_db_session():
+    """Request-scoped unit of work shared by every model call in the request"""
+    if not has_request_context():
+        return None
+    if 'db_session' not in g:
+        # Read-your-writes: a user who just wrote reads from the primary
+        # until replicas have had time to catch up.
+        sticky = time.time() < session.get('db_primary_until', 0)
+        g.db_session = DatabaseSession(sticky=sticky)
+    return g.db_session
+
+Database.set_session_provider(get_db_session)
+
+@app.after_request
+def commit_db_session(response):
+    """Commit the request's writes, or roll them back on an error response"""
+    db_session = g.get('db_session')
+    if db_session is not None:
+        if response.status_code < 400:
+            db_session.commit()
+            if db_session.wrote and not db_session.failed:
+                session['db_primary_until'] = time.time() + Config.DB_STICKY_PRIMARY_SECONDS
+        else:
+            db_session.rollback()
+    return response
+
+@app.teardown_request
+def close_db_session(exc):
+    """Release the request's connection back to the pool"""
+    db_session = g.pop('db_session', None)
+    if db_session is not None:
+        db_session.close()
+
+# Keep the census counters honest against writes made outside the models
+CensusModel.start_reconciler()
+
+# Warm the staff/role reference data so the first OPD page is served from memory
+try:
+    StaffModel.load_reference_data()
+except Exception as e:
+    print(f"Could not preload staff reference data: {e}")
+
+@app.cli.command('reconcile-census')
+def reconcile_census():
+    """Recount the census counters from their source tables"""
+    for name, value in CensusModel.reconcile().items():
+        print(f"{name}: {value}")
+
+@app.cli.command('rebuild-patient-risk')
+def rebuild_patient_risk():
+    """Recompute the precomputed risk score of every patient"""
+    started = time.monotonic()
+    written = PatientRiskModel.rebuild()
+    print(f"Rebuilt risk for {written} patients in {time.monotonic() - started:.1f}s")
+
+@app.cli.command('backfill-patient-risk')
+def backfill_patient_risk():
+    """Score existing patients once, after the patient_risk table is created"""
+    started = time.monotonic()
+    written = PatientRiskModel.backfill()
+    if written:
+        print(f"Scored {written} patients in {time.monotonic() - started:.1f}s")
+    else:
+        print("patient_risk is already populated; use rebuild-patient-risk to recompute it")
+
+@app.cli.command('train-risk-model')
+def train_risk_model():
+    """Train and save a new version of the readmission model"""
+    started = time.monotonic()
+    manifest = risk_model.train()
+    if manifest is None:
+        return
+    print(f"Saved readmission model {manifest['version']} in {time.monotonic() - started:.1f}s")
+    print(json.dumps(manifest['metrics'], indent=2))
+    print("Restart the app workers to serve the new version")
+
+@app.cli.command('export-analytics-snapshot')
+@click.option('--full', is_flag=True, help='Rewrite every table instead of appending changes')
+def export_analytics_snapshot(full):
+    """Export the analytics tables to the Parquet snapshot"""
+    started = time.monotonic()
+    manifest = analytics_snapshot.export(full=full)
+    for table, state in manifest['tables'].items():
+        print(f"{table}: {len(state['parts'])} parts, watermark {state['watermark']}")
+    print(f"Snapshot generation {manifest['generation']} written in {time.monotonic() - started:.1f}s")
+
 # Error handler
 @app.errorhandler(Exception)
 def handle_error(error):
     app.logger.error(f"Error: {str(error)}")
     return jsonify({'error': str(error)}), 500
 
+# ==================== CONDITIONAL GET ====================
+def _http_date(value):
+    """Database DATETIME (server local time) to a UTC datetime for Last-Modified"""
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+def conditional_get(*tables, daily=False):
+    """
+    ETag / Last-Modified support for JSON endpoints whose payload depends only
+    on ``tables`` and the query string. The ETag is computed from the tables'
+    data versions, so a matching If-None-Match is answered with 304 before
+    the view (and its model calls) runs. Last-Modified is no earlier than the
+    start of the current revalidation period (and of today, for ``daily``
+    endpoints), so If-Modified-Since honours the same inputs as the ETag.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                versions = DataVersion.get(tables)
+                modified = _http_date(DataVersion.last_modified(tables))
+            except Exception as e:
+                app.logger.warning(f"Data versions unavailable, skipping ETag: {e}")
+                return view(*args, **kwargs)
+            
+            # Re-validate at least once per analytics cache period, since
+            # writes made outside the app do not bump versions
+            period = int(time.time() // Config.ANALYTICS_CACHE_TTL)
+            key = json.dumps([
+                request.path, sorted(request.args.items(multi=True)), versions,
+                date.today().isoformat() if daily else None,
+                period,
+                gemini_ai.enabled
+            ], default=str)
+            etag = hashlib.sha1(key.encode()).hexdigest()
+            
+            starts = [datetime.fromtimestamp(period * Config.ANALYTICS_CACHE_TTL, timezone.utc)]
+            if daily:
+                starts.append(_http_date(datetime.combine(date.today(), datetime.min.time())))
+            modified = max([value for value in [modified] + starts if value is not None])
+            
+            if request.if_none_match:
+                fresh = request.if_none_match.contains(etag)
+            else:
+                fresh = (request.if_modified_since is not None
+                         and modified <= request.if_modified_since)
+            if fresh:
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag)
+            response.last_modified = modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# ==================== ADMIN ACCESS ====================
+def admin_required(view):
+    """
+    Restrict an operational endpoint to administrators: callers must send
+    ``Authorization: Bearer <ADMIN_API_TOKEN>``. Without a configured token
+    the endpoint is closed, except in debug mode to requests made directly
+    from the server itself (behind a reverse proxy every request arrives from
+    localhost, so forwarded requests are refused).
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = Config.ADMIN_API_TOKEN
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            allowed = hmac.compare_digest(supplied.encode(), f"Bearer {token}".encode())
+        else:
+            allowed = (app.debug and request.remote_addr in ('127.0.0.1', '::1')
+                       and 'X-Forwarded-For' not in request.headers
+                       and 'Forwarded' not in request.headers)
+        if not allowed:
+            return jsonify({'error': 'Administrator access required'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+# ==================== FRAGMENT CACHE ====================
+fragment_cache = LRUCache('fragments', Config.FRAGMENT_CACHE_SIZE, Config.FRAGMENT_CACHE_TTL)
+
+@app.template_global()
+def cached_fragment(name, *tables, ttl=None, daily=False, caller=None):
+    """
+    Cache the rendered body of a ``{% call cached_fragment(...) %}`` block.
+    
+    The key is the fragment name plus the data versions of ``tables``, so a
+    model write to any of them invalidates the fragment; ``ttl`` bounds its
+    age regardless, and ``daily`` re-renders it when the date changes (for
+    fragments that show relative times). Fragments should load their own
+    data (via loaders passed to the template) so a hit skips the queries too.
+    """
+    try:
+        versions = DataVersion.get(tables)
+    except Exception as e:
+        app.logger.warning(f"Data versions unavailable, rendering {name} uncached: {e}")
+        return caller()
+    key = (name, versions, date.today() if daily else None)
+    html = fragment_cache.lookup(key)
+    if html is MISSING:
+        html = caller()
+        if not Database.has_pending_writes():
+            fragment_cache.set(key, html, ttl)
+    return html
+
 # ==================== HOME & DASHBOARD ====================
 @app.route('/')
 def index():
     """Main dashboard"""
     try:
         stats = DashboardModel.get_statistics()
-        recent_patients = PatientModel.get_all_patients(limit=5)
         today_appointments = OPDModel.get_today_appointments()
-        active_reports = PatientReportModel.get_active_reports()
         ai_suggestions = HealthAI.get_resource_optimization_suggestions()
         
+        # Recent patients and active admissions render inside cached
+        # fragments, which call these loaders only on a cache miss
         return render_template('dashboard.html', 
                              stats=stats,
-                             recent_patients=recent_patients,
+                             load_recent_patients=functools.partial(PatientModel.get_all_patients, limit=5),
                              today_appointments=today_appointments,
-                             active_reports=active_reports,
+                             load_active_reports=PatientReportModel.get_active_reports,
                              ai_suggestions=ai_suggestions,
                              now=datetime.now())
     except Exception as e:
@@ -45,11 +259,47 @@ def index():
 def patients():
     """Patient management page"""
     try:
-        all_patients = PatientModel.get_all_patients()
-        return render_template('patients.html', patients=all_patients)
+        cursor = request.args.get('cursor')
+        risk = request.args.get('risk')
+        if risk not in ('High', 'Medium', 'Low'):
+            risk = None
+        try:
+            page = PatientModel.get_patients_page(cursor=cursor, limit=Config.ITEMS_PER_PAGE,
+                                                  risk_level=risk)
+        except ValueError:
+            flash('Invalid page link', 'error')
+            return redirect(url_for('patients', risk=risk))
+        return render_template('patients.html',
+                             patients=page['items'],
+                             next_cursor=page['next_cursor'],
+                             is_first_page=not cursor,
+                             risk=risk)
     except Exception as e:
         return f"Error loading patients: {str(e)}", 500
 
+@app.route('/patients/export.csv')
+def export_patients():
+    """Stream every patient as CSV without loading the table into memory"""
+    columns = ['patient_id', 'name', 'age', 'gender', 'contact_info']
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for i, patient in enumerate(PatientModel.iter_all_patients(), 1):
+            writer.writerow([patient.get(col) for col in columns])
+            if i % 500 == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=patients.csv'}
+    )
+
 @app.route('/patient/<int:patient_id>')
 def patient_detail(patient_id):
     """Patient detail page with AI insights"""
@@ -67,6 +317,8 @@ def patient_detail(patient_id):
         gemini_insights = None
         health_tips = []
         if gemini_ai.enabled:
+            # Don't hold a pooled connection while waiting on Gemini
+            Database.release_session()
             gemini_insights = gemini_ai.generate_patient_insights(patient, medical_history)
             conditions = [h['disease'] for h in medical_history[:3]]
             health_tips = gemini_ai.generate_health_tips(patient['age'], patient['gender'], conditions)
@@ -119,13 +371,28 @@ def edit_patient(patient_id):
     patient = PatientModel.get_patient_by_id(patient_id)
     return render_template('edit_patient.html', patient=patient)
 
+@app.route('/api/patients')
+def list_patients_api():
+    """Paginated patient list API (?cursor=...&limit=...)"""
+    try:
+        page = PatientModel.get_patients_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/patients/search')
+@conditional_get('patient', 'patient_risk')
 def search_patients():
     """Search patients API"""
     try:
         search_term = request.args.get('q', '')
         if search_term:
-            results = PatientModel.search_patients(search_term)
+            results = PatientModel.search_patients(search_term, limit=request.args.get('limit', type=int))
         else:
             results = PatientModel.get_all_patients(limit=10)
         return jsonify(results)
@@ -169,6 +436,20 @@ def add_opd_appointment():
         flash(f'Error scheduling appointment: {str(e)}', 'error')
         return redirect(url_for('opd_appointments'))
 
+@app.route('/api/opd/appointments')
+def list_appointments_api():
+    """Paginated OPD appointments API, latest first (?cursor=...&limit=...)"""
+    try:
+        page = OPDModel.get_appointments_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ==================== PATIENT REPORTS ====================
 @app.route('/reports')
 def patient_reports():
@@ -199,6 +480,7 @@ def add_report():
         # Get AI treatment recommendations
         if gemini_ai.enabled and patient:
             # Use Gemini AI for advanced treatment plan
+            Database.release_session()
             gemini_treatment = gemini_ai.generate_treatment_plan(
                 diagnosis, patient['age'], medical_history
             )
@@ -231,6 +513,20 @@ def discharge_patient(report_id):
         flash(f'Error discharging patient: {str(e)}', 'error')
         return redirect(url_for('patient_reports'))
 
+@app.route('/api/reports')
+def list_reports_api():
+    """Paginated patient reports API, latest admission first (?cursor=...&limit=...)"""
+    try:
+        page = PatientReportModel.get_reports_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ==================== OPERATION THEATRE ====================
 @app.route('/ot')
 def operation_theatre():
@@ -278,6 +574,20 @@ def update_ot_status(ot_id):
         flash(f'Error updating status: {str(e)}', 'error')
         return redirect(url_for('operation_theatre'))
 
+@app.route('/api/ot/operations')
+def list_operations_api():
+    """Paginated operations API, latest first (?cursor=...&limit=...)"""
+    try:
+        page = OTModel.get_operations_page(
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(page)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ==================== WARD MANAGEMENT ====================
 @app.route('/wards')
 def ward_management():
@@ -332,7 +642,6 @@ def analytics():
     """AI-powered analytics dashboard"""
     try:
         bed_predictions = HealthAI.predict_bed_occupancy(7)
-        disease_patterns = HealthAI.analyze_disease_patterns()
         optimization_suggestions = HealthAI.get_resource_optimization_suggestions()
         
         # Additional analytics
@@ -340,24 +649,27 @@ def analytics():
         gender_distribution = HealthAI.get_gender_distribution()
         monthly_admissions = HealthAI.get_monthly_admissions()
         operation_stats = HealthAI.get_operation_statistics()
-        staff_workload = HealthAI.get_staff_workload()
         avg_stay = HealthAI.get_average_stay_duration()
         readmission_rate = HealthAI.get_readmission_rate()
         
         # Gemini AI trend analysis
         gemini_trends = None
-        if gemini_ai.enabled and disease_patterns:
-            gemini_trends = gemini_ai.analyze_hospital_trends(disease_patterns)
+        if gemini_ai.enabled:
+            disease_patterns = HealthAI.analyze_disease_patterns()
+            if disease_patterns:
+                Database.release_session()
+                gemini_trends = gemini_ai.analyze_hospital_trends(disease_patterns)
         
+        # Disease patterns and staff workload render inside cached fragments
         return render_template('analytics.html',
                              bed_predictions=bed_predictions,
-                             disease_patterns=disease_patterns,
+                             load_disease_patterns=HealthAI.analyze_disease_patterns,
                              optimization_suggestions=optimization_suggestions,
                              age_distribution=age_distribution,
                              gender_distribution=gender_distribution,
                              monthly_admissions=monthly_admissions,
                              operation_stats=operation_stats,
-                             staff_workload=staff_workload,
+                             load_staff_workload=HealthAI.get_staff_workload,
                              avg_stay=avg_stay,
                              readmission_rate=readmission_rate,
                              gemini_trends=gemini_trends)
@@ -378,6 +690,26 @@ def api_patient_risk(patient_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ai/patient-risk')
+@conditional_get('patient_risk')
+def api_patient_risk_batch():
+    """API endpoint for risk of several patients (?ids=1,2,3)"""
+    try:
+        raw = request.args.get('ids', '')
+        try:
+            patient_ids = [int(pid) for pid in raw.split(',') if pid.strip()]
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of patient ids'}), 400
+        if not patient_ids:
+            return jsonify({'error': 'ids is required'}), 400
+        if len(patient_ids) > Config.RISK_BATCH_MAX_IDS:
+            return jsonify({'error': f'At most {Config.RISK_BATCH_MAX_IDS} ids per request'}), 400
+        
+        results = HealthAI.predict_patient_risk_batch(patient_ids)
+        return jsonify({'patients': results, 'count': len(results)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/ai/treatment-recommendations', methods=['POST'])
 def api_treatment_recommendations():
     """API endpoint for treatment recommendations"""
@@ -389,12 +721,31 @@ def api_treatment_recommendations():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analytics/disease-patterns')
+@conditional_get('medicalhistory', 'patient', daily=True)
+def api_disease_patterns():
+    """Top diseases overall, or over the last ?days= (up to 90) or ?months="""
+    try:
+        days = request.args.get('days', type=int)
+        months = request.args.get('months', type=int)
+        if days is not None and not 1 <= days <= Config.DISEASE_STATS_DAY_BUCKETS:
+            return jsonify({'error': f'days must be between 1 and {Config.DISEASE_STATS_DAY_BUCKETS}'}), 400
+        if months is not None and months < 1:
+            return jsonify({'error': 'months must be at least 1'}), 400
+        return jsonify(HealthAI.analyze_disease_patterns(days=days, months=months))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/ai/bed-occupancy-forecast')
+@conditional_get('patientreport', 'generalward', 'icu', 'specialroom', daily=True)
 def api_bed_occupancy_forecast():
     """API endpoint for bed occupancy prediction"""
     try:
-        days = request.args.get('days', 7, type=int)
-        predictions = HealthAI.predict_bed_occupancy(days)
+        days = min(max(request.args.get('days', 7, type=int), 1), Config.FORECAST_MAX_DAYS)
+        ward = request.args.get('ward', 'general')
+        if ward not in WARD_TYPES:
+            return jsonify({'error': f"ward must be one of {', '.join(WARD_TYPES)}"}), 400
+        predictions = HealthAI.predict_bed_occupancy(days, ward)
         return jsonify(predictions)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -405,7 +756,29 @@ def api_stats():
     """API endpoint for dashboard statistics"""
     try:
         stats = DashboardModel.get_statistics()
-        return jsonify(stats)
+        # The statistics come from a short-lived snapshot rather than straight
+        # from the tables, so the ETag is a hash of the payload itself.
+        response = jsonify(stats)
+        response.add_etag()
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/db/stats')
+@admin_required
+def api_db_stats():
+    """API endpoint for connection pool, cache and per-query statistics"""
+    try:
+        return jsonify({
+            'pool': Database.pool_stats(),
+            'statement_cache': Database.statement_cache_stats(),
+            'caches': Database.cache_stats(),
+            'gemini_cache': gemini_ai.cache_stats(),
+            'single_flight': single_flight_stats(),
+            'queries': Database.query_stats(limit=request.args.get('limit', 50, type=int)),
+            'queries_evicted': QueryStats.evicted()
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -448,6 +821,7 @@ def predict_complications_api():
         if not patient:
             return jsonify({'error': 'Patient not found'}), 404
         
+        Database.release_session()
         complications = gemini_ai.predict_complications(patient, medical_history)
         return jsonify({'complications': complications})
     except Exception as e:
@@ -471,12 +845,15 @@ def generate_discharge_summary_api(report_id):
         patient = PatientModel.get_patient_by_id(report['PatientID'])
         medical_history = MedicalHistoryModel.get_patient_history(report['PatientID'])
         
+        Database.release_session()
         summary = gemini_ai.generate_discharge_summary(report, patient, medical_history)
         return jsonify({'summary': summary})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/advanced-analytics')
+@conditional_get('patient', 'medicalhistory', 'patientreport', 'ot', 'staff', 'staffrole',
+                 'opdappointment', 'ot_staff_assignment', daily=True)
 def advanced_analytics_api():
     """API endpoint for advanced analytics data"""
     try:
@@ -493,6 +870,7 @@ def advanced_analytics_api():
         
         # Add Gemini AI trends if enabled
         if gemini_ai.enabled and data['disease_patterns']:
+            Database.release_session()
             data['ai_trends'] = gemini_ai.analyze_hospital_trends(data['disease_patterns'])
         
         return jsonify(data)
@@ -0,0 +1,346 @@
+# bulk_import.py
+# Bulk ingestion of patients and medical history exported from other hospital systems
+#
+# Usage:
+#   python bulk_import.py patients patients.csv
+#   python bulk_import.py history history.ndjson --chunk-size 10000
+#
+# Rows are validated, grouped into chunks and written with one multi-row
+# INSERT per chunk (Database.execute_many). Each chunk commits on its own,
+# together with the import_progress row recording how far the file has been
+# read, so re-running the same command after a failure resumes from the first
+# uncommitted chunk without inserting any row twice.
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from dateutil import parser as date_parser
+
+from config import Config
+from database import Database, PatientRiskModel
+
+
+class RowError(ValueError):
+    """A source row failed validation"""
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def validate_patient(row):
+    """Normalise a patient row into (name, age, gender, contact_info)"""
+    name = _clean(row.get('name'))
+    if not name:
+        raise RowError('name is required')
+    if len(name) > 100:
+        raise RowError('name is longer than 100 characters')
+
+    try:
+        age = int(float(_clean(row.get('age'))))
+    except (TypeError, ValueError):
+        raise RowError(f"invalid age: {row.get('age')!r}")
+    if not 0 <= age <= 150:
+        raise RowError(f'age out of range: {age}')
+
+    gender = (_clean(row.get('gender')) or '').capitalize()
+    if gender in ('M', 'F'):
+        gender = {'M': 'Male', 'F': 'Female'}[gender]
+    if gender not in ('Male', 'Female', 'Other'):
+        raise RowError(f"invalid gender: {row.get('gender')!r}")
+
+    return (name, age, gender, _clean(row.get('contact_info')))
+
+
+def validate_history(row):
+    """Normalise a medical history row into (patient_id, disease, treatment, date_time)"""
+    try:
+        patient_id = int(_clean(row.get('patient_id')))
+    except (TypeError, ValueError):
+        raise RowError(f"invalid patient_id: {row.get('patient_id')!r}")
+    if patient_id <= 0:
+        raise RowError(f'invalid patient_id: {patient_id}')
+
+    disease = _clean(row.get('disease'))
+    if not disease:
+        raise RowError('disease is required')
+
+    raw_date = _clean(row.get('date_time'))
+    if not raw_date:
+        raise RowError('date_time is required')
+    try:
+        date_time = date_parser.parse(raw_date).strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, OverflowError):
+        raise RowError(f'invalid date_time: {raw_date!r}')
+
+    return (patient_id, disease, _clean(row.get('treatment')), date_time)
+
+
+def _existing_patient_ids(patient_ids):
+    """Return the subset of patient_ids present in the patient table"""
+    ids = sorted(set(patient_ids))
+    if not ids:
+        return set()
+    placeholders = ', '.join(['%s'] * len(ids))
+    query = f"SELECT patient_id FROM patient WHERE patient_id IN ({placeholders})"
+    return {row['patient_id'] for row in Database.execute_query(query, tuple(ids))}
+
+
+# One row per import in progress; written in the same transaction as each chunk
+PROGRESS_DDL = """
+    CREATE TABLE IF NOT EXISTS import_progress (
+        job_id CHAR(40) PRIMARY KEY,
+        target VARCHAR(20) NOT NULL,
+        source VARCHAR(1000) NOT NULL,
+        size BIGINT NOT NULL,
+        mtime DOUBLE NOT NULL,
+        rows_read INT NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+"""
+Database.manage_table(PROGRESS_DDL)
+
+
+class BulkImporter:
+    """Chunked, resumable importer for one source file"""
+
+    TARGETS = {
+        'patients': {
+            'query': """
+                INSERT INTO patient (name, age, gender, contact_info)
+                VALUES (%s, %s, %s, %s)
+            """,
+            'validate': validate_patient
+        },
+        'history': {
+            'query': """
+                INSERT INTO medicalhistory (patient_id, disease, treatment, date_time)
+                VALUES (%s, %s, %s, %s)
+            """,
+            'validate': validate_history
+        }
+    }
+
+    # Rejected rows kept in the summary (the counts are always complete)
+    MAX_REPORTED_REJECTS = 100
+
+    def __init__(self, target, path, chunk_size=None, fmt=None):
+        if target not in self.TARGETS:
+            raise ValueError(f"Unknown import target '{target}' (choose from {', '.join(self.TARGETS)})")
+        self.target = target
+        self.path = os.path.abspath(path)
+        self.chunk_size = chunk_size or Config.BULK_IMPORT_CHUNK_SIZE
+        self.job_id = hashlib.sha1(f"{target}:{self.path}".encode()).hexdigest()
+        self.format = fmt or self._detect_format(path)
+
+    @staticmethod
+    def _detect_format(path):
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.ndjson', '.jsonl'):
+            return 'ndjson'
+        if ext == '.csv':
+            return 'csv'
+        raise ValueError(f"Cannot infer format of '{path}'; pass fmt='csv' or 'ndjson'")
+
+    def _read_rows(self):
+        """Yield (line_no, row dict) from the source file"""
+        with open(self.path, newline='', encoding='utf-8') as f:
+            if self.format == 'csv':
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield reader.line_num, row
+            else:
+                for line_no, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        row = RowError(f'invalid JSON: {e.msg}')
+                    yield line_no, row
+
+    def _load_progress(self):
+        """Rows already committed by an earlier run of this same file"""
+        result = Database.execute_query(
+            "SELECT size, mtime, rows_read FROM import_progress WHERE job_id = %s", (self.job_id,)
+        )
+        if not result:
+            return 0
+        progress = result[0]
+        stat = os.stat(self.path)
+        if progress['size'] != stat.st_size or progress['mtime'] != stat.st_mtime:
+            raise RuntimeError(
+                f"{self.path} changed since the last {self.target} import of it stopped; "
+                "run with --restart to start over"
+            )
+        return progress['rows_read']
+
+    def _save_progress(self, rows_read):
+        stat = os.stat(self.path)
+        Database.execute_query("""
+            REPLACE INTO import_progress (job_id, target, source, size, mtime, rows_read, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (self.job_id, self.target, self.path, stat.st_size, stat.st_mtime, rows_read,
+              datetime.now().replace(microsecond=0)), fetch=False)
+
+    def clear_progress(self):
+        """Forget where an earlier run stopped, so the next run starts over"""
+        Database.execute_query("DELETE FROM import_progress WHERE job_id = %s",
+                               (self.job_id,), fetch=False)
+
+    def _write_chunk(self, batch, rows_read):
+        """
+        Check foreign keys for the chunk, insert the valid rows and record
+        ``rows_read`` as the new resume point, all in one transaction.
+        """
+        rejected = []
+        if self.target == 'history':
+            known = _existing_patient_ids(values[0] for _, values in batch)
+            rejected = [(line_no, f'unknown patient_id: {values[0]}')
+                        for line_no, values in batch if values[0] not in known]
+            batch = [(line_no, values) for line_no, values in batch if values[0] in known]
+        with Database.transaction():
+            if batch:
+                if self.target == 'patients':
+                    last = Database.execute_query(
+                        "SELECT COALESCE(MAX(patient_id), 0) as last_id FROM patient"
+                    )[0]['last_id']
+                Database.execute_many(self.TARGETS[self.target]['query'], [values for _, values in batch])
+                # Keep the precomputed risk of the affected patients current
+                if self.target == 'patients':
+                    added = Database.execute_query(
+                        "SELECT patient_id FROM patient WHERE patient_id > %s", (last,)
+                    )
+                    PatientRiskModel.refresh(row['patient_id'] for row in added)
+                else:
+                    PatientRiskModel.refresh({values[0] for _, values in batch})
+            self._save_progress(rows_read)
+        return len(batch), rejected
+
+    def run(self, on_chunk=None):
+        """
+        Import the file and return a summary dict. ``on_chunk`` is called with
+        each chunk's result as soon as it has been committed (or has failed).
+        """
+        validate = self.TARGETS[self.target]['validate']
+        skip = self._load_progress()
+        summary = {
+            'target': self.target,
+            'source': self.path,
+            'resumed_from_row': skip,
+            'inserted': 0,
+            'rejected': 0,
+            'rejects': [],
+            'chunks': [],
+            'completed': False
+        }
+        started = time.monotonic()
+        rows_read = skip
+        batch, batch_rejects = [], []
+
+        def flush():
+            chunk_started = time.monotonic()
+            result = {
+                'chunk': len(summary['chunks']) + 1,
+                'first_line': (batch or batch_rejects)[0][0],
+                'rows': len(batch) + len(batch_rejects)
+            }
+            try:
+                inserted, fk_rejects = self._write_chunk(batch, rows_read)
+            except Exception as e:
+                result.update(status='failed', error=str(e))
+                summary['chunks'].append(result)
+                if on_chunk:
+                    on_chunk(result)
+                raise
+
+            rejects = batch_rejects + fk_rejects
+            result.update(status='ok', inserted=inserted, rejected=len(rejects),
+                          seconds=round(time.monotonic() - chunk_started, 3))
+            summary['inserted'] += inserted
+            summary['rejected'] += len(rejects)
+            room = self.MAX_REPORTED_REJECTS - len(summary['rejects'])
+            summary['rejects'].extend(
+                {'line': line_no, 'error': error} for line_no, error in rejects[:max(room, 0)]
+            )
+            summary['chunks'].append(result)
+            if on_chunk:
+                on_chunk(result)
+
+        try:
+            for index, (line_no, row) in enumerate(self._read_rows()):
+                if index < skip:
+                    continue
+                rows_read += 1
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    if not isinstance(row, dict):
+                        raise RowError('row is not an object')
+                    batch.append((line_no, validate(row)))
+                except RowError as e:
+                    batch_rejects.append((line_no, str(e)))
+
+                if len(batch) + len(batch_rejects) >= self.chunk_size:
+                    flush()
+                    batch, batch_rejects = [], []
+
+            if batch or batch_rejects:
+                flush()
+            summary['completed'] = True
+            # Finished cleanly: a later run of the same file should start over
+            self.clear_progress()
+        except Exception as e:
+            summary['error'] = str(e)
+
+        elapsed = time.monotonic() - started
+        summary['seconds'] = round(elapsed, 2)
+        summary['rows_per_minute'] = round(summary['inserted'] / elapsed * 60) if elapsed else 0
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import patients or medical history')
+    parser.add_argument('target', choices=sorted(BulkImporter.TARGETS))
+    parser.add_argument('path', help='CSV (with header row) or NDJSON file')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='override format detection')
+    parser.add_argument('--chunk-size', type=int, default=Config.BULK_IMPORT_CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true',
+                        help='ignore where an earlier run of this file stopped')
+    args = parser.parse_args()
+
+    importer = BulkImporter(args.target, args.path, chunk_size=args.chunk_size, fmt=args.format)
+    if args.restart:
+        importer.clear_progress()
+
+    def report(chunk):
+        if chunk['status'] == 'ok':
+            print(f"  chunk {chunk['chunk']:>5} (line {chunk['first_line']}): "
+                  f"{chunk['inserted']} inserted, {chunk['rejected']} rejected in {chunk['seconds']}s")
+        else:
+            print(f"  chunk {chunk['chunk']:>5} (line {chunk['first_line']}): FAILED - {chunk['error']}")
+
+    print(f"Importing {args.target} from {importer.path}")
+    summary = importer.run(on_chunk=report)
+    if summary['resumed_from_row']:
+        print(f"Resumed after {summary['resumed_from_row']} previously committed rows")
+    for reject in summary['rejects']:
+        print(f"  line {reject['line']}: {reject['error']}")
+    print(f"Inserted {summary['inserted']}, rejected {summary['rejected']} "
+          f"in {summary['seconds']}s ({summary['rows_per_minute']} rows/min)")
+    if not summary['completed']:
+        print(f"Import stopped: {summary['error']}")
+        print("Re-run the same command to resume from the failed chunk.")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
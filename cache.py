@@ -0,0 +1,276 @@
+# cache.py
+# In-process caching helpers shared by the models and analytics
+
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from config import Config
+
+
+class TTLSnapshot:
+    """
+    A single value recomputed at most once per ``ttl`` seconds.
+
+    When the value expires, one caller refreshes it while concurrent callers
+    keep getting the previous value, so a burst of requests never triggers
+    more than one recomputation.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0.0
+        self._has_value = False
+        self._lock = threading.Lock()
+
+    def get(self, loader):
+        """Return the cached value, calling ``loader()`` when it has expired"""
+        if self._has_value and time.monotonic() < self._expires:
+            return self._value
+
+        # Someone else is refreshing: serve the stale value rather than wait
+        if not self._lock.acquire(blocking=not self._has_value):
+            return self._value
+        try:
+            if not self._has_value or time.monotonic() >= self._expires:
+                self._value = loader()
+                self._expires = time.monotonic() + self.ttl
+                self._has_value = True
+            return self._value
+        finally:
+            self._lock.release()
+
+    def invalidate(self):
+        """Force the next get() to recompute"""
+        self._expires = 0.0
+
+
+# Returned by LRUCache.lookup() on a miss (None is a valid cached value)
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe, size- and TTL-bounded LRU map.
+
+    Every instance registers itself by name so its hit/miss counters can be
+    reported together through ``cache_stats()``.
+    """
+
+    registry = {}
+
+    def __init__(self, name, max_size=1024, ttl=300):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        LRUCache.registry[name] = self
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key`` or ``default``"""
+        value = self.lookup(key)
+        return default if value is MISSING else value
+
+    def lookup(self, key):
+        """Like get(), but returns the ``MISSING`` sentinel on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if time.monotonic() < expires:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+            return MISSING
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` under ``key``, evicting the least recently used entry"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key):
+        """Drop one entry"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Snapshot of this cache's counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups * 100, 1) if lookups else 0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations
+            }
+
+
+def cache_stats():
+    """Counters of every registered LRUCache, keyed by name"""
+    return {name: cache.stats() for name, cache in LRUCache.registry.items()}
+
+
+class _Flight:
+    """One in-flight computation and the callers waiting on it"""
+
+    __slots__ = ('done', 'result', 'error', 'shared', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = True
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still running wait and receive a copy of the same result (or the
+    exception) instead of starting their own. Callers for which the
+    registered bypass check is true (a session with uncommitted writes) run
+    the function themselves, and a leader that ends up with uncommitted
+    writes does not share its result. Waiters give up after DB_POOL_TIMEOUT
+    seconds and run the function themselves. Nothing is kept once the call
+    completes - pair it with a cache for that.
+    """
+
+    registry = {}
+    _bypass = None
+
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._coalesced = 0
+        self._bypassed = 0
+        self._timeouts = 0
+        SingleFlight.registry[name] = self
+
+    @staticmethod
+    def set_bypass(check):
+        """
+        Register a callable that is true when the caller's results must not
+        be shared (the database layer passes Database.has_pending_writes).
+        """
+        SingleFlight._bypass = check
+
+    @staticmethod
+    def _private():
+        check = SingleFlight._bypass
+        return check is not None and check()
+
+    def do(self, key, func, *args, **kwargs):
+        """Run ``func(*args, **kwargs)`` unless a call for ``key`` is already running"""
+        if self._private():
+            with self._lock:
+                self._bypassed += 1
+            return func(*args, **kwargs)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._calls += 1
+            else:
+                flight.waiters += 1
+                self._coalesced += 1
+
+        if not leader:
+            if not flight.done.wait(Config.DB_POOL_TIMEOUT):
+                with self._lock:
+                    self._timeouts += 1
+                return func(*args, **kwargs)
+            if not flight.shared:
+                return func(*args, **kwargs)
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.result)
+
+        try:
+            result = func(*args, **kwargs)
+            # The leader's own writes (e.g. risk rows it refreshed) may still
+            # roll back, so only a result computed without any is shared
+            if self._private():
+                flight.shared = False
+            else:
+                flight.result = copy.deepcopy(result)
+            return result
+        except BaseException as e:
+            if self._private():
+                flight.shared = False
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self._calls,
+                'coalesced': self._coalesced,
+                'bypassed': self._bypassed,
+                'timeouts': self._timeouts,
+                'in_flight': len(self._flights)
+            }
+
+
+def single_flight(func=None, *, name=None):
+    """
+    Decorator form of SingleFlight keyed by the call's arguments. Arguments
+    are keyed by repr(), so dicts and lists work as long as equal values
+    print the same.
+    """
+    def decorator(func):
+        flight = SingleFlight(name or func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = repr((args, sorted(kwargs.items())))
+            return flight.do(key, func, *args, **kwargs)
+
+        wrapper.flight = flight
+        return wrapper
+    return decorator(func) if func is not None else decorator
+
+
+def single_flight_stats():
+    """Counters of every registered SingleFlight, keyed by name"""
+    return {name: flight.stats() for name, flight in SingleFlight.registry.items()}
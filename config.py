@@ -18,17 +18,131 @@ class Config:
         'port': 3306
     }
     
+    # Storage backend: 'mysql', or 'sqlite' for an embedded database
+    # (benchmarks, profiling and tests without a MySQL server)
+    DB_BACKEND = os.environ.get('DB_BACKEND', 'mysql')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'hospital.db')  # or ':memory:'
+    
+    # Read replicas: comma-separated hosts sharing the primary's credentials.
+    # Reads are spread across them; writes always go to DB_CONFIG.
+    DB_REPLICAS = [
+        dict(DB_CONFIG, host=host.strip())
+        for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()
+    ]
+    # After a write, the same browser session reads from the primary this long
+    DB_STICKY_PRIMARY_SECONDS = float(os.environ.get('DB_STICKY_PRIMARY_SECONDS', 5))
+    
+    # Connection Pool
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # close connections idle longer than this
+    
+    # Server-side prepared statements (cached per pooled connection)
+    DB_USE_PREPARED_STATEMENTS = True
+    DB_STATEMENT_CACHE_SIZE = 64
+    DB_PREPARE_MAX_PARAMS = 32
+    
+    # Rows fetched per round trip by Database.stream_query
+    DB_STREAM_BATCH_SIZE = 1000
+    
+    # Query instrumentation (see /api/db/stats)
+    QUERY_STATS_ENABLED = True
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'logs/slow_query.log')
+    # Distinct statements tracked; the least recently executed are dropped
+    QUERY_STATS_MAX_STATEMENTS = 500
+    # Bearer token for the admin endpoints; required unless DEBUG is on, when
+    # unset allows direct local requests only
+    ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN')
+    
+    # Rows per multi-row INSERT (and per commit) in bulk_import.py
+    BULK_IMPORT_CHUNK_SIZE = 5000
+    
     # Application Settings
-    DEBUG = True
+    DEBUG = os.environ.get('FLASK_DEBUG', '1') != '0'
     HOST = '0.0.0.0'
     PORT = 5000
     
+    # Seconds the shared dashboard statistics snapshot is reused
+    DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', 15))
+    
+    # In-process patient entity cache (rows, seconds)
+    PATIENT_CACHE_SIZE = int(os.environ.get('PATIENT_CACHE_SIZE', 1024))
+    PATIENT_CACHE_TTL = int(os.environ.get('PATIENT_CACHE_TTL', 300))
+    
+    # Census counters: general ward capacity and how often (seconds) the
+    # counters are recounted from the source tables (0 disables). generalward
+    # only has rows for beds that have been assigned, so the capacity used is
+    # the larger of GENERAL_WARD_BEDS and the number of rows there
+    GENERAL_WARD_BEDS = 50
+    CENSUS_RECONCILE_INTERVAL = int(os.environ.get('CENSUS_RECONCILE_INTERVAL', 300))
+    
+    # Versioned result cache: how long (seconds) table versions are memoised
+    # per process, and the upper bound on any cached analytics result
+    DATA_VERSION_TTL = 2
+    ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL', 600))
+    
+    # Rendered template fragments (entries, default max age in seconds)
+    FRAGMENT_CACHE_SIZE = 256
+    FRAGMENT_CACHE_TTL = int(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+    
+    # Staff/role reference data is rebuilt at least this often (seconds)
+    REFERENCE_DATA_TTL = int(os.environ.get('REFERENCE_DATA_TTL', 3600))
+    
+    # Persistent Gemini response cache (empty path disables it). TTLs are per
+    # GeminiAI method, in seconds; prompts that embed live data expire sooner.
+    GEMINI_CACHE_PATH = os.environ.get('GEMINI_CACHE_PATH', 'cache/gemini_responses.db')
+    GEMINI_CACHE_MAX_ENTRIES = 5000
+    GEMINI_CACHE_TTLS = {
+        'generate_patient_insights': 24 * 3600,
+        'generate_treatment_plan': 7 * 24 * 3600,
+        'analyze_symptoms': 7 * 24 * 3600,
+        'predict_complications': 7 * 24 * 3600,
+        'generate_discharge_summary': 3600,
+        'analyze_hospital_trends': 6 * 3600,
+        'generate_health_tips': 30 * 24 * 3600
+    }
+    
+    # Where the HealthAI aggregates read from: 'database' (live queries) or
+    # 'snapshot' (Parquet export made by 'flask export-analytics-snapshot')
+    ANALYTICS_SOURCE = os.environ.get('ANALYTICS_SOURCE', 'database')
+    ANALYTICS_SNAPSHOT_PATH = os.environ.get('ANALYTICS_SNAPSHOT_PATH', 'snapshots/analytics')
+    # Rewrite each table in full this often (picks up deletes and untracked updates)
+    ANALYTICS_SNAPSHOT_FULL_HOURS = 24
+    ANALYTICS_SNAPSHOT_MAX_PARTS = 48
+    # Seconds between checks for a newer snapshot
+    ANALYTICS_SNAPSHOT_RELOAD = 30
+    
+    # Disease frequency counters: days kept in daily buckets (longest day
+    # window), seconds between full reseeds, history ids below the watermark
+    # re-read on each catch-up (rows that commit out of id order)
+    DISEASE_STATS_DAY_BUCKETS = 90
+    DISEASE_STATS_RESEED = int(os.environ.get('DISEASE_STATS_RESEED', 3600))
+    DISEASE_STATS_OVERLAP = 1000
+    
+    # Occupancy forecasting: census history used for fitting, days between
+    # full refits (the fitted state is advanced daily in between), longest horizon
+    FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', 730))
+    FORECAST_REFIT_DAYS = int(os.environ.get('FORECAST_REFIT_DAYS', 7))
+    FORECAST_MAX_DAYS = 365
+    
+    # Most patient ids accepted by one batch risk request
+    RISK_BATCH_MAX_IDS = int(os.environ.get('RISK_BATCH_MAX_IDS', 500))
+    
     # Pagination
     ITEMS_PER_PAGE = 10
+    MAX_PAGE_SIZE = 100
+    # Rows returned by the incremental patient search
+    SEARCH_RESULTS_LIMIT = 50
     
     # AI Model Settings
-    AI_MODEL_PATH = 'models/'
+    AI_MODEL_PATH = os.environ.get('AI_MODEL_PATH', 'models/')
     PREDICTION_CONFIDENCE_THRESHOLD = 0.7
+    # Readmission model: outcome window, training minimum, rows per scoring query
+    READMISSION_WINDOW_DAYS = 30
+    RISK_MODEL_MIN_ROWS = 50
+    RISK_MODEL_MAX_DIAGNOSES = 50
+    RISK_MODEL_BATCH_SIZE = 256
     
     # Google Gemini AI API Configuration
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY') or 'YOUR_GEMINI_API_KEY_HERE'
@@ -0,0 +1,46 @@
+# conftest.py
+# Shared pytest fixtures: every test runs against a fresh embedded SQLite database
+
+import os
+
+# Before config.py is imported anywhere: no MySQL, no background threads,
+# no on-disk Gemini cache
+os.environ.setdefault('DB_BACKEND', 'sqlite')
+os.environ.setdefault('SQLITE_PATH', ':memory:')
+os.environ.setdefault('CENSUS_RECONCILE_INTERVAL', '0')
+os.environ.setdefault('GEMINI_CACHE_PATH', '')
+
+import pytest
+
+from cache import LRUCache
+from config import Config
+from database import (
+    Database, DataVersion, DashboardModel, DiseaseAggregator, StaffModel
+)
+from forecasting import occupancy_forecaster
+
+# Manual scripts that talk to a live MySQL server
+collect_ignore = ['test_db.py', 'test_live_db.py']
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A new, empty hospital database for one test"""
+    monkeypatch.setattr(Config, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(Config, 'SQLITE_PATH', str(tmp_path / 'hospital.db'))
+    monkeypatch.setattr(Config, 'DB_REPLICAS', [])
+    Database.reset_pools()
+    # Process-wide caches must not carry rows over from the last database
+    Database._local.session = None
+    DataVersion._snapshot = None
+    DataVersion._snapshot_expires = 0.0
+    for cache in LRUCache.registry.values():
+        cache.clear()
+    DashboardModel._versions = None
+    DashboardModel.invalidate_statistics()
+    DiseaseAggregator.invalidate()
+    StaffModel.invalidate_reference_data()
+    occupancy_forecaster.invalidate()
+    yield Database
+    Database.reset_pools()
+
@@ -1,72 +1,849 @@
 # database.py
-import mysql.connector
-from mysql.connector import Error
+import base64
+import copy
+import functools
+import heapq
+import itertools
+import json
+import re
+import threading
+import time
 from config import Config
 from contextlib import contextmanager
+from datetime import date, datetime
+from cache import LRUCache, MISSING, SingleFlight, TTLSnapshot, cache_stats
+from db_backends import BACKENDS, MySQLBackend, get_backend
+from db_pool import ConnectionPool, StatementCache
+from query_stats import QueryStats
+import risk_scoring
+
+def encode_cursor(values):
+    """Encode keyset values into an opaque, URL-safe pagination cursor"""
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError('Invalid pagination cursor')
+    return values
+
+
+class DatabaseSession:
+    """
+    Unit of work: one primary connection and one transaction shared by every
+    query issued while the session is active. Connections are borrowed lazily
+    on first use, so sessions that never touch the database are free.
+    
+    Reads go to a replica connection until the session writes (or was created
+    ``sticky``, i.e. the same user wrote moments ago); from then on they use
+    the primary so the session always reads its own writes.
+    """
+    
+    def __init__(self, sticky=False):
+        self.conn = None
+        self.read_conn = None
+        self.failed = False
+        self.wrote = False
+        self.sticky = sticky
+        self.touched = set()
+        self._on_end = []
+    
+    def connection(self, readonly=False, primary=False):
+        """
+        Borrow the connection for this kind of statement on first use.
+        ``primary`` keeps a read off the replicas without counting as a write.
+        """
+        if readonly and not (primary or self.wrote or self.sticky or self.conn is not None):
+            if self.read_conn is None:
+                self.read_conn = Database.acquire_read()
+            return self.read_conn
+        if not readonly:
+            self.wrote = True
+        if self.conn is None:
+            self.conn = Database.get_pool().acquire()
+        return self.conn
+    
+    def mark_failed(self):
+        """Flag the unit of work so it is rolled back instead of committed"""
+        self.failed = True
+    
+    def after_end(self, callback):
+        """Run ``callback`` once the transaction commits or rolls back"""
+        self._on_end.append(callback)
+    
+    def _run_end_callbacks(self):
+        callbacks, self._on_end = self._on_end, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in transaction callback: {e}")
+    
+    def commit(self):
+        """Commit the transaction, or roll it back if a write failed"""
+        if self.conn is None:
+            return
+        try:
+            if self.failed:
+                self.conn.rollback()
+            else:
+                self.conn.commit()
+        finally:
+            self._run_end_callbacks()
+    
+    def rollback(self):
+        """Discard all writes made in this session"""
+        if self.conn is not None:
+            try:
+                self.conn.rollback()
+            finally:
+                self._run_end_callbacks()
+    
+    def release(self):
+        """
+        End the transaction so far and return the connections, before slow
+        work that needs no database (e.g. an AI call). The session stays
+        usable and borrows again on its next query.
+        """
+        self.commit()
+        self.close()
+    
+    def close(self):
+        """Return the connections to their pools (uncommitted work is rolled back)"""
+        for attr in ('read_conn', 'conn'):
+            conn = getattr(self, attr)
+            if conn is not None:
+                setattr(self, attr, None)
+                conn.pool.release(conn)
+        self._run_end_callbacks()
+
 
 class Database:
     """Database connection and operations handler"""
     
+    _pool = None
+    _replica_pools = None
+    _replica_turn = itertools.count()
+    _pool_lock = threading.Lock()
+    _session_provider = None
+    # Sessions opened by Database.transaction() outside a request
+    _local = threading.local()
+    # (ddl, indexes) of the tables the models create for themselves
+    _managed_tables = []
+    
+    @staticmethod
+    def _new_pool(db_config):
+        return ConnectionPool(
+            db_config,
+            size=Config.DB_POOL_SIZE,
+            timeout=Config.DB_POOL_TIMEOUT,
+            recycle=Config.DB_POOL_RECYCLE,
+            statement_cache_size=Config.DB_STATEMENT_CACHE_SIZE,
+            backend=get_backend(Config.DB_BACKEND)
+        )
+    
+    @staticmethod
+    def get_pool():
+        """Return the primary (read-write) pool, creating it on first use"""
+        if Database._pool is None:
+            with Database._pool_lock:
+                if Database._pool is None:
+                    if Config.DB_BACKEND == 'sqlite':
+                        db_config = {'database': Config.SQLITE_PATH}
+                    else:
+                        db_config = Config.DB_CONFIG
+                    pool = Database._new_pool(db_config)
+                    for ddl, indexes in Database._managed_tables:
+                        Database.ensure_table(pool, ddl, indexes)
+                    Database._pool = pool
+        return Database._pool
+    
+    @staticmethod
+    def get_replica_pools():
+        """Return one pool per configured read replica (possibly none)"""
+        if Database._replica_pools is None:
+            with Database._pool_lock:
+                if Database._replica_pools is None:
+                    replicas = Config.DB_REPLICAS if Config.DB_BACKEND == 'mysql' else []
+                    Database._replica_pools = [Database._new_pool(cfg) for cfg in replicas]
+        return Database._replica_pools
+    
+    @staticmethod
+    def reset_pools():
+        """Close every pool so the next query reconnects (e.g. after changing Config)"""
+        with Database._pool_lock:
+            pools = [Database._pool] + (Database._replica_pools or [])
+            Database._pool = None
+            Database._replica_pools = None
+        for pool in pools:
+            if pool is not None:
+                pool.close_all()
+    
+    @staticmethod
+    def backend_errors():
+        """Exception types raised by the configured backend's connections"""
+        return BACKENDS.get(Config.DB_BACKEND, MySQLBackend).errors
+    
+    @staticmethod
+    def acquire_read():
+        """Borrow a connection for reads: a replica in turn, else the primary"""
+        replicas = Database.get_replica_pools()
+        if replicas:
+            pool = replicas[next(Database._replica_turn) % len(replicas)]
+            try:
+                return pool.acquire()
+            except Database.backend_errors() as e:
+                # A replica being down should cost latency, not availability
+                print(f"Replica unavailable, reading from primary: {e}")
+        return Database.get_pool().acquire()
+    
+    @staticmethod
+    def _is_read(query):
+        """Statements that are safe to send to a replica"""
+        head = query.lstrip()[:7].upper()
+        return head.startswith(('SELECT', 'SHOW', 'EXPLAIN')) and 'FOR UPDATE' not in query.upper()
+    
+    @staticmethod
+    def pool_stats():
+        """Get connection pool usage (in use, idle, borrow waits) for primary and replicas"""
+        return {
+            'primary': Database.get_pool().stats(),
+            'replicas': [pool.stats() for pool in Database.get_replica_pools()]
+        }
+    
+    @staticmethod
+    def statement_cache_stats():
+        """Get prepared-statement cache hit/miss counters"""
+        return StatementCache.stats()
+    
+    @staticmethod
+    def cache_stats():
+        """Hit/miss counters of the in-process entity caches"""
+        return cache_stats()
+    
+    @staticmethod
+    def set_session_provider(provider):
+        """
+        Register a callable returning the active DatabaseSession (or None).
+        The web app uses this to scope one session to each request.
+        """
+        Database._session_provider = provider
+    
+    @staticmethod
+    def current_session():
+        """Get the active unit of work, if any"""
+        session = getattr(Database._local, 'session', None)
+        if session is not None:
+            return session
+        provider = Database._session_provider
+        return provider() if provider else None
+    
+    @staticmethod
+    def release_session():
+        """Commit and hand back the active session's connections, if any"""
+        session = Database.current_session()
+        if session is not None:
+            session.release()
+    
+    @staticmethod
+    @contextmanager
+    def transaction():
+        """
+        Run a block of model calls as one unit of work. Inside a request this
+        joins the request's session, which is rolled back at the end of the
+        request if the block raises; elsewhere (CLI jobs, background threads)
+        it opens a session for the block, committing on success and rolling
+        back if the block raises.
+        """
+        joined = Database.current_session()
+        if joined is not None:
+            # Routes catch the error and still answer normally, so the
+            # session is flagged rather than left to commit partial work
+            try:
+                yield
+            except BaseException:
+                joined.mark_failed()
+                raise
+            return
+        
+        session = DatabaseSession()
+        Database._local.session = session
+        try:
+            yield
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            Database._local.session = None
+            session.close()
+    
+    @staticmethod
+    def manage_table(ddl, indexes=()):
+        """
+        Register a table the application creates itself. Managed tables are
+        created once, when the primary pool is opened, rather than lazily from
+        inside a request's write transaction.
+        """
+        Database._managed_tables.append((ddl, tuple(indexes)))
+        if Database._pool is not None:
+            Database.ensure_table(Database._pool, ddl, indexes)
+    
+    @staticmethod
+    def manage_indexes(indexes):
+        """Like manage_table(), for indexes on tables the application does not create"""
+        Database.manage_table(None, indexes)
+    
+    @staticmethod
+    def ensure_table(pool, ddl, indexes=()):
+        """
+        Run a CREATE TABLE IF NOT EXISTS on its own connection, so the
+        implicit commit MySQL issues for DDL never ends a caller's transaction.
+        ``indexes`` are CREATE INDEX statements; one that already exists is
+        skipped (MySQL has no CREATE INDEX IF NOT EXISTS).
+        """
+        try:
+            conn = pool.acquire()
+        except Exception as e:
+            print(f"Could not create managed table: {e}")
+            return
+        try:
+            cursor = conn.cursor()
+            if ddl:
+                cursor.execute(ddl)
+            for index_ddl in indexes:
+                try:
+                    cursor.execute(index_ddl)
+                except Exception:
+                    pass
+            cursor.close()
+            conn.commit()
+        except Exception as e:
+            print(f"Could not create managed table: {e}")
+        finally:
+            pool.release(conn)
+    
+    @staticmethod
+    def has_pending_writes():
+        """True while the active session holds uncommitted writes"""
+        session = Database.current_session()
+        return session is not None and session.wrote
+    
+    @staticmethod
+    def after_transaction(callback):
+        """
+        Run ``callback`` when the current transaction ends (commit or
+        rollback), or immediately when there is no open transaction.
+        Used to keep in-process caches consistent with the database.
+        """
+        session = Database.current_session()
+        if session is not None and session.conn is not None:
+            session.after_end(callback)
+        else:
+            callback()
+    
     @staticmethod
     @contextmanager
-    def get_connection():
-        """Context manager for database connections"""
+    def get_connection(readonly=False, primary=False):
+        """
+        Context manager yielding the session connection or a pooled one.
+        ``readonly`` connections may come from a read replica unless
+        ``primary`` is set.
+        """
+        session = Database.current_session()
+        if session is not None:
+            try:
+                yield session.connection(readonly, primary)
+            except Database.backend_errors() as e:
+                print(f"Database error: {e}")
+                raise
+            return
+        
         conn = None
         try:
-            conn = mysql.connector.connect(**Config.DB_CONFIG)
+            conn = Database.acquire_read() if readonly and not primary else Database.get_pool().acquire()
             yield conn
-        except Error as e:
+        except Database.backend_errors() as e:
             print(f"Database error: {e}")
             raise
         finally:
-            if conn and conn.is_connected():
-                conn.close()
+            if conn is not None:
+                conn.pool.release(conn)
     
     @staticmethod
-    def execute_query(query, params=None, fetch=True):
-        """Execute a query and return results"""
-        with Database.get_connection() as conn:
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(query, params or ())
-            
-            if fetch:
-                result = cursor.fetchall()
-                cursor.close()
-                return result
-            else:
-                conn.commit()
-                last_id = cursor.lastrowid
-                cursor.close()
-                return last_id
+    def _is_batch_insert(query):
+        """INSERT ... VALUES statements that executemany can fold into one round trip"""
+        head = query.lstrip()[:6].upper()
+        return head in ('INSERT', 'REPLAC') and 'VALUES' in query.upper()
+    
+    @staticmethod
+    def execute_query(query, params=None, fetch=True, primary=False):
+        """
+        Execute a query and return results. ``primary`` sends a read to the
+        primary even when replicas are configured (for results that get cached).
+        """
+        return Database._execute(query, params, fetch, primary=primary)
+    
+    @staticmethod
+    def query_errors():
+        """Number of statements that have failed on this thread"""
+        return getattr(Database._local, 'query_errors', 0)
+    
+    @staticmethod
+    def _touch(query, session):
+        """Bump the data version of the table a write statement changed"""
+        table = DataVersion.target_table(query)
+        if table is None:
+            return
+        if session is None or session.conn is None:
+            DataVersion.bump([table])
+            return
+        if not session.touched:
+            # Readers may only see the new version once the rows are committed
+            def bump():
+                tables, session.touched = session.touched, set()
+                DataVersion.bump(tables)
+            session.after_end(bump)
+        session.touched.add(table)
+    
+    @staticmethod
+    def execute_update(query, params=None):
+        """Execute a write and return the number of rows it changed"""
+        return Database._execute(query, params, fetch=False, rowcount=True)
+    
+    @staticmethod
+    def _execute(query, params, fetch, rowcount=False, primary=False):
+        session = Database.current_session()
+        started = time.perf_counter()
+        acquired = started
+        rows = 0
+        failed = False
+        readonly = fetch and Database._is_read(query)
+        try:
+            with Database.get_connection(readonly, primary) as conn:
+                acquired = time.perf_counter()
+                # Parameterised statements are the hot lookups: run them through
+                # the connection's prepared-statement cache. Statements with very
+                # many parameters are usually variable-length IN lists, which would
+                # only churn the cache.
+                prepared = (Config.DB_USE_PREPARED_STATEMENTS and bool(params)
+                            and len(params) <= Config.DB_PREPARE_MAX_PARAMS)
+                cursor = None
+                try:
+                    if prepared:
+                        cursor = conn.statements.execute(query, tuple(params))
+                    else:
+                        cursor = conn.cursor(dictionary=True)
+                        cursor.execute(query, params or ())
+                    
+                    if fetch:
+                        result = cursor.fetchall()
+                        rows = len(result)
+                        return result
+                    
+                    rows = cursor.rowcount
+                    # Inside a unit of work the session commits at the end
+                    if session is None:
+                        conn.commit()
+                    Database._touch(query, session)
+                    return rows if rowcount else cursor.lastrowid
+                except Exception:
+                    if not fetch and session is not None:
+                        session.mark_failed()
+                    raise
+                finally:
+                    # Cached prepared cursors stay open for reuse
+                    if cursor is not None and not prepared:
+                        cursor.close()
+        except Exception:
+            failed = True
+            Database._local.query_errors = Database.query_errors() + 1
+            raise
+        finally:
+            finished = time.perf_counter()
+            QueryStats.record(query, params, finished - acquired, rows=rows,
+                              acquire=acquired - started, error=failed)
     
     @staticmethod
     def execute_many(query, data):
         """Execute query with multiple data sets"""
-        with Database.get_connection() as conn:
+        session = Database.current_session()
+        data = list(data)
+        started = time.perf_counter()
+        acquired = started
+        failed = False
+        try:
+            with Database.get_connection() as conn:
+                acquired = time.perf_counter()
+                # executemany already rewrites INSERT ... VALUES into one
+                # multi-row statement, which beats N prepared executions.
+                prepared = Config.DB_USE_PREPARED_STATEMENTS and not Database._is_batch_insert(query)
+                cursor = None
+                try:
+                    if prepared:
+                        for row in data:
+                            cursor = conn.statements.execute(query, tuple(row))
+                    else:
+                        cursor = conn.cursor()
+                        cursor.executemany(query, data)
+                    if session is None:
+                        conn.commit()
+                    Database._touch(query, session)
+                    return True
+                except Exception:
+                    if session is not None:
+                        session.mark_failed()
+                    raise
+                finally:
+                    if cursor is not None and not prepared:
+                        cursor.close()
+        except Exception:
+            failed = True
+            Database._local.query_errors = Database.query_errors() + 1
+            raise
+        finally:
+            finished = time.perf_counter()
+            QueryStats.record(query, data[0] if data else None, finished - acquired,
+                              rows=len(data), acquire=acquired - started, error=failed)
+    
+    @staticmethod
+    def query_stats(limit=None):
+        """Get per-statement timings, most expensive first"""
+        return QueryStats.snapshot(limit=limit)
+    
+    @staticmethod
+    def stream_query(query, params=None, batch_size=None):
+        """
+        Yield result rows one at a time without materialising the result set.
+        
+        Rows are read from an unbuffered cursor in fetchmany batches, so memory
+        stays constant however large the table is. The generator holds its own
+        pooled connection (never the request session's, which an unread result
+        would block) until it is exhausted or closed.
+        """
+        batch_size = batch_size or Config.DB_STREAM_BATCH_SIZE
+        started = time.perf_counter()
+        conn = Database.acquire_read() if Database._is_read(query) else Database.get_pool().acquire()
+        pool = conn.pool
+        acquired = time.perf_counter()
+        busy = 0.0
+        rows = 0
+        exhausted = False
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(query, params or ())
+            while True:
+                fetch_started = time.perf_counter()
+                batch = cursor.fetchmany(batch_size)
+                # Time spent in the consumer between batches is not query time
+                busy += time.perf_counter() - fetch_started
+                if not batch:
+                    break
+                rows += len(batch)
+                for row in batch:
+                    yield row
+            cursor.close()
+            exhausted = True
+        except Database.backend_errors() as e:
+            print(f"Database error: {e}")
+            raise
+        finally:
+            if exhausted:
+                pool.release(conn)
+            else:
+                # Abandoned mid-stream: the unread rows make the connection
+                # unusable, and closing it is cheaper than draining them.
+                pool.discard(conn)
+            QueryStats.record(query, params, busy, rows=rows,
+                              acquire=acquired - started, error=not exhausted)
+    
+    @staticmethod
+    def fetch_page(select_sql, sort_column, id_column, sort_key, id_key,
+                   cursor=None, limit=None, where=None, params=()):
+        """
+        Keyset pagination, newest first: ORDER BY sort_column DESC, id_column DESC.
+        
+        Instead of OFFSET, the page continues strictly after the (sort, id)
+        pair carried in ``cursor``, so deep pages cost the same as page one.
+        Rows whose sort value is NULL follow all the others, newest id first;
+        they are read by a second query once the dated rows run out, so each
+        query stays a range scan on the (sort_column, id_column) index.
+        Returns {'items': [...], 'next_cursor': token or None}.
+        """
+        limit = max(1, min(int(limit or Config.ITEMS_PER_PAGE), Config.MAX_PAGE_SIZE))
+        last_sort, last_id = decode_cursor(cursor) if cursor else (None, None)
+        
+        def run(conditions, values, order, count):
+            conditions = ([where] if where else []) + conditions
+            query = select_sql
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += f" ORDER BY {order} LIMIT %s"
+            return Database.execute_query(query, tuple(params) + tuple(values) + (count,))
+        
+        if sort_column == id_column:
+            conditions, values = [], []
+            if cursor:
+                conditions, values = [f"{id_column} < %s"], [last_id]
+            rows = run(conditions, values, f"{id_column} DESC", limit + 1)
+        else:
+            rows = []
+            if not cursor or last_sort is not None:
+                conditions, values = [f"{sort_column} IS NOT NULL"], []
+                if cursor:
+                    # Same rows as (sort, id) < (last_sort, last_id), written so
+                    # the index range starts at last_sort
+                    conditions.append(f"{sort_column} <= %s AND ({sort_column} < %s OR {id_column} < %s)")
+                    values = [last_sort, last_sort, last_id]
+                rows = run(conditions, values, f"{sort_column} DESC, {id_column} DESC", limit + 1)
+            if len(rows) <= limit:
+                conditions, values = [f"{sort_column} IS NULL"], []
+                if cursor and last_sort is None:
+                    conditions.append(f"{id_column} < %s")
+                    values = [last_id]
+                rows += run(conditions, values, f"{id_column} DESC", limit + 1 - len(rows))
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor([last[sort_key], last[id_key]])
+        return {'items': rows, 'next_cursor': next_cursor}
+
+
+class DataVersion:
+    """
+    Per-table version counters in the data_version table.
+    
+    Every write that goes through Database bumps the version of the table it
+    changed once its transaction ends, so results cached under a set of
+    versions stay valid exactly until one of those tables changes. Versions
+    are read at most once per DATA_VERSION_TTL seconds per process.
+    """
+    
+    _WRITE_TARGET = re.compile(
+        r'^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM)\s+`?(\w+)`?',
+        re.I
+    )
+    # Bookkeeping tables whose writes do not invalidate anything
+    UNVERSIONED = {'data_version', 'census_counter'}
+    
+    _targets = {}
+    _snapshot = None
+    _snapshot_expires = 0.0
+    _lock = threading.Lock()
+    
+    DDL = """
+        CREATE TABLE IF NOT EXISTS data_version (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at DATETIME NULL
+        )
+    """
+    
+    @staticmethod
+    def target_table(query):
+        """Table changed by an INSERT/REPLACE/UPDATE/DELETE, else None"""
+        if query in DataVersion._targets:
+            return DataVersion._targets[query]
+        match = DataVersion._WRITE_TARGET.match(query)
+        table = match.group(1).lower() if match else None
+        if table in DataVersion.UNVERSIONED:
+            table = None
+        if len(DataVersion._targets) < 2048:
+            DataVersion._targets[query] = table
+        return table
+    
+    
+    @staticmethod
+    def bump(tables):
+        """
+        Increment the versions of ``tables``. Runs on its own autocommitted
+        connection so it never extends (or is lost with) a caller's transaction.
+        """
+        tables = sorted(set(tables))
+        if not tables:
+            return
+        conn = Database.get_pool().acquire()
+        try:
             cursor = conn.cursor()
-            cursor.executemany(query, data)
-            conn.commit()
+            for table in tables:
+                cursor.execute("""
+                    UPDATE data_version SET version = version + 1, updated_at = NOW()
+                    WHERE table_name = %s
+                """, (table,))
+                if cursor.rowcount == 0:
+                    try:
+                        cursor.execute("""
+                            INSERT INTO data_version (table_name, version, updated_at)
+                            VALUES (%s, 1, NOW())
+                        """, (table,))
+                    except Exception:
+                        # Another writer created the row first
+                        cursor.execute("""
+                            UPDATE data_version SET version = version + 1, updated_at = NOW()
+                            WHERE table_name = %s
+                        """, (table,))
             cursor.close()
-            return True
+            conn.commit()
+        except Exception as e:
+            print(f"Error bumping data versions: {e}")
+        finally:
+            conn.pool.release(conn)
+        DataVersion._snapshot_expires = 0.0
+    
+    @staticmethod
+    def _load():
+        """All versions as {table: (version, updated_at)}, memoised briefly"""
+        if DataVersion._snapshot is not None and time.monotonic() < DataVersion._snapshot_expires:
+            return DataVersion._snapshot
+        rows = Database.execute_query("SELECT table_name, version, updated_at FROM data_version")
+        snapshot = {row['table_name']: (int(row['version']), row['updated_at']) for row in rows}
+        with DataVersion._lock:
+            DataVersion._snapshot = snapshot
+            DataVersion._snapshot_expires = time.monotonic() + Config.DATA_VERSION_TTL
+        return snapshot
+    
+    @staticmethod
+    def get(tables):
+        """Version tuple for ``tables`` (0 for tables never written)"""
+        snapshot = DataVersion._load()
+        return tuple(snapshot.get(table, (0, None))[0] for table in tables)
+    
+    @staticmethod
+    def last_modified(tables):
+        """Most recent write time across ``tables``, or None if unknown"""
+        snapshot = DataVersion._load()
+        times = [snapshot[table][1] for table in tables
+                 if table in snapshot and snapshot[table][1] is not None]
+        return max(times) if times else None
+
+
+def versioned_cache(*tables, ttl=None, daily=False, max_size=64):
+    """
+    Cache a function's results under the current data versions of ``tables``.
+    
+    A result is reused until one of the tables is written (or ``ttl`` seconds
+    pass, which bounds staleness from writes made outside this application).
+    ``daily`` adds today's date to the key for queries relative to CURDATE().
+    Results computed while a query failed are not cached, since the callers
+    fall back to empty values on errors.
+    """
+    def decorator(func):
+        cache = LRUCache(func.__qualname__, max_size, ttl or Config.ANALYTICS_CACHE_TTL)
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                versions = DataVersion.get(tables)
+            except Exception as e:
+                print(f"Data versions unavailable, skipping cache: {e}")
+                return func(*args, **kwargs)
+            key = (args, tuple(sorted(kwargs.items())), versions,
+                   date.today() if daily else None)
+            cached = cache.lookup(key)
+            if cached is not MISSING:
+                return copy.deepcopy(cached)
+            
+            errors = Database.query_errors()
+            result = func(*args, **kwargs)
+            if Database.query_errors() == errors and not Database.has_pending_writes():
+                cache.set(key, copy.deepcopy(result))
+            return result
+        
+        wrapper.cache = cache
+        return wrapper
+    return decorator
 
 
 class PatientModel:
     """Patient management operations"""
     
+    # Entity cache of patient rows keyed by (patient_id, patient table version).
+    # The version lives in the database, so a write made by any worker
+    # retires every entry cached before it.
+    _cache = LRUCache('patients', Config.PATIENT_CACHE_SIZE, Config.PATIENT_CACHE_TTL)
+    
     @staticmethod
     def get_all_patients(limit=None, offset=0):
         """Get all patients with pagination"""
         query = "SELECT * FROM patient ORDER BY patient_id DESC"
         if limit:
-            query += f" LIMIT {limit} OFFSET {offset}"
+            query += " LIMIT %s OFFSET %s"
+            return Database.execute_query(query, (int(limit), int(offset)))
         return Database.execute_query(query)
     
+    @staticmethod
+    def iter_all_patients(batch_size=None):
+        """Stream every patient (oldest first) in constant memory"""
+        query = "SELECT * FROM patient ORDER BY patient_id"
+        return Database.stream_query(query, batch_size=batch_size)
+    
+    @staticmethod
+    def get_patients_page(cursor=None, limit=None, risk_level=None):
+        """
+        Get one page of patients with their precomputed risk and a next-page
+        cursor. Newest first, or highest risk first when filtered by level.
+        """
+        if risk_level:
+            return Database.fetch_page(
+                """
+                SELECT p.*, r.risk_score, r.risk_level
+                FROM patient_risk r
+                JOIN patient p ON p.patient_id = r.patient_id
+                """,
+                'r.risk_score', 'r.patient_id', 'risk_score', 'patient_id',
+                cursor=cursor, limit=limit, where="r.risk_level = %s", params=(risk_level,)
+            )
+        return Database.fetch_page(
+            """
+            SELECT p.*, r.risk_score, r.risk_level
+            FROM patient p
+            LEFT JOIN patient_risk r ON r.patient_id = p.patient_id
+            """,
+            'p.patient_id', 'p.patient_id', 'patient_id', 'patient_id',
+            cursor=cursor, limit=limit
+        )
+    
     @staticmethod
     def get_patient_by_id(patient_id):
-        """Get patient details by ID"""
+        """Get patient details by ID (served from the entity cache when possible)"""
+        try:
+            patient_id = int(patient_id)
+        except (TypeError, ValueError):
+            return None
         query = "SELECT * FROM patient WHERE patient_id = %s"
-        result = Database.execute_query(query, (patient_id,))
-        return result[0] if result else None
+        # A session with uncommitted writes must see them, not the cache
+        if Database.has_pending_writes():
+            result = Database.execute_query(query, (patient_id,))
+            return result[0] if result else None
+        
+        try:
+            # Read before the row, so a concurrent write can only make the
+            # entry retire early, never keep a stale row current
+            key = (patient_id, DataVersion.get(('patient',)))
+        except Exception as e:
+            print(f"Data versions unavailable, skipping cache: {e}")
+            result = Database.execute_query(query, (patient_id,))
+            return result[0] if result else None
+        cached = PatientModel._cache.lookup(key)
+        if cached is not MISSING:
+            return dict(cached)
+        
+        # Fill from the primary: a lagging replica could hand back the row
+        # as it was before the write that produced this version
+        result = Database.execute_query(query, (patient_id,), primary=True)
+        patient = result[0] if result else None
+        if patient is not None:
+            PatientModel._cache.set(key, dict(patient))
+        return patient
     
     @staticmethod
     def add_patient(name, age, gender, contact_info):
@@ -75,7 +852,11 @@ class PatientModel:
             INSERT INTO patient (name, age, gender, contact_info) 
             VALUES (%s, %s, %s, %s)
         """
-        return Database.execute_query(query, (name, age, gender, contact_info), fetch=False)
+        with Database.transaction():
+            patient_id = Database.execute_query(query, (name, age, gender, contact_info), fetch=False)
+            if patient_id:
+                PatientRiskModel.refresh([patient_id])
+        return patient_id
     
     @staticmethod
     def update_patient(patient_id, name, age, gender, contact_info):
@@ -85,26 +866,36 @@ class PatientModel:
             SET name = %s, age = %s, gender = %s, contact_info = %s 
             WHERE patient_id = %s
         """
-        Database.execute_query(query, (name, age, gender, contact_info, patient_id), fetch=False)
+        with Database.transaction():
+            Database.execute_query(query, (name, age, gender, contact_info, patient_id), fetch=False)
+            PatientRiskModel.refresh([patient_id])
         return True
     
     @staticmethod
     def delete_patient(patient_id):
         """Delete patient"""
         query = "DELETE FROM patient WHERE patient_id = %s"
-        Database.execute_query(query, (patient_id,), fetch=False)
+        with Database.transaction():
+            Database.execute_query(query, (patient_id,), fetch=False)
+            PatientRiskModel.refresh([patient_id])
+            # The patient's history rows go with them
+            Database.after_transaction(DiseaseAggregator.invalidate)
         return True
     
     @staticmethod
-    def search_patients(search_term):
-        """Search patients by name or contact"""
+    def search_patients(search_term, limit=None):
+        """Search patients by name or contact (newest matches first, at most ``limit``)"""
         query = """
-            SELECT * FROM patient 
-            WHERE name LIKE %s OR contact_info LIKE %s
-            ORDER BY patient_id DESC
+            SELECT p.*, r.risk_score, r.risk_level
+            FROM patient p
+            LEFT JOIN patient_risk r ON r.patient_id = p.patient_id
+            WHERE p.name LIKE %s OR p.contact_info LIKE %s
+            ORDER BY p.patient_id DESC
+            LIMIT %s
         """
         search = f"%{search_term}%"
-        return Database.execute_query(query, (search, search))
+        limit = max(1, min(int(limit or Config.SEARCH_RESULTS_LIMIT), Config.MAX_PAGE_SIZE))
+        return Database.execute_query(query, (search, search, limit))
     
     @staticmethod
     def get_patient_count():
@@ -114,6 +905,208 @@ class PatientModel:
         return result[0]['count'] if result else 0
 
 
+class PatientRiskModel:
+    """
+    Precomputed risk scores in the patient_risk table, one row per patient.
+    
+    Writes that change a patient's age, history or admissions recompute that
+    patient's row in the same transaction, so risk can be read, filtered and
+    sorted with an indexed query instead of per-patient aggregates.
+    rebuild() recomputes every row (after bulk imports or scoring changes).
+    """
+    
+    COLUMNS = ('patient_id', 'age', 'history_count', 'admission_count', 'last_visit',
+               'last_admission', 'risk_score', 'risk_level', 'health_score', 'updated_at')
+    
+    # Per-patient aggregates for a handful of ids (correlated subqueries use
+    # the patient_id indexes on medicalhistory and patientreport)
+    _AGGREGATE_FOR_IDS = """
+        SELECT p.patient_id, p.age,
+               (SELECT COUNT(*) FROM medicalhistory mh WHERE mh.patient_id = p.patient_id) as history_count,
+               (SELECT MAX(mh.date_time) FROM medicalhistory mh WHERE mh.patient_id = p.patient_id) as last_visit,
+               (SELECT COUNT(*) FROM patientreport pr WHERE pr.patient_id = p.patient_id) as admission_count,
+               (SELECT MAX(pr.in_date_time) FROM patientreport pr WHERE pr.patient_id = p.patient_id) as last_admission
+        FROM patient p
+        WHERE p.patient_id IN ({placeholders})
+    """
+    
+    # The same aggregates for every patient, grouped once per table
+    _AGGREGATE_ALL = """
+        SELECT p.patient_id, p.age,
+               COALESCE(mh.history_count, 0) as history_count, mh.last_visit,
+               COALESCE(pr.admission_count, 0) as admission_count, pr.last_admission
+        FROM patient p
+        LEFT JOIN (
+            SELECT patient_id, COUNT(*) as history_count, MAX(date_time) as last_visit
+            FROM medicalhistory GROUP BY patient_id
+        ) mh ON mh.patient_id = p.patient_id
+        LEFT JOIN (
+            SELECT patient_id, COUNT(*) as admission_count, MAX(in_date_time) as last_admission
+            FROM patientreport GROUP BY patient_id
+        ) pr ON pr.patient_id = p.patient_id
+        ORDER BY p.patient_id
+    """
+    
+    DDL = """
+        CREATE TABLE IF NOT EXISTS patient_risk (
+            patient_id INT PRIMARY KEY,
+            age INT NULL,
+            history_count INT NOT NULL DEFAULT 0,
+            admission_count INT NOT NULL DEFAULT 0,
+            last_visit DATETIME NULL,
+            last_admission DATETIME NULL,
+            risk_score INT NOT NULL,
+            risk_level VARCHAR(10) NOT NULL,
+            health_score INT NOT NULL,
+            updated_at DATETIME NOT NULL
+        )
+    """
+    INDEXES = [
+        "CREATE INDEX idx_patient_risk_level_score ON patient_risk (risk_level, risk_score, patient_id)",
+        "CREATE INDEX idx_patient_risk_score ON patient_risk (risk_score, patient_id)"
+    ]
+    
+    
+    @staticmethod
+    def _score(rows, now):
+        """patient_risk rows (as dicts) for aggregate rows, scored as one batch"""
+        if not rows:
+            return []
+        points = risk_scoring.score_arrays(
+            [row['age'] for row in rows],
+            [row['history_count'] for row in rows],
+            [row['admission_count'] for row in rows]
+        )
+        levels = risk_scoring.risk_levels(points['total'])
+        return [{
+            'patient_id': row['patient_id'],
+            'age': row['age'],
+            'history_count': int(row['history_count'] or 0),
+            'admission_count': int(row['admission_count'] or 0),
+            'last_visit': row['last_visit'],
+            'last_admission': row['last_admission'],
+            'risk_score': int(points['total'][i]),
+            'risk_level': str(levels[i]),
+            'health_score': risk_scoring.health_score(
+                row['age'], row['history_count'], row['admission_count']
+            ),
+            'updated_at': now
+        } for i, row in enumerate(rows)]
+    
+    @staticmethod
+    def _save(scored):
+        columns = ', '.join(PatientRiskModel.COLUMNS)
+        placeholders = ', '.join(['%s'] * len(PatientRiskModel.COLUMNS))
+        Database.execute_many(
+            f"REPLACE INTO patient_risk ({columns}) VALUES ({placeholders})",
+            [tuple(row[col] for col in PatientRiskModel.COLUMNS) for row in scored]
+        )
+    
+    @staticmethod
+    def refresh(patient_ids):
+        """
+        Recompute the rows of ``patient_ids`` inside the caller's transaction
+        (rows of deleted patients are removed). Returns {patient_id: row}.
+        """
+        ids = sorted({int(pid) for pid in patient_ids if pid is not None})
+        if not ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(ids))
+        with Database.transaction():
+            rows = Database.execute_query(
+                PatientRiskModel._AGGREGATE_FOR_IDS.format(placeholders=placeholders), tuple(ids)
+            )
+            now = datetime.now().replace(microsecond=0)
+            scored = PatientRiskModel._score(rows, now)
+            if scored:
+                PatientRiskModel._save(scored)
+            missing = set(ids) - {row['patient_id'] for row in scored}
+            if missing:
+                Database.execute_query(
+                    f"DELETE FROM patient_risk WHERE patient_id IN ({', '.join(['%s'] * len(missing))})",
+                    tuple(sorted(missing)), fetch=False
+                )
+        return {row['patient_id']: row for row in scored}
+    
+    @staticmethod
+    def get(patient_id):
+        """Risk row for one patient, computing it if it is missing"""
+        result = Database.execute_query("SELECT * FROM patient_risk WHERE patient_id = %s", (patient_id,))
+        if result:
+            return result[0]
+        return PatientRiskModel.refresh([patient_id]).get(int(patient_id))
+    
+    @staticmethod
+    def get_many(patient_ids):
+        """
+        Risk rows for several patients as {patient_id: row}. Rows that are
+        missing are computed, as in get(); ids of unknown patients are omitted.
+        """
+        ids = sorted({int(pid) for pid in patient_ids})
+        if not ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(ids))
+        rows = Database.execute_query(
+            f"SELECT * FROM patient_risk WHERE patient_id IN ({placeholders})", tuple(ids)
+        )
+        found = {row['patient_id']: row for row in rows}
+        missing = [pid for pid in ids if pid not in found]
+        if missing:
+            found.update(PatientRiskModel.refresh(missing))
+        return found
+    
+    @staticmethod
+    def get_highest_risk(limit=10, risk_level=None):
+        """Patients with the highest risk scores (served by the score indexes)"""
+        query = """
+            SELECT p.*, r.risk_score, r.risk_level
+            FROM patient_risk r
+            JOIN patient p ON p.patient_id = r.patient_id
+        """
+        params = []
+        if risk_level:
+            query += " WHERE r.risk_level = %s"
+            params.append(risk_level)
+        query += " ORDER BY r.risk_score DESC, r.patient_id DESC LIMIT %s"
+        params.append(int(limit))
+        return Database.execute_query(query, tuple(params))
+    
+    @staticmethod
+    def rebuild(batch_size=None):
+        """Recompute every patient's row; returns the number of rows written"""
+        batch_size = batch_size or Config.BULK_IMPORT_CHUNK_SIZE
+        now = datetime.now().replace(microsecond=0)
+        written = 0
+        batch = []
+        for row in Database.stream_query(PatientRiskModel._AGGREGATE_ALL):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                PatientRiskModel._save(PatientRiskModel._score(batch, now))
+                written += len(batch)
+                batch = []
+        if batch:
+            PatientRiskModel._save(PatientRiskModel._score(batch, now))
+            written += len(batch)
+        Database.execute_query(
+            "DELETE FROM patient_risk WHERE patient_id NOT IN (SELECT patient_id FROM patient)",
+            fetch=False
+        )
+        return written
+    
+    @staticmethod
+    def backfill():
+        """
+        Fill patient_risk when it is empty but patients exist, once after the
+        table was added ('flask backfill-patient-risk'; until then rows are
+        computed as patients are read). Returns the number of rows written.
+        """
+        if Database.execute_query("SELECT 1 FROM patient_risk LIMIT 1"):
+            return 0
+        if not Database.execute_query("SELECT 1 FROM patient LIMIT 1"):
+            return 0
+        return PatientRiskModel.rebuild()
+
+
 class MedicalHistoryModel:
     """Medical history operations"""
     
@@ -134,7 +1127,202 @@ class MedicalHistoryModel:
             INSERT INTO medicalhistory (patient_id, disease, treatment, date_time) 
             VALUES (%s, %s, %s, %s)
         """
-        return Database.execute_query(query, (patient_id, disease, treatment, date_time), fetch=False)
+        with Database.transaction():
+            history_id = Database.execute_query(query, (patient_id, disease, treatment, date_time), fetch=False)
+            PatientRiskModel.refresh([patient_id])
+            Database.after_transaction(DiseaseAggregator.mark_stale)
+        return history_id
+
+
+
+class DiseaseAggregator:
+    """
+    In-memory disease frequencies behind the disease-pattern analytics.
+    
+    Per-disease counts and patient-age sums are kept overall, per day (for the
+    last DISEASE_STATS_DAY_BUCKETS days) and per month, so top-N lists,
+    including windowed ones, never scan medicalhistory. The counters are
+    seeded by one full scan (of the Parquet snapshot, when it is the
+    analytics source, plus the live rows since it) and then follow new rows
+    through a history_id watermark: add_history marks them stale, and inserts
+    made by other processes show up as a new medicalhistory data version.
+    Each catch-up re-reads the last DISEASE_STATS_OVERLAP ids, skipping those
+    already counted, so a row that commits after a higher id is not missed.
+    Deleted rows and changed patient ages are folded in by a full reseed
+    every DISEASE_STATS_RESEED seconds (straight away after a patient is
+    deleted).
+    """
+    
+    _QUERY = """
+        SELECT mh.history_id, mh.disease, mh.date_time, p.age
+        FROM medicalhistory mh
+        LEFT JOIN patient p ON mh.patient_id = p.patient_id
+        WHERE mh.history_id > %s AND mh.disease IS NOT NULL AND mh.disease != ''
+        ORDER BY mh.history_id
+    """
+    
+    _lock = threading.Lock()
+    _refresh_lock = threading.Lock()
+    # disease -> [count, age_sum, ages_counted], overall and per bucket
+    _totals = {}
+    _days = {}
+    _months = {}
+    # Last history_id folded in; None until seeded
+    _watermark = None
+    # Ids counted within DISEASE_STATS_OVERLAP of the watermark
+    _seen = set()
+    _versions = None
+    _seeded_at = 0.0
+    _stale = False
+    _reseed = True
+    
+    @staticmethod
+    def _add(counters, disease, age):
+        entry = counters.get(disease)
+        if entry is None:
+            entry = counters[disease] = [0, 0, 0]
+        entry[0] += 1
+        if age is not None:
+            entry[1] += age
+            entry[2] += 1
+    
+    @staticmethod
+    def _apply(rows, totals, days, months, seen, cutoff, watermark):
+        """Fold rows not yet in ``seen`` into the counters and return the new watermark"""
+        overlap = Config.DISEASE_STATS_OVERLAP
+        for row in rows:
+            history_id = row['history_id']
+            if history_id in seen:
+                continue
+            seen.add(history_id)
+            disease, age = row['disease'], row['age']
+            DiseaseAggregator._add(totals, disease, age)
+            when = row['date_time']
+            if when is not None:
+                day = when.date() if isinstance(when, datetime) else when
+                if day >= cutoff:
+                    DiseaseAggregator._add(days.setdefault(day, {}), disease, age)
+                DiseaseAggregator._add(months.setdefault(day.strftime('%Y-%m'), {}), disease, age)
+            watermark = max(watermark, history_id)
+            if len(seen) > 2 * overlap:
+                # Ids this far below the watermark are never read again
+                seen.difference_update([i for i in seen if i <= watermark - overlap])
+        return watermark
+    
+    @staticmethod
+    def _seed(cutoff):
+        """Fresh (totals, days, months, seen, watermark) from a full scan"""
+        cls = DiseaseAggregator
+        if Config.ANALYTICS_SOURCE == 'snapshot':
+            # Imported here: analytics_snapshot imports this module
+            from analytics_snapshot import snapshot_analytics
+            try:
+                rows = snapshot_analytics.disease_history()
+                if rows is not None:
+                    counters = ({}, {}, {}, set())
+                    watermark = cls._apply(rows, *counters, cutoff, 0)
+                    # The snapshot ends at its last export; later rows are live
+                    since = max(watermark - Config.DISEASE_STATS_OVERLAP, 0)
+                    watermark = cls._apply(Database.stream_query(cls._QUERY, (since,)),
+                                           *counters, cutoff, watermark)
+                    return counters + (watermark,)
+            except Exception as e:
+                print(f"Snapshot unavailable for disease counters, scanning the database: {e}")
+        counters = ({}, {}, {}, set())
+        return counters + (cls._apply(Database.stream_query(cls._QUERY, (0,)), *counters, cutoff, 0),)
+    
+    @staticmethod
+    def _due(versions):
+        cls = DiseaseAggregator
+        return (cls._reseed or cls._stale or versions != cls._versions
+                or time.monotonic() - cls._seeded_at >= Config.DISEASE_STATS_RESEED)
+    
+    @staticmethod
+    def _refresh():
+        """Seed, reseed or catch up with new rows as needed"""
+        cls = DiseaseAggregator
+        versions = DataVersion.get(('medicalhistory',))
+        if not cls._due(versions):
+            return
+        # One refresher at a time; once seeded, others keep reading the
+        # current counters instead of waiting
+        if not cls._refresh_lock.acquire(blocking=cls._watermark is None):
+            return
+        reseed = cls._reseed or time.monotonic() - cls._seeded_at >= Config.DISEASE_STATS_RESEED
+        try:
+            if not cls._due(versions):
+                return
+            # Cleared first, so a write landing mid-refresh triggers another one
+            cls._stale = cls._reseed = False
+            cutoff = date.fromordinal(date.today().toordinal() - Config.DISEASE_STATS_DAY_BUCKETS + 1)
+            if reseed:
+                seeded = cls._seed(cutoff)
+                with cls._lock:
+                    cls._totals, cls._days, cls._months, cls._seen, cls._watermark = seeded
+                cls._seeded_at = time.monotonic()
+            else:
+                since = max(cls._watermark - Config.DISEASE_STATS_OVERLAP, 0)
+                rows = Database.execute_query(cls._QUERY, (since,))
+                with cls._lock:
+                    cls._watermark = cls._apply(rows, cls._totals, cls._days, cls._months,
+                                                cls._seen, cutoff, cls._watermark)
+                    for day in [day for day in cls._days if day < cutoff]:
+                        del cls._days[day]
+            cls._versions = versions
+        except Exception:
+            # Try again on the next read
+            if reseed:
+                cls._reseed = True
+            else:
+                cls._stale = True
+            raise
+        finally:
+            cls._refresh_lock.release()
+    
+    @staticmethod
+    def mark_stale():
+        """Catch up with new rows on the next read"""
+        DiseaseAggregator._stale = True
+    
+    @staticmethod
+    def invalidate():
+        """Reseed from a full scan on the next read"""
+        DiseaseAggregator._reseed = True
+    
+    @staticmethod
+    def top(limit=10, days=None, months=None):
+        """
+        Most frequent diseases, overall or over the last ``days`` days (up to
+        DISEASE_STATS_DAY_BUCKETS) or ``months`` calendar months, as dicts of
+        disease, frequency and avg_age (None when no ages are recorded).
+        """
+        DiseaseAggregator._refresh()
+        today = date.today()
+        with DiseaseAggregator._lock:
+            if days:
+                days = min(days, Config.DISEASE_STATS_DAY_BUCKETS)
+                since = date.fromordinal(today.toordinal() - days + 1)
+                buckets = [counters for day, counters in DiseaseAggregator._days.items() if day >= since]
+            elif months:
+                index = today.year * 12 + today.month - months
+                since = f"{index // 12:04d}-{index % 12 + 1:02d}"
+                buckets = [counters for month, counters in DiseaseAggregator._months.items() if month >= since]
+            else:
+                buckets = [DiseaseAggregator._totals]
+            merged = {}
+            for counters in buckets:
+                for disease, (count, age_sum, ages) in counters.items():
+                    entry = merged.setdefault(disease, [0, 0, 0])
+                    entry[0] += count
+                    entry[1] += age_sum
+                    entry[2] += ages
+        
+        ranked = heapq.nsmallest(limit, merged.items(), key=lambda item: (-item[1][0], item[0]))
+        return [{
+            'disease': disease,
+            'frequency': count,
+            'avg_age': age_sum / ages if ages else None
+        } for disease, (count, age_sum, ages) in ranked]
 
 
 class PatientReportModel:
@@ -150,9 +1338,23 @@ class PatientReportModel:
             ORDER BY pr.in_date_time DESC
         """
         if limit:
-            query += f" LIMIT {limit}"
+            query += " LIMIT %s"
+            return Database.execute_query(query, (int(limit),))
         return Database.execute_query(query)
     
+    @staticmethod
+    def get_reports_page(cursor=None, limit=None):
+        """Get one page of reports (latest admission first) with a next-page cursor"""
+        return Database.fetch_page(
+            """
+            SELECT pr.*, p.name as patient_name, p.age, p.gender 
+            FROM patientreport pr
+            LEFT JOIN patient p ON pr.patient_id = p.patient_id
+            """,
+            'pr.in_date_time', 'pr.report_id', 'in_date_time', 'report_id',
+            cursor=cursor, limit=limit
+        )
+    
     @staticmethod
     def get_report_by_id(report_id):
         """Get specific report"""
@@ -172,17 +1374,43 @@ class PatientReportModel:
             INSERT INTO patientreport (patient_id, diagnosis, treatment, in_date_time) 
             VALUES (%s, %s, %s, %s)
         """
-        return Database.execute_query(query, (patient_id, diagnosis, treatment, in_date_time), fetch=False)
+        with Database.transaction():
+            report_id = Database.execute_query(query, (patient_id, diagnosis, treatment, in_date_time), fetch=False)
+            CensusModel.adjust('active_admissions', 1)
+            PatientRiskModel.refresh([patient_id])
+        return report_id
     
     @staticmethod
     def update_report_discharge(report_id, out_date_time):
         """Update report with discharge time"""
-        query = """
-            UPDATE patientreport 
-            SET out_date_time = %s 
-            WHERE report_id = %s
-        """
-        Database.execute_query(query, (out_date_time, report_id), fetch=False)
+        with Database.transaction():
+            if out_date_time:
+                # Only the first discharge of an active admission moves the census
+                changed = Database.execute_update("""
+                    UPDATE patientreport 
+                    SET out_date_time = %s 
+                    WHERE report_id = %s AND out_date_time IS NULL
+                """, (out_date_time, report_id))
+                if changed:
+                    CensusModel.adjust('active_admissions', -1)
+                    return True
+            else:
+                changed = Database.execute_update("""
+                    UPDATE patientreport 
+                    SET out_date_time = NULL 
+                    WHERE report_id = %s AND out_date_time IS NOT NULL
+                """, (report_id,))
+                if changed:
+                    CensusModel.adjust('active_admissions', 1)
+                return True
+            
+            # Correcting the time of an existing discharge
+            query = """
+                UPDATE patientreport 
+                SET out_date_time = %s 
+                WHERE report_id = %s
+            """
+            Database.execute_query(query, (out_date_time, report_id), fetch=False)
         return True
     
     @staticmethod
@@ -212,9 +1440,24 @@ class OPDModel:
             ORDER BY o.appointment_date DESC
         """
         if limit:
-            query += f" LIMIT {limit}"
+            query += " LIMIT %s"
+            return Database.execute_query(query, (int(limit),))
         return Database.execute_query(query)
     
+    @staticmethod
+    def get_appointments_page(cursor=None, limit=None):
+        """Get one page of OPD appointments (latest first) with a next-page cursor"""
+        return Database.fetch_page(
+            """
+            SELECT o.*, p.name as patient_name, p.age, s.name as staff_name
+            FROM opdappointment o
+            LEFT JOIN patient p ON o.patient_id = p.patient_id
+            LEFT JOIN staff s ON o.staff_id = s.staff_id
+            """,
+            'o.appointment_date', 'o.app_id', 'appointment_date', 'app_id',
+            cursor=cursor, limit=limit
+        )
+    
     @staticmethod
     def add_appointment(patient_id, staff_id, issue_description, appointment_date, next_visit_date=None):
         """Add new OPD appointment"""
@@ -246,27 +1489,67 @@ class OPDModel:
 class StaffModel:
     """Staff management operations"""
     
+    # Staff and roles change a few times a month, so every read is served
+    # from an in-process snapshot that is rebuilt when either table's data
+    # version moves (see DataVersion) or REFERENCE_DATA_TTL expires.
+    _reference = None
+    _reference_lock = threading.Lock()
+    
     @staticmethod
-    def get_all_staff():
-        """Get all staff members"""
-        query = """
+    def load_reference_data():
+        """Rebuild the staff/role snapshot and its role -> staff index"""
+        # Versions first and rows from the primary, as in
+        # PatientModel.get_patient_by_id: a write landing in between can only
+        # retire the snapshot early, never label old rows with its version
+        versions = DataVersion.get(('staff', 'staffrole'))
+        staff = Database.execute_query("""
             SELECT s.*, sr.role_name 
             FROM staff s
             LEFT JOIN staffrole sr ON s.role_id = sr.role_id
             ORDER BY s.staff_id
-        """
-        return Database.execute_query(query)
+        """, primary=True)
+        roles = Database.execute_query("SELECT * FROM staffrole", primary=True)
+        by_role = {}
+        for member in staff:
+            by_role.setdefault(member['role_name'], []).append(member)
+        reference = {
+            'staff': staff,
+            'roles': roles,
+            'by_role': by_role,
+            'versions': versions,
+            'expires': time.monotonic() + Config.REFERENCE_DATA_TTL
+        }
+        # Only cache what has been committed
+        if not Database.has_pending_writes():
+            StaffModel._reference = reference
+        return reference
+    
+    @staticmethod
+    def invalidate_reference_data():
+        """Force the next read to rebuild the snapshot"""
+        StaffModel._reference = None
+    
+    @staticmethod
+    def _reference_data():
+        reference = StaffModel._reference
+        if (reference is not None and time.monotonic() < reference['expires']
+                and reference['versions'] == DataVersion.get(('staff', 'staffrole'))):
+            return reference
+        with StaffModel._reference_lock:
+            # Another thread may have rebuilt it while we waited
+            if StaffModel._reference is not None and StaffModel._reference is not reference:
+                return StaffModel._reference
+            return StaffModel.load_reference_data()
+    
+    @staticmethod
+    def get_all_staff():
+        """Get all staff members"""
+        return [dict(member) for member in StaffModel._reference_data()['staff']]
     
     @staticmethod
     def get_staff_by_role(role_name):
         """Get staff by role"""
-        query = """
-            SELECT s.*, sr.role_name 
-            FROM staff s
-            LEFT JOIN staffrole sr ON s.role_id = sr.role_id
-            WHERE sr.role_name = %s
-        """
-        return Database.execute_query(query, (role_name,))
+        return [dict(member) for member in StaffModel._reference_data()['by_role'].get(role_name, [])]
     
     @staticmethod
     def add_staff(name, role_id, shift_time):
@@ -275,13 +1558,15 @@ class StaffModel:
             INSERT INTO staff (name, role_id, shift_time) 
             VALUES (%s, %s, %s)
         """
-        return Database.execute_query(query, (name, role_id, shift_time), fetch=False)
+        staff_id = Database.execute_query(query, (name, role_id, shift_time), fetch=False)
+        StaffModel.invalidate_reference_data()
+        Database.after_transaction(StaffModel.invalidate_reference_data)
+        return staff_id
     
     @staticmethod
     def get_all_roles():
         """Get all staff roles"""
-        query = "SELECT * FROM staffrole"
-        return Database.execute_query(query)
+        return [dict(role) for role in StaffModel._reference_data()['roles']]
 
 
 class OTModel:
@@ -297,9 +1582,23 @@ class OTModel:
             ORDER BY o.date DESC
         """
         if limit:
-            query += f" LIMIT {limit}"
+            query += " LIMIT %s"
+            return Database.execute_query(query, (int(limit),))
         return Database.execute_query(query)
     
+    @staticmethod
+    def get_operations_page(cursor=None, limit=None):
+        """Get one page of operations (latest first) with a next-page cursor"""
+        return Database.fetch_page(
+            """
+            SELECT o.*, p.name as patient_name, p.age 
+            FROM ot o
+            LEFT JOIN patient p ON o.patient_id = p.patient_id
+            """,
+            'o.date', 'o.ot_id', 'date', 'ot_id',
+            cursor=cursor, limit=limit
+        )
+    
     @staticmethod
     def add_operation(patient_id, date, procedure_name, status):
         """Add new operation"""
@@ -307,13 +1606,35 @@ class OTModel:
             INSERT INTO ot (patient_id, date, procedure_name, status) 
             VALUES (%s, %s, %s, %s)
         """
-        return Database.execute_query(query, (patient_id, date, procedure_name, status), fetch=False)
+        with Database.transaction():
+            ot_id = Database.execute_query(query, (patient_id, date, procedure_name, status), fetch=False)
+            if status == 'Scheduled':
+                CensusModel.adjust('scheduled_operations', 1)
+        return ot_id
     
     @staticmethod
     def update_operation_status(ot_id, status):
         """Update operation status"""
-        query = "UPDATE ot SET status = %s WHERE ot_id = %s"
-        Database.execute_query(query, (status, ot_id), fetch=False)
+        with Database.transaction():
+            # The WHERE clause tells us whether the row moved in or out of 'Scheduled'
+            if status == 'Scheduled':
+                changed = Database.execute_update("""
+                    UPDATE ot SET status = %s
+                    WHERE ot_id = %s AND (status IS NULL OR status <> 'Scheduled')
+                """, (status, ot_id))
+                if changed:
+                    CensusModel.adjust('scheduled_operations', 1)
+                return True
+            
+            changed = Database.execute_update("""
+                UPDATE ot SET status = %s
+                WHERE ot_id = %s AND status = 'Scheduled'
+            """, (status, ot_id))
+            if changed:
+                CensusModel.adjust('scheduled_operations', -1)
+            else:
+                query = "UPDATE ot SET status = %s WHERE ot_id = %s"
+                Database.execute_query(query, (status, ot_id), fetch=False)
         return True
     
     @staticmethod
@@ -376,55 +1697,176 @@ class WardModel:
             INSERT INTO generalward (bed_no, patient_id, report_id) 
             VALUES (%s, %s, %s)
         """
-        return Database.execute_query(query, (bed_no, patient_id, report_id), fetch=False)
+        with Database.transaction():
+            ward_id = Database.execute_query(query, (bed_no, patient_id, report_id), fetch=False)
+            if patient_id is not None:
+                CensusModel.adjust('general_ward_occupied', 1)
+        return ward_id
+    
+    @staticmethod
+    def get_general_ward_capacity():
+        """Beds in the general ward: GENERAL_WARD_BEDS, or more if more are on record"""
+        result = Database.execute_query("SELECT COUNT(*) as beds FROM generalward")
+        beds = int(result[0]['beds']) if result else 0
+        return max(beds, Config.GENERAL_WARD_BEDS)
     
     @staticmethod
     def get_available_beds():
         """Get count of available beds in general ward"""
-        query = """
-            SELECT COUNT(*) as occupied FROM generalward WHERE patient_id IS NOT NULL
-        """
-        result = Database.execute_query(query)
-        occupied = result[0]['occupied'] if result else 0
-        return {'occupied': occupied, 'total': 50, 'available': 50 - occupied}
+        occupied = CensusModel.get('general_ward_occupied')
+        total = WardModel.get_general_ward_capacity()
+        return {'occupied': occupied, 'total': total, 'available': max(total - occupied, 0)}
+
+
+class CensusModel:
+    """
+    Running census counters kept in the census_counter table.
+    
+    Model writes adjust a counter by +1/-1 in the same transaction as the row
+    change, so reading a census is a primary-key lookup instead of a COUNT(*)
+    scan. reconcile() recounts from the source tables to repair any drift
+    from writes made outside the models.
+    """
+    
+    # Counter name -> query that recomputes it from scratch
+    COUNTERS = {
+        'active_admissions': "SELECT COUNT(*) as value FROM patientreport WHERE out_date_time IS NULL",
+        'icu_occupied': "SELECT COUNT(*) as value FROM icu WHERE report_id IS NOT NULL",
+        'general_ward_occupied': "SELECT COUNT(*) as value FROM generalward WHERE patient_id IS NOT NULL",
+        'scheduled_operations': "SELECT COUNT(*) as value FROM ot WHERE status = 'Scheduled'"
+    }
+    
+    DDL = """
+        CREATE TABLE IF NOT EXISTS census_counter (
+            name VARCHAR(50) PRIMARY KEY,
+            value INT NOT NULL DEFAULT 0,
+            reconciled_at DATETIME NULL
+        )
+    """
+    _reconciler = None
+    
+    
+    @staticmethod
+    def adjust(name, delta):
+        """Move a counter by ``delta`` inside the caller's transaction"""
+        query = "UPDATE census_counter SET value = value + %s WHERE name = %s"
+        Database.execute_query(query, (delta, name), fetch=False)
+    
+    @staticmethod
+    def get_all():
+        """All counters as {name: value}, seeding any that are missing"""
+        rows = Database.execute_query("SELECT name, value FROM census_counter")
+        counters = {row['name']: int(row['value']) for row in rows}
+        if any(name not in counters for name in CensusModel.COUNTERS):
+            counters = CensusModel.reconcile()
+        return counters
+    
+    @staticmethod
+    def get(name):
+        """Current value of one counter"""
+        return CensusModel.get_all()[name]
+    
+    @staticmethod
+    def reconcile():
+        """Recount every counter from its source table and return the values"""
+        counters = {}
+        for name, count_query in CensusModel.COUNTERS.items():
+            with Database.transaction():
+                # Lock the counter row first: writers adjusting it wait for us,
+                # and the recount below then sees everything committed before.
+                Database.execute_query(
+                    "SELECT value FROM census_counter WHERE name = %s FOR UPDATE", (name,)
+                )
+                result = Database.execute_query(count_query)
+                counters[name] = int(result[0]['value']) if result else 0
+                Database.execute_query("""
+                    REPLACE INTO census_counter (name, value, reconciled_at)
+                    VALUES (%s, %s, NOW())
+                """, (name, counters[name]), fetch=False)
+        return counters
+    
+    @staticmethod
+    def start_reconciler(interval=None):
+        """Reconcile the counters every ``interval`` seconds on a daemon thread"""
+        interval = interval or Config.CENSUS_RECONCILE_INTERVAL
+        if CensusModel._reconciler is not None or not interval:
+            return
+        
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    CensusModel.reconcile()
+                except Exception as e:
+                    print(f"Census reconciliation failed: {e}")
+        
+        CensusModel._reconciler = threading.Thread(target=run, name='census-reconciler', daemon=True)
+        CensusModel._reconciler.start()
 
 
 class DashboardModel:
     """Dashboard statistics"""
     
+    # Shared by every request in the process: refreshed at most once per TTL,
+    # and as soon as one of the tables behind the counters is written
+    _snapshot = TTLSnapshot(Config.DASHBOARD_STATS_TTL)
+    _TABLES = ('patient', 'patientreport', 'opdappointment', 'ot', 'staff', 'icu')
+    _versions = None
+    
     @staticmethod
     def get_statistics():
-        """Get dashboard statistics"""
-        stats = {}
-        
-        # Total patients
-        query = "SELECT COUNT(*) as count FROM patient"
-        result = Database.execute_query(query)
-        stats['total_patients'] = result[0]['count'] if result else 0
-        
-        # Active admissions
-        query = "SELECT COUNT(*) as count FROM patientreport WHERE out_date_time IS NULL"
-        result = Database.execute_query(query)
-        stats['active_admissions'] = result[0]['count'] if result else 0
-        
-        # Today's appointments
-        query = "SELECT COUNT(*) as count FROM opdappointment WHERE DATE(appointment_date) = CURDATE()"
-        result = Database.execute_query(query)
-        stats['today_appointments'] = result[0]['count'] if result else 0
-        
-        # Scheduled operations
-        query = "SELECT COUNT(*) as count FROM ot WHERE status = 'Scheduled'"
-        result = Database.execute_query(query)
-        stats['scheduled_operations'] = result[0]['count'] if result else 0
-        
-        # Staff count
-        query = "SELECT COUNT(*) as count FROM staff"
-        result = Database.execute_query(query)
-        stats['total_staff'] = result[0]['count'] if result else 0
-        
-        # ICU occupancy
-        query = "SELECT COUNT(*) as count FROM icu WHERE report_id IS NOT NULL"
+        """Get dashboard statistics (cached snapshot)"""
+        try:
+            versions = DataVersion.get(DashboardModel._TABLES)
+        except Exception as e:
+            print(f"Data versions unavailable, using the timed snapshot: {e}")
+            versions = DashboardModel._versions
+        if versions != DashboardModel._versions:
+            DashboardModel._versions = versions
+            DashboardModel.invalidate_statistics()
+        return dict(DashboardModel._snapshot.get(DashboardModel._load_statistics))
+    
+    @staticmethod
+    def invalidate_statistics():
+        """Drop the cached snapshot so the next call recomputes it"""
+        DashboardModel._snapshot.invalidate()
+    
+    @staticmethod
+    def _load_statistics():
+        """Compute every dashboard counter in a single round trip"""
+        query = """
+            SELECT
+                (SELECT COUNT(*) FROM patient) as total_patients,
+                (SELECT value FROM census_counter WHERE name = 'active_admissions') as active_admissions,
+                (SELECT COUNT(*) FROM opdappointment
+                 WHERE appointment_date >= CURDATE()
+                   AND appointment_date < DATE_ADD(CURDATE(), INTERVAL 1 DAY)) as today_appointments,
+                (SELECT value FROM census_counter WHERE name = 'scheduled_operations') as scheduled_operations,
+                (SELECT COUNT(*) FROM staff) as total_staff,
+                (SELECT value FROM census_counter WHERE name = 'icu_occupied') as icu_occupied
+        """
         result = Database.execute_query(query)
-        stats['icu_occupied'] = result[0]['count'] if result else 0
-        
-        return stats
+        row = dict(result[0]) if result else {}
+        census = ('active_admissions', 'scheduled_operations', 'icu_occupied')
+        if any(row.get(name) is None for name in census):
+            # Counters not seeded yet
+            row.update(CensusModel.reconcile())
+        keys = ['total_patients', 'active_admissions', 'today_appointments',
+                'scheduled_operations', 'total_staff', 'icu_occupied']
+        return {key: int(row.get(key) or 0) for key in keys}
+
+
+# Coalesced calls share results only between sessions without uncommitted writes
+SingleFlight.set_bypass(Database.has_pending_writes)
+
+# Bookkeeping tables owned by the models above
+Database.manage_table(DataVersion.DDL)
+Database.manage_table(CensusModel.DDL)
+Database.manage_table(PatientRiskModel.DDL, PatientRiskModel.INDEXES)
+
+# (sort, id) indexes behind the keyset-paginated lists (see Database.fetch_page)
+Database.manage_indexes([
+    "CREATE INDEX idx_patientreport_in_date_time_report_id ON patientreport (in_date_time, report_id)",
+    "CREATE INDEX idx_opdappointment_appointment_date_app_id ON opdappointment (appointment_date, app_id)",
+    "CREATE INDEX idx_ot_date_ot_id ON ot (date, ot_id)"
+])
@@ -0,0 +1,411 @@
+# db_backends.py
+# Storage backends for the Database layer: MySQL (production) and an
+# embedded SQLite engine for benchmarks, profiling and in-process tests.
+#
+# The SQLite backend wraps sqlite3 in the small slice of the mysql.connector
+# API the Database layer uses (cursor(dictionary=...), ping, lastrowid, ...)
+# and rewrites the MySQL-specific SQL in the models on the fly, so the model
+# classes run unchanged on either engine.
+
+import calendar
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+
+
+class MySQLBackend:
+    """mysql.connector connections (the default)"""
+
+    name = 'mysql'
+    # What its connections raise, for the Database layer's except clauses
+    errors = (mysql.connector.Error,)
+
+    def connect(self, db_config):
+        return mysql.connector.connect(**db_config)
+
+
+# ==================== SQLITE ====================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS patient (
+    patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100),
+    age INT,
+    gender VARCHAR(10),
+    contact_info VARCHAR(150)
+);
+
+CREATE TABLE IF NOT EXISTS medicalhistory (
+    history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INT REFERENCES patient(patient_id),
+    date_time DATETIME,
+    disease VARCHAR(100),
+    treatment TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_medicalhistory_patient_id_date_time ON medicalhistory (patient_id, date_time);
+
+CREATE TABLE IF NOT EXISTS staffrole (
+    role_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    role_name VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS staff (
+    staff_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100),
+    role_id INT REFERENCES staffrole(role_id),
+    shift_time VARCHAR(50),
+    contact_info VARCHAR(150)
+);
+
+CREATE TABLE IF NOT EXISTS patientreport (
+    report_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INT REFERENCES patient(patient_id),
+    diagnosis TEXT,
+    treatment TEXT,
+    in_date_time DATETIME,
+    out_date_time DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_patientreport_patient_id ON patientreport (patient_id);
+CREATE INDEX IF NOT EXISTS idx_patientreport_out_date_time ON patientreport (out_date_time);
+CREATE INDEX IF NOT EXISTS idx_patientreport_in_date_time_report_id ON patientreport (in_date_time, report_id);
+
+CREATE TABLE IF NOT EXISTS opdappointment (
+    app_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INT REFERENCES patient(patient_id),
+    staff_id INT REFERENCES staff(staff_id),
+    issue_description TEXT,
+    appointment_date DATETIME,
+    next_visit_date DATE
+);
+CREATE INDEX IF NOT EXISTS idx_opdappointment_appointment_date_app_id ON opdappointment (appointment_date, app_id);
+CREATE INDEX IF NOT EXISTS idx_opdappointment_staff_id ON opdappointment (staff_id);
+
+CREATE TABLE IF NOT EXISTS ot (
+    ot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    patient_id INT REFERENCES patient(patient_id),
+    date DATETIME,
+    procedure_name VARCHAR(100),
+    status VARCHAR(20)
+);
+CREATE INDEX IF NOT EXISTS idx_ot_status_date ON ot (status, date);
+CREATE INDEX IF NOT EXISTS idx_ot_date_ot_id ON ot (date, ot_id);
+
+CREATE TABLE IF NOT EXISTS ot_staff_assignment (
+    ot_id INT REFERENCES ot(ot_id),
+    staff_id INT REFERENCES staff(staff_id),
+    PRIMARY KEY (ot_id, staff_id)
+);
+CREATE INDEX IF NOT EXISTS idx_ot_staff_assignment_staff_id ON ot_staff_assignment (staff_id);
+
+CREATE TABLE IF NOT EXISTS instrument (
+    instrument_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(100)
+);
+
+CREATE TABLE IF NOT EXISTS ot_instrument (
+    ot_id INT REFERENCES ot(ot_id),
+    instrument_id INT REFERENCES instrument(instrument_id),
+    PRIMARY KEY (ot_id, instrument_id)
+);
+
+CREATE TABLE IF NOT EXISTS generalward (
+    bed_no INTEGER PRIMARY KEY,
+    patient_id INT REFERENCES patient(patient_id),
+    report_id INT REFERENCES patientreport(report_id)
+);
+
+CREATE TABLE IF NOT EXISTS icu (
+    icu_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id INT REFERENCES patientreport(report_id),
+    bed_device_id VARCHAR(50),
+    live_health_data TEXT
+);
+
+CREATE TABLE IF NOT EXISTS roomtype (
+    room_type_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_type_name VARCHAR(50)
+);
+
+CREATE TABLE IF NOT EXISTS specialroom (
+    room_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    room_type_id INT REFERENCES roomtype(room_type_id),
+    patient_id INT REFERENCES patient(patient_id),
+    report_id INT REFERENCES patientreport(report_id)
+);
+"""
+
+# MySQL DATE_FORMAT specifiers -> strftime
+_MYSQL_DATE_FORMAT = {
+    '%Y': '%Y', '%y': '%y', '%m': '%m', '%c': '%-m', '%d': '%d', '%e': '%-d',
+    '%H': '%H', '%h': '%I', '%i': '%M', '%s': '%S', '%S': '%S', '%p': '%p',
+    '%M': '%B', '%b': '%b', '%W': '%A', '%a': '%a', '%j': '%j', '%%': '%%'
+}
+
+_STRING_LITERAL = re.compile(r"('(?:[^'\\]|\\.|'')*')")
+_INTERVAL = re.compile(
+    r'\b(DATE_SUB|DATE_ADD)\s*\(\s*(.+?)\s*,\s*INTERVAL\s+(-?\d+)\s+(DAY|MONTH|YEAR)\s*\)',
+    re.I
+)
+_FOR_UPDATE = re.compile(r'\s+FOR\s+UPDATE\b', re.I)
+_FORM_DATETIME = re.compile(r'^(\d{4}-\d{2}-\d{2})T(\d{2}:\d{2})(:\d{2})?$')
+
+
+def _parse_datetime(value):
+    """Parse the date/datetime strings SQLite hands to our SQL functions"""
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _curdate():
+    return date.today().isoformat()
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _datediff(end, start):
+    end, start = _parse_datetime(end), _parse_datetime(start)
+    if end is None or start is None:
+        return None
+    as_date = lambda v: v.date() if isinstance(v, datetime) else v
+    return (as_date(end) - as_date(start)).days
+
+
+def _date_add_interval(value, amount, unit):
+    """
+    DATE_ADD(value, INTERVAL amount unit) as MySQL evaluates it: a date stays
+    a date, a datetime (NOW(), DATETIME columns) keeps its time of day, and
+    month arithmetic is clamped to the last day of the month
+    """
+    parsed = _parse_datetime(value)
+    if parsed is None or amount is None:
+        return None
+    if not isinstance(parsed, datetime):
+        parsed = datetime.combine(parsed, datetime.min.time())
+    if unit == 'day':
+        parsed += timedelta(days=amount)
+    else:
+        index = parsed.year * 12 + parsed.month - 1 + amount * (12 if unit == 'year' else 1)
+        year, month = divmod(index, 12)
+        day = min(parsed.day, calendar.monthrange(year, month + 1)[1])
+        parsed = parsed.replace(year=year, month=month + 1, day=day)
+    if len(str(value)) == 10:
+        return parsed.date().isoformat()
+    return parsed.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _date_format(value, fmt):
+    value = _parse_datetime(value)
+    if value is None or fmt is None:
+        return None
+    python_fmt = re.sub(r'%.', lambda m: _MYSQL_DATE_FORMAT.get(m.group(0), m.group(0)), fmt)
+    return value.strftime(python_fmt)
+
+
+def _convert_datetime(raw):
+    """Column converter: DATETIME/DATE text back to datetime/date like MySQL returns"""
+    text = raw.decode()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return text
+    return parsed.date() if len(text) == 10 else parsed
+
+
+sqlite3.register_converter('DATETIME', _convert_datetime)
+sqlite3.register_converter('DATE', _convert_datetime)
+
+
+def _adapt_param(value):
+    """Store datetimes the way MySQL would coerce them"""
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, str):
+        # <input type="datetime-local"> posts 2024-01-31T09:30
+        match = _FORM_DATETIME.match(value)
+        if match:
+            return f"{match.group(1)} {match.group(2)}{match.group(3) or ':00'}"
+    return value
+
+
+class SQLiteCursor:
+    """sqlite3 cursor behaving like a mysql.connector (dictionary) cursor"""
+
+    def __init__(self, backend, raw_cursor, dictionary):
+        self._backend = backend
+        self._cursor = raw_cursor
+        self._dictionary = dictionary
+
+    def execute(self, operation, params=None):
+        self._cursor.execute(self._backend.translate(operation),
+                             tuple(_adapt_param(p) for p in (params or ())))
+
+    def executemany(self, operation, seq_params):
+        self._cursor.executemany(self._backend.translate(operation),
+                                 [tuple(_adapt_param(p) for p in row) for row in seq_params])
+
+    def _convert(self, rows):
+        if not self._dictionary:
+            return rows
+        columns = self.column_names
+        return [dict(zip(columns, row)) for row in rows]
+
+    def fetchall(self):
+        return self._convert(self._cursor.fetchall())
+
+    def fetchmany(self, size=1):
+        return self._convert(self._cursor.fetchmany(size))
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        return self._convert([row])[0]
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """sqlite3 connection behaving like a mysql.connector connection"""
+
+    def __init__(self, backend, raw):
+        self._backend = backend
+        self.raw = raw
+
+    def cursor(self, dictionary=False, buffered=None, prepared=None, **kwargs):
+        # sqlite3 keeps its own compiled-statement cache, so prepared cursors
+        # are plain cursors here; rows are streamed either way.
+        return SQLiteCursor(self._backend, self.raw.cursor(), dictionary)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def ping(self, reconnect=False):
+        self.raw.execute('SELECT 1')
+
+    def is_connected(self):
+        try:
+            self.ping()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        self.raw.close()
+
+
+class SQLiteBackend:
+    """
+    Embedded SQLite engine. ``db_config['database']`` is a file path or
+    ``:memory:``; an in-memory database is shared by every pooled connection.
+    """
+
+    name = 'sqlite'
+    # The pool's own errors (PoolExhaustedError) are mysql.connector errors
+    errors = (sqlite3.Error, mysql.connector.Error)
+
+    def __init__(self):
+        self._translations = {}
+        self._schema_lock = threading.Lock()
+        self._schema_ready = set()
+
+    def connect(self, db_config):
+        path = db_config.get('database') or ':memory:'
+        if path == ':memory:':
+            target, uri = 'file:hospital?mode=memory&cache=shared', True
+        else:
+            target, uri = path, False
+        raw = sqlite3.connect(target, uri=uri, timeout=30, check_same_thread=False,
+                              detect_types=sqlite3.PARSE_DECLTYPES)
+        raw.create_function('CURDATE', 0, _curdate)
+        raw.create_function('NOW', 0, _now)
+        raw.create_function('DATEDIFF', 2, _datediff)
+        raw.create_function('DATE_FORMAT', 2, _date_format)
+        raw.create_function('DATE_ADD_INTERVAL', 3, _date_add_interval)
+        raw.execute('PRAGMA foreign_keys = ON')
+        if path != ':memory:':
+            raw.execute('PRAGMA journal_mode = WAL')
+        self.create_schema(raw, path)
+        return SQLiteConnection(self, raw)
+
+    def create_schema(self, raw, key):
+        """Create the hospital tables once per database"""
+        with self._schema_lock:
+            if key in self._schema_ready:
+                return
+            raw.executescript(SQLITE_SCHEMA)
+            raw.commit()
+            self._schema_ready.add(key)
+
+    def translate(self, query):
+        """Rewrite MySQL-specific SQL for SQLite (memoised per statement)"""
+        translated = self._translations.get(query)
+        if translated is not None:
+            return translated
+
+        # Only touch the SQL outside string literals
+        parts = _STRING_LITERAL.split(query)
+        for i in range(0, len(parts), 2):
+            sql = parts[i].replace('%s', '?')
+            sql = _FOR_UPDATE.sub('', sql)
+            parts[i] = sql
+        translated = ''.join(parts)
+
+        # DATE_SUB(x, INTERVAL n DAY) -> DATE_ADD_INTERVAL(x, -n, 'day')
+        def interval(match):
+            amount = int(match.group(3))
+            if match.group(1).upper() == 'DATE_SUB':
+                amount = -amount
+            return f"DATE_ADD_INTERVAL({match.group(2)}, {amount}, '{match.group(4).lower()}')"
+        translated = _INTERVAL.sub(interval, translated)
+
+        if len(self._translations) >= 4096:
+            self._translations.clear()
+        self._translations[query] = translated
+        return translated
+
+
+BACKENDS = {
+    'mysql': MySQLBackend,
+    'sqlite': SQLiteBackend
+}
+
+
+def get_backend(name):
+    """Instantiate a backend by name ('mysql' or 'sqlite')"""
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown DB_BACKEND '{name}' (choose from {', '.join(BACKENDS)})")
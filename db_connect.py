@@ -1,17 +1,22 @@
 # print_schema.py
+# Schema viewer and index advisor
+#
+#   python db_connect.py            print every table, column and index
+#   python db_connect.py --advise   EXPLAIN the app's queries and suggest indexes
+#   python db_connect.py --advise --ddl-only
+
+import re
+import sys
+
 import mysql.connector
 from mysql.connector import Error
+from config import Config
 
 def print_full_schema():
+    conn = None
     try:
         # --- 1. Connect ---
-        conn = mysql.connector.connect(
-            host='localhost',
-            database='hospital',
-            user='root',
-            password='',
-            port=3306
-        )
+        conn = mysql.connector.connect(**Config.DB_CONFIG)
 
         if not conn.is_connected():
             print("Failed to connect.")
@@ -79,11 +84,349 @@ def print_full_schema():
     except Error as e:
         print(f"Error: {e}")
     finally:
-        if conn.is_connected():
+        if conn and conn.is_connected():
             cursor.close()
             conn.close()
             print("\nConnection closed.")
 
+
+# ==================== INDEX ADVISOR ====================
+# The advisor runs the read paths of the model classes and HealthAI once,
+# takes the statements QueryStats captured, EXPLAINs each of them and turns
+# full scans / filesorts into CREATE INDEX suggestions. Column extraction is
+# a heuristic over the SQL text (equality predicates first, then one range or
+# ORDER BY column), which fits the straightforward queries in this app.
+
+_FUNC_PREDICATE = r'(?:(?P<func>[A-Z_]+)\s*\(\s*)?'
+_PREDICATE = re.compile(
+    r'^\(*\s*' + _FUNC_PREDICATE +
+    r'(?:(?P<alias>\w+)\.)?(?P<col>\w+)\s*(?:,[^)]*)?\)?\s*'
+    r'(?P<op>=|<=>|>=|<=|<>|!=|<|>|IS\s+NOT\s+NULL|IS\s+NULL|NOT\s+IN|IN|NOT\s+LIKE|LIKE|BETWEEN)'
+    r'\s*(?P<rhs>.*)$',
+    re.I | re.S
+)
+_TABLE_REF = re.compile(
+    r'\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!ON\b|WHERE\b|LEFT\b|RIGHT\b|INNER\b|JOIN\b|GROUP\b|ORDER\b|LIMIT\b)(\w+))?',
+    re.I
+)
+_JOIN_ON = re.compile(
+    r'\bJOIN\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!ON\b)(\w+))?\s+ON\b(.*?)'
+    r'(?=\bLEFT\b|\bRIGHT\b|\bINNER\b|\bJOIN\b|\bWHERE\b|\bGROUP\b|\bORDER\b|\bLIMIT\b|$)',
+    re.I
+)
+_COLUMN_REF = re.compile(r'^(?:(\w+)\.)?(\w+)$')
+_CLAUSE_END = r'(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|\bHAVING\b|$)'
+_NON_SARGABLE_FUNCS = {'DATE', 'YEAR', 'MONTH', 'DAY', 'LOWER', 'UPPER', 'TRIM',
+                       'DATE_FORMAT', 'SUBSTRING', 'CAST', 'IFNULL', 'COALESCE'}
+
+
+class _Rollback(Exception):
+    """Raised to discard everything the advisor workload wrote"""
+
+
+def _advisor_workload():
+    """
+    Exercise every read path once so QueryStats captures its SQL. Some reads
+    write as a side effect (census counters, patient_risk rows), so the
+    workload runs in one transaction that is rolled back, and against the
+    live tables even when analytics are configured to use the snapshot.
+    """
+    from database import (
+        Database, PatientModel, MedicalHistoryModel, PatientReportModel,
+        OPDModel, StaffModel, OTModel, WardModel, DashboardModel, DiseaseAggregator
+    )
+    from ai_features import HealthAI
+
+    def first_id(query):
+        rows = Database.execute_query(query)
+        return (rows[0]['id'] if rows else None) or 1
+
+    patient_id = first_id("SELECT MAX(patient_id) as id FROM patient")
+    report_id = first_id("SELECT MAX(report_id) as id FROM patientreport")
+
+    calls = [
+        lambda: PatientModel.get_all_patients(limit=5),
+        lambda: PatientModel.get_patient_by_id(patient_id),
+        lambda: PatientModel.search_patients('a'),
+        PatientModel.get_patient_count,
+        lambda: MedicalHistoryModel.get_patient_history(patient_id),
+        lambda: PatientReportModel.get_all_reports(limit=50),
+        lambda: PatientReportModel.get_report_by_id(report_id),
+        PatientReportModel.get_active_reports,
+        lambda: OPDModel.get_all_appointments(limit=50),
+        OPDModel.get_today_appointments,
+        StaffModel.get_all_staff,
+        lambda: StaffModel.get_staff_by_role('Doctor'),
+        StaffModel.get_all_roles,
+        lambda: OTModel.get_all_operations(limit=50),
+        OTModel.get_scheduled_operations,
+        WardModel.get_general_ward_occupancy,
+        WardModel.get_icu_occupancy,
+        WardModel.get_special_rooms,
+        WardModel.get_available_beds,
+        DashboardModel.get_statistics,
+        lambda: HealthAI.predict_patient_risk(patient_id),
+        lambda: HealthAI.predict_bed_occupancy(7),
+        # analyze_disease_patterns() answers from in-memory counters; these
+        # are the queries behind it
+        HealthAI._disease_patterns_live,
+        lambda: DiseaseAggregator.top(10, days=30),
+        HealthAI.get_age_wise_distribution,
+        HealthAI.get_gender_distribution,
+        HealthAI.get_monthly_admissions,
+        HealthAI.get_operation_statistics,
+        HealthAI.get_staff_workload,
+        HealthAI.get_average_stay_duration,
+        HealthAI.get_readmission_rate,
+        lambda: HealthAI.generate_health_insights(patient_id),
+        HealthAI.get_resource_optimization_suggestions,
+    ]
+    # Keyset pages: run page one and, when there is one, page two (its WHERE differs)
+    for get_page in (PatientModel.get_patients_page, PatientReportModel.get_reports_page,
+                     OPDModel.get_appointments_page, OTModel.get_operations_page):
+        calls.append(lambda get_page=get_page: get_page(cursor=get_page()['next_cursor']))
+
+    source, Config.ANALYTICS_SOURCE = Config.ANALYTICS_SOURCE, 'database'
+    try:
+        with Database.transaction():
+            for call in calls:
+                try:
+                    call()
+                except Exception as e:
+                    print(f"  (skipped a workload call: {e})")
+            raise _Rollback()
+    except _Rollback:
+        pass
+    finally:
+        Config.ANALYTICS_SOURCE = source
+
+
+def _clause(sql, keyword):
+    match = re.search(r'\b' + keyword + r'\b(.*?)' + _CLAUSE_END, sql, re.I | re.S)
+    return match.group(1) if match else ''
+
+
+def _split_predicates(where):
+    """Split a WHERE clause on top-level AND / OR"""
+    parts, depth, current = [], 0, ''
+    for token in re.split(r'(\(|\)|\bAND\b|\bOR\b)', where, flags=re.I):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        if depth == 0 and token.upper() in ('AND', 'OR'):
+            parts.append(current)
+            current = ''
+        else:
+            current += token
+    parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _analyze_sql(query, params):
+    """Extract per-table index candidates and non-sargable predicates from SQL text"""
+    sql = ' '.join(query.split())
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        aliases[(alias or table).lower()] = table.lower()
+        aliases[table.lower()] = table.lower()
+    single_table = next(iter(set(aliases.values()))) if len(set(aliases.values())) == 1 else None
+
+    def owner(alias):
+        return aliases.get(alias.lower()) if alias else single_table
+
+    candidates = {}   # table -> {'eq': [...], 'range': [...], 'order': [...]}
+    warnings = []
+    param_iter = iter(params or ())
+
+    def slot(table):
+        return candidates.setdefault(table, {'eq': [], 'range': [], 'order': []})
+
+    # Join predicates: only the side introduced by the JOIN needs an index
+    for table, alias, on_clause in _JOIN_ON.findall(sql):
+        joined = table.lower()
+        for predicate in _split_predicates(on_clause):
+            match = _PREDICATE.match(predicate)
+            rhs_column = _COLUMN_REF.match(match.group('rhs').strip()) if match else None
+            if not match or match.group('op') != '=' or not rhs_column:
+                continue
+            for ref_alias, ref_col in ((match.group('alias'), match.group('col')),
+                                       (rhs_column.group(1), rhs_column.group(2))):
+                if owner(ref_alias) == joined:
+                    slot(joined)['eq'].append(ref_col.lower())
+
+    for predicate in _split_predicates(_clause(sql, 'WHERE')):
+        # Consume this predicate's placeholders so later ones line up
+        predicate_params = [next(param_iter, None) for _ in range(predicate.count('%s'))]
+        param = predicate_params[0] if predicate_params else None
+        match = _PREDICATE.match(predicate)
+        if not match:
+            continue
+        func = (match.group('func') or '').upper()
+        table = owner(match.group('alias'))
+        col = match.group('col').lower()
+        op = ' '.join(match.group('op').upper().split())
+        rhs = match.group('rhs').strip()
+        if not table:
+            continue
+
+        if func in _NON_SARGABLE_FUNCS:
+            warnings.append(f"non-sargable predicate `{predicate}`: {func}() on {table}.{col} "
+                            f"prevents index use; compare the bare column against a range instead")
+            slot(table)['range'].append(col)
+            continue
+        if func:
+            continue
+
+        if op == 'LIKE' and (rhs.startswith("'%") or (isinstance(param, str) and param.startswith('%'))):
+            warnings.append(f"leading-wildcard LIKE on {table}.{col} cannot use a B-tree index")
+            continue
+
+        rhs_column = _COLUMN_REF.match(rhs)
+        if op == '=' and rhs_column and rhs_column.group(1) and owner(rhs_column.group(1)):
+            continue  # join written in WHERE; handled like any other join
+        if op in ('=', '<=>', 'IS NULL', 'IN'):
+            slot(table)['eq'].append(col)
+        elif op in ('>', '<', '>=', '<=', 'BETWEEN', 'LIKE'):
+            slot(table)['range'].append(col)
+
+    for item in _clause(sql, r'ORDER\s+BY').split(','):
+        ref = _COLUMN_REF.match(re.sub(r'\s+(ASC|DESC)$', '', item.strip(), flags=re.I))
+        if ref and owner(ref.group(1)):
+            slot(owner(ref.group(1)))['order'].append(ref.group(2).lower())
+
+    return candidates, warnings
+
+
+def _existing_indexes(cursor, table):
+    """Map index name -> ordered column list"""
+    cursor.execute(f"SHOW INDEX FROM `{table}`")
+    indexes = {}
+    for row in cursor.fetchall():
+        indexes.setdefault(row[2], []).append(row[4].lower())
+    return indexes
+
+
+def _table_columns(cursor, table):
+    cursor.execute(f"SHOW COLUMNS FROM `{table}`")
+    return {row[0].lower() for row in cursor.fetchall()}
+
+
+def _candidate_index(parts, columns):
+    """Equality columns first, then one range column, else the ORDER BY columns"""
+    index = []
+    for col in parts['eq']:
+        if col in columns and col not in index:
+            index.append(col)
+    ranges = [c for c in parts['range'] if c in columns and c not in index]
+    if ranges:
+        index.append(ranges[0])
+    else:
+        for col in parts['order']:
+            if col in columns and col not in index:
+                index.append(col)
+    return index
+
+
+def advise_indexes(ddl_only=False):
+    """EXPLAIN every captured statement and print index suggestions"""
+    from database import Database
+    from query_stats import QueryStats
+
+    QueryStats.reset()
+    _advisor_workload()
+    samples = QueryStats.samples()
+
+    conn = mysql.connector.connect(**Config.DB_CONFIG)
+    cursor = conn.cursor()
+    findings, warnings, suggestions = [], [], {}
+    schema = {}
+
+    try:
+        for statement, (query, params) in sorted(samples.items()):
+            if not query.lstrip().upper().startswith('SELECT'):
+                continue
+            try:
+                cursor.execute('EXPLAIN ' + query, params)
+                columns = [d[0].lower() for d in cursor.description]
+                plan = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            except Error as e:
+                print(f"  (could not EXPLAIN: {e})")
+                continue
+
+            candidates, sql_warnings = _analyze_sql(query, params)
+            warnings.extend((statement, w) for w in sql_warnings)
+
+            for step in plan:
+                table = (step.get('table') or '').lower()
+                extra = step.get('extra') or ''
+                problems = []
+                if step.get('type') == 'ALL':
+                    problems.append(f"full table scan (~{step.get('rows')} rows)")
+                if 'Using filesort' in extra:
+                    problems.append('filesort')
+                if 'Using temporary' in extra:
+                    problems.append('temporary table')
+                if not problems:
+                    continue
+
+                # EXPLAIN reports the alias; map it back to the base table
+                base = next((t for a, t in _TABLE_REF.findall(' '.join(query.split()))
+                             if (t.lower() == table or a.lower() == table)), table).lower()
+                findings.append((statement, base, problems))
+
+                if base not in schema:
+                    try:
+                        schema[base] = (_table_columns(cursor, base), _existing_indexes(cursor, base))
+                    except Error:
+                        continue
+                table_columns, existing = schema[base]
+                index = _candidate_index(candidates.get(base, {'eq': [], 'range': [], 'order': []}),
+                                         table_columns)
+                if not index:
+                    continue
+                covered = any(cols[:len(index)] == index for cols in existing.values())
+                if not covered:
+                    suggestions.setdefault((base, tuple(index)), []).append(statement)
+    finally:
+        cursor.close()
+        conn.close()
+
+    ddl = [f"CREATE INDEX idx_{table}_{'_'.join(cols)} ON {table} ({', '.join(cols)});"
+           for table, cols in sorted(suggestions)]
+
+    if ddl_only:
+        print('\n'.join(ddl))
+        return ddl
+
+    print("=" * 60)
+    print("INDEX ADVISOR")
+    print("=" * 60)
+    print(f"Statements analysed: {len(samples)}\n")
+
+    print("Plan problems:")
+    for statement, table, problems in findings:
+        print(f"  • {table}: {', '.join(problems)}")
+        print(f"      {statement[:140]}")
+    if not findings:
+        print("  (none)")
+
+    print("\nPredicate warnings:")
+    for statement, warning in warnings:
+        print(f"  • {warning}")
+    if not warnings:
+        print("  (none)")
+
+    print("\nSuggested indexes:")
+    for line in ddl:
+        print(f"  {line}")
+    if not ddl:
+        print("  (none - existing indexes cover the flagged queries)")
+    return ddl
+
 # --- Run ---
 if __name__ == "__main__":
-    print_full_schema()
\ No newline at end of file
+    if '--advise' in sys.argv:
+        advise_indexes(ddl_only='--ddl-only' in sys.argv)
+    else:
+        print_full_schema()
\ No newline at end of file
@@ -0,0 +1,280 @@
+# db_pool.py
+# Connection pooling for the Database layer
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from mysql.connector import Error
+
+from db_backends import MySQLBackend
+
+
+class PoolExhaustedError(Error):
+    """Raised when no connection could be borrowed within the pool timeout"""
+
+
+class StatementCache:
+    """
+    Per-connection LRU of server-side prepared statements keyed by SQL text.
+
+    Each entry is a prepared cursor. mysql.connector only skips the PREPARE
+    round trip when it sees the *same* string object again, so the cached
+    key object is what gets passed back to ``execute``.
+    """
+
+    # Hit/miss counters are shared by every connection's cache
+    _lock = threading.Lock()
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+
+    def __init__(self, raw, max_size=64):
+        self.raw = raw
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    @classmethod
+    def _count(cls, hit=False, miss=False, evicted=False):
+        with cls._lock:
+            cls._hits += hit
+            cls._misses += miss
+            cls._evictions += evicted
+
+    def execute(self, query, params):
+        """Execute ``query`` through a cached prepared cursor and return it"""
+        entry = self._entries.get(query)
+        if entry is not None:
+            self._entries.move_to_end(query)
+            self._count(hit=True)
+        else:
+            self._count(miss=True)
+            entry = (query, self.raw.cursor(prepared=True, dictionary=True))
+            self._entries[query] = entry
+            if len(self._entries) > self.max_size:
+                _, (_, oldest) = self._entries.popitem(last=False)
+                self._close_cursor(oldest)
+                self._count(evicted=True)
+
+        sql, cursor = entry
+        try:
+            cursor.execute(sql, params)
+        except Exception:
+            # A failed statement may leave the cursor unusable; re-prepare next time
+            self.discard(query)
+            raise
+        return cursor
+
+    def discard(self, query):
+        """Drop (and deallocate) one cached statement"""
+        entry = self._entries.pop(query, None)
+        if entry is not None:
+            self._close_cursor(entry[1])
+
+    def clear(self):
+        """Deallocate every cached statement"""
+        for _, cursor in self._entries.values():
+            self._close_cursor(cursor)
+        self._entries.clear()
+
+    @staticmethod
+    def _close_cursor(cursor):
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    @classmethod
+    def stats(cls):
+        """Global prepared-statement cache counters"""
+        with cls._lock:
+            lookups = cls._hits + cls._misses
+            return {
+                'hits': cls._hits,
+                'misses': cls._misses,
+                'evictions': cls._evictions,
+                'hit_rate': round(cls._hits / lookups * 100, 1) if lookups else 0
+            }
+
+
+class PooledConnection:
+    """Wrapper around a raw connection that remembers its pool bookkeeping"""
+
+    def __init__(self, raw, pool, statement_cache_size=64):
+        self.raw = raw
+        self.pool = pool
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.statements = StatementCache(raw, statement_cache_size)
+
+    def __getattr__(self, name):
+        # Delegate cursor(), commit(), rollback() etc. to the raw connection
+        return getattr(self.raw, name)
+
+    def close_raw(self):
+        """Close the underlying connection, ignoring errors from dead sockets"""
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Fixed-size, thread-safe connection pool.
+
+    Connections are opened lazily up to ``size``. A borrowed connection is
+    checked with a ping before it is handed out, and idle connections older
+    than ``recycle`` seconds are closed and replaced instead of reused.
+    """
+
+    def __init__(self, db_config, size=10, timeout=10.0, recycle=1800,
+                 statement_cache_size=64, backend=None):
+        self.db_config = dict(db_config)
+        self.backend = backend or MySQLBackend()
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.statement_cache_size = statement_cache_size
+
+        self._idle = deque()
+        self._opened = 0
+        self._cond = threading.Condition()
+
+        # Metrics
+        self._in_use = 0
+        self._borrows = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recycled = 0
+        self._discarded = 0
+
+    def _connect(self):
+        """Open a new raw connection"""
+        return PooledConnection(
+            self.backend.connect(self.db_config), self, self.statement_cache_size
+        )
+
+    def _is_healthy(self, conn):
+        """Check a connection is still usable before lending it out"""
+        try:
+            conn.raw.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Borrow a connection, waiting up to ``timeout`` seconds"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            with self._cond:
+                while not self._idle and self._opened >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolExhaustedError(
+                            msg=f"Connection pool exhausted ({self.size} in use)"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+                if self._idle:
+                    conn = self._idle.pop()
+                else:
+                    # Reserve the slot before connecting outside the lock
+                    self._opened += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opened -= 1
+                        self._cond.notify()
+                    raise
+            elif (time.monotonic() - conn.last_used > self.recycle
+                  or not self._is_healthy(conn)):
+                # Stale or dead: drop it and go round again for a fresh one
+                self._discard(conn, recycled=True)
+                continue
+
+            self._record_borrow(time.monotonic() - started, waited)
+            return conn
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        try:
+            # End any open transaction so the next borrower starts clean
+            # and does not read from a stale snapshot.
+            conn.raw.rollback()
+        except Exception:
+            self._discard(conn)
+            with self._cond:
+                self._in_use -= 1
+            return
+
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def discard(self, conn):
+        """Close a borrowed connection instead of returning it to the pool"""
+        with self._cond:
+            self._in_use -= 1
+        self._discard(conn)
+
+    def _discard(self, conn, recycled=False):
+        """Close a connection and free its slot"""
+        conn.close_raw()
+        with self._cond:
+            self._opened -= 1
+            if recycled:
+                self._recycled += 1
+            else:
+                self._discarded += 1
+            self._cond.notify()
+
+    def _record_borrow(self, wait, waited):
+        with self._cond:
+            self._in_use += 1
+            self._borrows += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            if waited:
+                self._waits += 1
+
+    def close_all(self):
+        """Close every idle connection (borrowed ones close on release)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._opened -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            conn.close_raw()
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            return {
+                'size': self.size,
+                'opened': self._opened,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'borrows': self._borrows,
+                'borrow_waits': self._waits,
+                'borrow_wait_total_ms': round(self._wait_total * 1000, 2),
+                'borrow_wait_avg_ms': round(self._wait_total * 1000 / self._borrows, 3) if self._borrows else 0,
+                'borrow_wait_max_ms': round(self._wait_max * 1000, 2),
+                'recycled': self._recycled,
+                'discarded': self._discarded
+            }
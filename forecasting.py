@@ -0,0 +1,225 @@
+# forecasting.py
+# Bed occupancy forecasting from the daily inpatient census
+
+import threading
+from datetime import date, timedelta
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+from database import Database, WardModel
+
+WARD_TYPES = ('general', 'icu', 'special')
+
+# Admissions overlapping [start, end), labelled with the ward they occupy.
+# Bed tables only link current assignments, so admissions without an ICU or
+# special room link are counted as general ward.
+_STAYS_QUERY = """
+    SELECT pr.in_date_time, pr.out_date_time,
+           CASE WHEN EXISTS (SELECT 1 FROM icu i WHERE i.report_id = pr.report_id) THEN 'icu'
+                WHEN EXISTS (SELECT 1 FROM specialroom sr WHERE sr.report_id = pr.report_id) THEN 'special'
+                ELSE 'general' END as ward
+    FROM patientreport pr
+    WHERE pr.in_date_time IS NOT NULL
+      AND pr.in_date_time < %s
+      AND (pr.out_date_time IS NULL OR pr.out_date_time >= %s)
+"""
+
+
+def daily_census(admitted, discharged, start, days):
+    """
+    Midnight census for ``days`` consecutive days from ``start``.
+
+    ``admitted`` and ``discharged`` are datetime64[D] arrays (NaT discharge
+    means still admitted). A stay counts on day d when the patient was
+    admitted on or before d and discharged after it. Each stay becomes a +1
+    at its admission day and a -1 at its discharge day; the census is the
+    running sum of those events, so no per-day query or loop is needed.
+    """
+    start = np.datetime64(start, 'D')
+    if len(admitted) == 0:
+        return np.zeros(days, dtype=int)
+    end = start + days
+    discharged = np.where(np.isnat(discharged), end, discharged)
+    first = np.clip((admitted - start).astype(int), 0, days)
+    last = np.clip((discharged - start).astype(int), 0, days)
+    stays = first < last
+    events = (np.bincount(first[stays], minlength=days + 1)
+              - np.bincount(last[stays], minlength=days + 1))
+    return np.cumsum(events)[:days]
+
+
+class HoltWinters:
+    """
+    Additive Holt-Winters with a damped trend and a weekly season.
+
+    The fitted state (level, trend, seasonal offsets) is kept, so new
+    observations are folded in one at a time with update() instead of
+    refitting the whole series.
+    """
+
+    SEASON = 7
+    # Smoothing constants tried by fit(), chosen by one-step-ahead error
+    ALPHAS = (0.1, 0.3, 0.5, 0.8)
+    BETAS = (0.01, 0.05, 0.2)
+    GAMMAS = (0.05, 0.2, 0.4)
+
+    def __init__(self, alpha, beta, gamma, phi=0.98):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.phi = phi
+        self.level = 0.0
+        self.trend = 0.0
+        self.season = np.zeros(self.SEASON)
+        self.t = 0
+        self._sse = 0.0
+        self._n = 0
+
+    def _initialise(self, series):
+        m = self.SEASON
+        if len(series) >= 2 * m:
+            self.level = series[:m].mean()
+            self.trend = (series[m:2 * m].mean() - self.level) / m
+            self.season = series[:m] - self.level
+        else:
+            # Too short for a season: a flat forecast from the latest value
+            self.level = float(series[-1]) if len(series) else 0.0
+
+    def update(self, value):
+        """Fold in the next day's observation"""
+        i = self.t % self.SEASON
+        seasonal = self.season[i]
+        predicted = self.level + self.phi * self.trend + seasonal
+        self._sse += (value - predicted) ** 2
+        self._n += 1
+
+        level = self.alpha * (value - seasonal) + (1 - self.alpha) * (self.level + self.phi * self.trend)
+        self.trend = self.beta * (level - self.level) + (1 - self.beta) * self.phi * self.trend
+        self.level = level
+        self.season[i] = self.gamma * (value - level) + (1 - self.gamma) * seasonal
+        self.t += 1
+
+    @property
+    def sigma(self):
+        """Standard deviation of the one-step-ahead errors"""
+        return (self._sse / self._n) ** 0.5 if self._n else 0.0
+
+    def forecast(self, horizon):
+        """Point forecasts for the next ``horizon`` days"""
+        steps = np.arange(1, horizon + 1)
+        damping = np.cumsum(self.phi ** steps)
+        return self.level + damping * self.trend + self.season[(self.t + steps - 1) % self.SEASON]
+
+    @classmethod
+    def fit(cls, series):
+        """Model fitted to ``series``, with the best smoothing constants on the grid"""
+        series = np.asarray(series, dtype=float)
+        best = None
+        for alpha, beta, gamma in product(cls.ALPHAS, cls.BETAS, cls.GAMMAS):
+            model = cls(alpha, beta, gamma)
+            model._initialise(series)
+            for value in series:
+                model.update(value)
+            if best is None or model._sse < best._sse:
+                best = model
+            if len(series) < 2 * cls.SEASON:
+                # Nothing to tune without a full season of history
+                break
+        return best
+
+
+class OccupancyForecaster:
+    """
+    Per-ward census models, fitted once and then advanced a day at a time.
+
+    The first forecast (and one every ``FORECAST_REFIT_DAYS``) rebuilds the
+    census from ``FORECAST_HISTORY_DAYS`` of admissions and refits. Between
+    refits only the days since the last update are counted and folded into
+    the cached state, so a forecast costs one small query at most.
+    Corrections to older stays are picked up at the next refit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models = {}
+        self._through = None
+        self._fitted_on = None
+
+    @staticmethod
+    def _census(start, end):
+        """{ward: daily census array} for the days in [start, end)"""
+        days = (end - start).days
+        rows = Database.stream_query(_STAYS_QUERY, (end, start))
+        frame = pd.DataFrame(list(rows), columns=['in_date_time', 'out_date_time', 'ward'])
+        admitted = pd.to_datetime(frame['in_date_time']).to_numpy().astype('datetime64[D]')
+        discharged = pd.to_datetime(frame['out_date_time']).to_numpy().astype('datetime64[D]')
+        wards = frame['ward'].to_numpy()
+        return {
+            ward: daily_census(admitted[wards == ward], discharged[wards == ward], start, days)
+            for ward in WARD_TYPES
+        }
+
+    def _refresh(self, today):
+        """Bring every ward model up to yesterday, refitting when due"""
+        refit_due = (self._fitted_on is None
+                     or (today - self._fitted_on).days >= Config.FORECAST_REFIT_DAYS)
+        if refit_due:
+            start = today - timedelta(days=Config.FORECAST_HISTORY_DAYS)
+            census = self._census(start, today)
+            for ward, series in census.items():
+                # Leading empty days (before the ward's first stay) are not history
+                occupied = np.flatnonzero(series)
+                series = series[occupied[0]:] if len(occupied) else series[-HoltWinters.SEASON:]
+                self._models[ward] = HoltWinters.fit(series)
+            self._fitted_on = today
+        elif self._through < today - timedelta(days=1):
+            census = self._census(self._through + timedelta(days=1), today)
+            for ward, series in census.items():
+                for value in series:
+                    self._models[ward].update(float(value))
+        self._through = today - timedelta(days=1)
+
+    @staticmethod
+    def capacity(ward):
+        """Number of beds of a ward type"""
+        if ward == 'general':
+            return WardModel.get_general_ward_capacity()
+        table = 'icu' if ward == 'icu' else 'specialroom'
+        result = Database.execute_query(f"SELECT COUNT(*) as beds FROM {table}")
+        return int(result[0]['beds']) if result else 0
+
+    def forecast(self, ward='general', days=7):
+        """Daily occupancy forecast for tomorrow onwards"""
+        today = date.today()
+        with self._lock:
+            if self._through != today - timedelta(days=1):
+                self._refresh(today)
+            model = self._models[ward]
+            # Step 1 is today, which is not complete yet
+            predicted = np.maximum(model.forecast(days + 1)[1:], 0)
+            spread = 1.96 * model.sigma * np.sqrt(np.arange(2, days + 2))
+
+        beds = self.capacity(ward)
+        return [{
+            'date': (today + timedelta(days=i + 1)).strftime('%Y-%m-%d'),
+            'ward': ward,
+            'predicted_count': int(round(count)),
+            'lower': int(max(round(count - spread[i]), 0)),
+            'upper': int(round(count + spread[i])),
+            'capacity': beds,
+            # Demand above capacity shows in predicted_count; the rate stops at full
+            'predicted_occupancy': round(min(count / beds, 1) * 100, 1) if beds else None
+        } for i, count in enumerate(predicted)]
+
+    def invalidate(self):
+        """Refit on the next forecast"""
+        with self._lock:
+            self._fitted_on = None
+            self._through = None
+
+
+# Initialize global instance
+occupancy_forecaster = OccupancyForecaster()
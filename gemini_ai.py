@@ -5,12 +5,22 @@ import google.generativeai as genai
 from config import Config
 import json
 from database import Database
+from prompt_cache import PromptCache
+from cache import SingleFlight
 
 class GeminiAI:
     """Advanced AI features using Google Gemini"""
     
     def __init__(self):
         """Initialize Gemini AI"""
+        self._flight = SingleFlight('GeminiAI._generate')
+        self.cache = None
+        if Config.GEMINI_CACHE_PATH:
+            self.cache = PromptCache(
+                Config.GEMINI_CACHE_PATH,
+                max_entries=Config.GEMINI_CACHE_MAX_ENTRIES,
+                ttls=Config.GEMINI_CACHE_TTLS
+            )
         try:
             if Config.GEMINI_API_KEY and Config.GEMINI_API_KEY != 'YOUR_GEMINI_API_KEY_HERE':
                 genai.configure(api_key=Config.GEMINI_API_KEY)
@@ -49,8 +59,7 @@ class GeminiAI:
             Keep response concise (3-4 sentences).
             """
             
-            response = self.model.generate_content(context)
-            return response.text
+            return self._generate('generate_patient_insights', context)
         except Exception as e:
             print(f"Gemini AI error: {e}")
             return self._basic_insights(patient_data, medical_history)
@@ -77,8 +86,7 @@ class GeminiAI:
             Format as numbered list. Keep concise.
             """
             
-            response = self.model.generate_content(context)
-            return response.text
+            return self._generate('generate_treatment_plan', context)
         except Exception as e:
             print(f"Gemini AI error: {e}")
             return self._basic_treatment(diagnosis)
@@ -103,8 +111,7 @@ class GeminiAI:
             Keep response brief and clear.
             """
             
-            response = self.model.generate_content(context)
-            return response.text
+            return self._generate('analyze_symptoms', context)
         except Exception as e:
             return "Error analyzing symptoms. Please consult a healthcare professional."
     
@@ -125,9 +132,9 @@ class GeminiAI:
             Format as bullet points. Be specific but concise.
             """
             
-            response = self.model.generate_content(context)
+            text = self._generate('predict_complications', context)
             # Parse response into list
-            complications = [line.strip('- •').strip() for line in response.text.split('\n') if line.strip()]
+            complications = [line.strip('- •').strip() for line in text.split('\n') if line.strip()]
             return complications[:5]  # Limit to 5
         except Exception as e:
             return ["Monitor for any unusual symptoms", "Maintain prescribed medication schedule", "Regular vital sign checks"]
@@ -155,8 +162,7 @@ class GeminiAI:
             Professional medical format. Concise.
             """
             
-            response = self.model.generate_content(context)
-            return response.text
+            return self._generate('generate_discharge_summary', context)
         except Exception as e:
             return self._basic_discharge_summary(admission_data)
     
@@ -181,8 +187,7 @@ class GeminiAI:
             Keep response brief (3-4 sentences).
             """
             
-            response = self.model.generate_content(context)
-            return response.text
+            return self._generate('analyze_hospital_trends', context)
         except Exception as e:
             return "Unable to analyze trends at this time."
     
@@ -202,13 +207,35 @@ class GeminiAI:
             Format as bullet points. Practical and specific advice.
             """
             
-            response = self.model.generate_content(context)
-            tips = [line.strip('- •').strip() for line in response.text.split('\n') if line.strip()]
+            text = self._generate('generate_health_tips', context)
+            tips = [line.strip('- •').strip() for line in text.split('\n') if line.strip()]
             return tips[:5]
         except Exception as e:
             return ["Maintain healthy lifestyle", "Regular medical check-ups", "Balanced diet", "Adequate rest"]
     
     # Helper methods for fallback
+    def _generate(self, method, prompt):
+        """
+        Call the model, reusing a cached response for an identical prompt.
+        Concurrent cache misses for the same prompt share one API call.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(method, Config.GEMINI_MODEL, prompt)
+            if cached is not None:
+                return cached
+        return self._flight.do((method, PromptCache.normalize(prompt)),
+                               self._call_model, method, prompt)
+    
+    def _call_model(self, method, prompt):
+        text = self.model.generate_content(prompt).text
+        if self.cache is not None:
+            self.cache.set(method, Config.GEMINI_MODEL, prompt, text)
+        return text
+    
+    def cache_stats(self):
+        """Response cache metrics (None when the cache is disabled)"""
+        return self.cache.stats() if self.cache is not None else None
+    
     def _format_history(self, history):
         """Format medical history for context"""
         if not history:
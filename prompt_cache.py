@@ -0,0 +1,170 @@
+# prompt_cache.py
+# Persistent LLM response cache shared by every worker process on a host
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+_WHITESPACE = re.compile(r'[ \t]+')
+
+
+class PromptCache:
+    """
+    LRU cache of model responses stored in a SQLite file.
+
+    Entries are keyed by model name and a hash of the normalised prompt, so
+    the indentation and blank lines of the prompt templates do not matter.
+    The file is opened in WAL mode, which lets several gunicorn workers read
+    and write it concurrently and keeps it across restarts. Each method has
+    its own TTL; once ``max_entries`` is exceeded the least recently used
+    entries are dropped.
+
+    Prompts contain patient details, so the file must stay on the server
+    (it is covered by the ``*.db`` rule in .gitignore).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prompt_cache (
+            key TEXT PRIMARY KEY,
+            method TEXT NOT NULL,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_prompt_cache_last_access ON prompt_cache (last_access);
+    """
+
+    # Check the size limit once every this many writes
+    PRUNE_EVERY = 50
+
+    def __init__(self, path, max_entries=5000, ttls=None, default_ttl=86400):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._stats = {}
+
+    def _connect(self):
+        """One connection per thread (sqlite3 connections are not thread-safe)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(self.SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def normalize(prompt):
+        """Strip indentation, trailing spaces and blank lines from a prompt"""
+        lines = (_WHITESPACE.sub(' ', line).strip() for line in prompt.splitlines())
+        return '\n'.join(line for line in lines if line)
+
+    @staticmethod
+    def make_key(model, prompt):
+        normalized = PromptCache.normalize(prompt)
+        return hashlib.sha256(f"{model}\0{normalized}".encode()).hexdigest()
+
+    def _count(self, method, outcome):
+        with self._lock:
+            counters = self._stats.setdefault(method, {'hits': 0, 'misses': 0, 'errors': 0})
+            counters[outcome] += 1
+
+    def get(self, method, model, prompt):
+        """Cached response text, or None"""
+        key = self.make_key(model, prompt)
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT response FROM prompt_cache WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is None:
+                self._count(method, 'misses')
+                return None
+            conn.execute(
+                "UPDATE prompt_cache SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                (now, key)
+            )
+            self._count(method, 'hits')
+            return row[0]
+        except sqlite3.Error as e:
+            print(f"Prompt cache read failed: {e}")
+            self._count(method, 'errors')
+            return None
+
+    def set(self, method, model, prompt, response):
+        """Store a response under the method's TTL"""
+        ttl = self.ttls.get(method, self.default_ttl)
+        if not ttl or response is None:
+            return
+        key = self.make_key(model, prompt)
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute("""
+                INSERT OR REPLACE INTO prompt_cache
+                (key, method, model, response, created_at, expires_at, last_access, hits)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+            """, (key, method, model, response, now, now + ttl, now))
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % self.PRUNE_EVERY == 0
+            if prune:
+                self.prune()
+        except sqlite3.Error as e:
+            print(f"Prompt cache write failed: {e}")
+            self._count(method, 'errors')
+
+    def prune(self):
+        """Drop expired entries, then the least recently used beyond max_entries"""
+        conn = self._connect()
+        conn.execute("DELETE FROM prompt_cache WHERE expires_at <= ?", (time.time(),))
+        excess = conn.execute("SELECT COUNT(*) FROM prompt_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("""
+                DELETE FROM prompt_cache WHERE key IN (
+                    SELECT key FROM prompt_cache ORDER BY last_access LIMIT ?
+                )
+            """, (excess,))
+
+    def clear(self):
+        """Remove every entry"""
+        self._connect().execute("DELETE FROM prompt_cache")
+
+    def stats(self):
+        """Hit/miss counters for this process plus the size of the shared file"""
+        with self._lock:
+            methods = {method: dict(counters) for method, counters in self._stats.items()}
+        hits = sum(c['hits'] for c in methods.values())
+        lookups = hits + sum(c['misses'] for c in methods.values())
+        for counters in methods.values():
+            total = counters['hits'] + counters['misses']
+            counters['hit_rate'] = round(counters['hits'] / total * 100, 1) if total else 0
+        try:
+            entries = self._connect().execute("SELECT COUNT(*) FROM prompt_cache").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return {
+            'path': self.path,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'hits': hits,
+            'misses': lookups - hits,
+            'hit_rate': round(hits / lookups * 100, 1) if lookups else 0,
+            'methods': methods
+        }
@@ -0,0 +1,194 @@
+# query_stats.py
+# Per-statement query instrumentation and slow-query log for the Database layer
+
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from config import Config
+
+slow_query_logger = logging.getLogger('hospital.slow_query')
+
+_COMMENTS = re.compile(r'(--[^\n]*|/\*.*?\*/)', re.S)
+_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'")
+_NUMBERS = re.compile(r'(?<![\w.])-?\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%s|\?')
+_IN_LISTS = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.I)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class _StatementStats:
+    """Counters for one normalised statement"""
+
+    __slots__ = ('calls', 'errors', 'total_ms', 'max_ms', 'histogram',
+                 'rows', 'acquire_total_ms', 'acquire_max_ms', 'sample')
+
+    def __init__(self, bucket_count):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * bucket_count
+        self.rows = 0
+        self.acquire_total_ms = 0.0
+        self.acquire_max_ms = 0.0
+        self.sample = None
+
+
+class QueryStats:
+    """
+    In-process registry of query timings keyed by normalised SQL.
+
+    Literals and placeholders are replaced with ``?`` (and IN lists folded to
+    ``IN (...)``) so every execution of the same statement lands in one entry.
+    At most QUERY_STATS_MAX_STATEMENTS entries are kept; the least recently
+    executed statement is dropped to make room.
+    """
+
+    # Upper bounds of the latency histogram buckets, in milliseconds
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+    _lock = threading.Lock()
+    _stats = OrderedDict()
+    _evicted = 0
+    _normalized = {}
+    _logger_ready = False
+
+    @staticmethod
+    def normalize(query):
+        """Reduce a SQL string to its statement shape"""
+        cached = QueryStats._normalized.get(query)
+        if cached is not None:
+            return cached
+        sql = _COMMENTS.sub(' ', query)
+        sql = _STRINGS.sub('?', sql)
+        sql = _NUMBERS.sub('?', sql)
+        sql = _PLACEHOLDERS.sub('?', sql)
+        sql = _IN_LISTS.sub('IN (...)', sql)
+        sql = _WHITESPACE.sub(' ', sql).strip()
+        # Model queries are string constants, so this memo stays small;
+        # the bound only guards against ad-hoc SQL.
+        if len(QueryStats._normalized) >= 2048:
+            QueryStats._normalized.clear()
+        QueryStats._normalized[query] = sql
+        return sql
+
+    @staticmethod
+    def record(query, params, elapsed, rows=0, acquire=0.0, error=False):
+        """Record one execution (times in seconds)"""
+        if not Config.QUERY_STATS_ENABLED:
+            return
+        statement = QueryStats.normalize(query)
+        elapsed_ms = elapsed * 1000
+        acquire_ms = acquire * 1000
+        bucket = next(i for i, bound in enumerate(QueryStats.BUCKETS_MS) if elapsed_ms <= bound)
+
+        with QueryStats._lock:
+            stats = QueryStats._stats.get(statement)
+            if stats is None:
+                stats = QueryStats._stats[statement] = _StatementStats(len(QueryStats.BUCKETS_MS))
+                # Kept in-process only (params may hold patient data) for tools
+                # such as the index advisor that need a runnable example.
+                stats.sample = (query, tuple(params) if params else ())
+                while len(QueryStats._stats) > Config.QUERY_STATS_MAX_STATEMENTS:
+                    QueryStats._stats.popitem(last=False)
+                    QueryStats._evicted += 1
+            else:
+                QueryStats._stats.move_to_end(statement)
+            stats.calls += 1
+            stats.errors += error
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.histogram[bucket] += 1
+            stats.rows += rows or 0
+            stats.acquire_total_ms += acquire_ms
+            stats.acquire_max_ms = max(stats.acquire_max_ms, acquire_ms)
+
+        if elapsed_ms >= Config.SLOW_QUERY_THRESHOLD_MS:
+            QueryStats._log_slow(statement, elapsed_ms, rows, acquire_ms, error)
+
+    @staticmethod
+    def _log_slow(statement, elapsed_ms, rows, acquire_ms, error):
+        if not QueryStats._logger_ready:
+            QueryStats._setup_logger()
+        slow_query_logger.warning(
+            "%.1f ms rows=%s acquire=%.1f ms%s | %s",
+            elapsed_ms, rows, acquire_ms, ' ERROR' if error else '', statement
+        )
+
+    @staticmethod
+    def _setup_logger():
+        """Attach the slow-query file handler on first use"""
+        with QueryStats._lock:
+            if QueryStats._logger_ready:
+                return
+            path = Config.SLOW_QUERY_LOG
+            if path:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                handler = logging.FileHandler(path)
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                slow_query_logger.addHandler(handler)
+                slow_query_logger.setLevel(logging.WARNING)
+            QueryStats._logger_ready = True
+
+    @staticmethod
+    def _percentile(histogram, calls, fraction):
+        """Approximate percentile as the upper bound of the bucket it falls in"""
+        target = calls * fraction
+        seen = 0
+        for count, bound in zip(histogram, QueryStats.BUCKETS_MS):
+            seen += count
+            if seen >= target:
+                return bound if bound != float('inf') else None
+        return None
+
+    @staticmethod
+    def snapshot(order_by='total_ms', limit=None):
+        """Per-statement stats, most expensive first"""
+        with QueryStats._lock:
+            items = [(statement, s.calls, s.errors, s.total_ms, s.max_ms, list(s.histogram),
+                      s.rows, s.acquire_total_ms, s.acquire_max_ms)
+                     for statement, s in QueryStats._stats.items()]
+
+        labels = [f"<={int(b)}ms" if b != float('inf') else f">{int(QueryStats.BUCKETS_MS[-2])}ms"
+                  for b in QueryStats.BUCKETS_MS]
+        result = []
+        for statement, calls, errors, total_ms, max_ms, histogram, rows, acq_total, acq_max in items:
+            result.append({
+                'statement': statement,
+                'calls': calls,
+                'errors': errors,
+                'total_ms': round(total_ms, 2),
+                'avg_ms': round(total_ms / calls, 3),
+                'max_ms': round(max_ms, 2),
+                'p50_ms': QueryStats._percentile(histogram, calls, 0.50),
+                'p95_ms': QueryStats._percentile(histogram, calls, 0.95),
+                'p99_ms': QueryStats._percentile(histogram, calls, 0.99),
+                'histogram': dict(zip(labels, histogram)),
+                'rows': rows,
+                'avg_rows': round(rows / calls, 1),
+                'acquire_avg_ms': round(acq_total / calls, 3),
+                'acquire_max_ms': round(acq_max, 2)
+            })
+        result.sort(key=lambda s: s[order_by], reverse=True)
+        return result[:limit] if limit else result
+
+    @staticmethod
+    def samples():
+        """One runnable (query, params) example per normalised statement"""
+        with QueryStats._lock:
+            return {statement: s.sample for statement, s in QueryStats._stats.items()}
+
+    @staticmethod
+    def evicted():
+        """Statements dropped to stay within QUERY_STATS_MAX_STATEMENTS"""
+        return QueryStats._evicted
+
+    @staticmethod
+    def reset():
+        """Clear all recorded stats"""
+        with QueryStats._lock:
+            QueryStats._stats.clear()
+            QueryStats._evicted = 0
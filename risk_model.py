@@ -0,0 +1,261 @@
+# risk_model.py
+# Trained 30-day readmission model: offline training and batch inference
+
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import LabelEncoder
+
+from config import Config
+from database import Database
+import risk_scoring
+
+FEATURES = ['age', 'gender', 'diagnosis', 'history_count', 'prior_admissions', 'stay_days']
+
+# One row per discharged admission, with the patient's history as it was at
+# admission time and the date of their next admission (the label)
+_TRAINING_QUERY = """
+    SELECT pr.report_id, pr.patient_id, p.age, p.gender, pr.diagnosis,
+           pr.in_date_time, pr.out_date_time,
+           (SELECT COUNT(*) FROM medicalhistory mh
+            WHERE mh.patient_id = pr.patient_id AND mh.date_time <= pr.in_date_time) as history_count,
+           (SELECT COUNT(*) FROM patientreport prev
+            WHERE prev.patient_id = pr.patient_id AND prev.in_date_time < pr.in_date_time) as prior_admissions,
+           (SELECT MIN(nxt.in_date_time) FROM patientreport nxt
+            WHERE nxt.patient_id = pr.patient_id AND nxt.in_date_time > pr.in_date_time) as next_admission
+    FROM patientreport pr
+    JOIN patient p ON p.patient_id = pr.patient_id
+    WHERE pr.out_date_time IS NOT NULL
+"""
+
+# The same features for each patient's latest admission
+_SCORING_QUERY = """
+    SELECT p.patient_id, p.age, p.gender, pr.diagnosis, pr.in_date_time, pr.out_date_time,
+           (SELECT COUNT(*) FROM medicalhistory mh
+            WHERE mh.patient_id = p.patient_id AND mh.date_time <= pr.in_date_time) as history_count,
+           (SELECT COUNT(*) FROM patientreport prev
+            WHERE prev.patient_id = p.patient_id AND prev.in_date_time < pr.in_date_time) as prior_admissions
+    FROM patient p
+    JOIN patientreport pr ON pr.report_id = (
+        SELECT MAX(last.report_id) FROM patientreport last WHERE last.patient_id = p.patient_id
+    )
+    WHERE p.patient_id IN ({placeholders})
+"""
+
+
+def _normalize(values, fallback):
+    """Lower-cased, stripped strings with blanks replaced by ``fallback``"""
+    return np.array([str(v).strip().lower() if v is not None and str(v).strip() else fallback
+                     for v in values], dtype=object)
+
+
+def _encode(encoder, values, fallback):
+    """LabelEncoder.transform that maps unseen values to ``fallback``"""
+    values = np.where(np.isin(values, encoder.classes_), values, fallback)
+    return encoder.transform(values)
+
+
+def _feature_matrix(frame, encoders, now):
+    """Numeric feature matrix (columns in FEATURES order) for a frame of admissions"""
+    ages = pd.to_numeric(frame['age'], errors='coerce').fillna(risk_scoring.DEFAULT_AGE)
+    discharged = pd.to_datetime(frame['out_date_time']).fillna(pd.Timestamp(now))
+    stay_days = (discharged - pd.to_datetime(frame['in_date_time'])).dt.total_seconds() / 86400
+    return np.column_stack([
+        ages.to_numpy(dtype=float),
+        _encode(encoders['gender'], _normalize(frame['gender'], 'unknown'), 'unknown'),
+        _encode(encoders['diagnosis'], _normalize(frame['diagnosis'], 'other'), 'other'),
+        frame['history_count'].fillna(0).to_numpy(dtype=float),
+        frame['prior_admissions'].fillna(0).to_numpy(dtype=float),
+        stay_days.clip(lower=0).fillna(0).to_numpy(dtype=float)
+    ])
+
+
+def train(path=None, window_days=None, min_rows=None):
+    """
+    Train the readmission classifier on every discharged admission and save
+    it as a new version under ``path``. Returns the manifest, or None when
+    there is not enough labelled data.
+    """
+    path = path or Config.AI_MODEL_PATH
+    window = timedelta(days=window_days or Config.READMISSION_WINDOW_DAYS)
+    min_rows = min_rows or Config.RISK_MODEL_MIN_ROWS
+    now = datetime.now()
+
+    frame = pd.DataFrame(list(Database.stream_query(_TRAINING_QUERY)))
+    if frame.empty:
+        print("No discharged admissions to train on")
+        return None
+    for column in ('in_date_time', 'out_date_time', 'next_admission'):
+        frame[column] = pd.to_datetime(frame[column])
+
+    # Discharges within the last window have no outcome yet unless the
+    # patient is already back
+    readmitted = (frame['next_admission'] - frame['out_date_time']) <= window
+    observed = readmitted | (frame['out_date_time'] <= now - window)
+    frame = frame[observed].reset_index(drop=True)
+    labels = readmitted[observed].to_numpy(dtype=int)
+
+    if len(frame) < min_rows or len(set(labels)) < 2:
+        print(f"Not enough labelled admissions to train ({len(frame)} rows, "
+              f"{int(labels.sum())} readmissions; need {min_rows} rows and both outcomes)")
+        return None
+
+    # Rare diagnoses share one 'other' class so the encoding stays small
+    diagnoses = pd.Series(_normalize(frame['diagnosis'], 'other'))
+    common = diagnoses.value_counts().index[:Config.RISK_MODEL_MAX_DIAGNOSES]
+    encoders = {
+        'gender': LabelEncoder().fit(list(_normalize(frame['gender'], 'unknown')) + ['unknown']),
+        'diagnosis': LabelEncoder().fit(list(common) + ['other'])
+    }
+    X = _feature_matrix(frame, encoders, now)
+
+    stratify = labels if np.bincount(labels).min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, labels, test_size=0.2, random_state=42, stratify=stratify
+    )
+    model = RandomForestClassifier(
+        n_estimators=200, max_depth=8, min_samples_leaf=5,
+        class_weight='balanced', random_state=42, n_jobs=-1
+    )
+    model.fit(X_train, y_train)
+    # Requests score a few hundred rows at most; a worker pool would cost more than it saves
+    model.n_jobs = 1
+
+    probabilities = model.predict_proba(X_test)[:, 1]
+    metrics = {
+        'rows': len(frame),
+        'readmission_rate': round(float(labels.mean()), 4),
+        'test_accuracy': round(float(accuracy_score(y_test, probabilities >= 0.5)), 4),
+        'test_roc_auc': (round(float(roc_auc_score(y_test, probabilities)), 4)
+                         if len(set(y_test)) == 2 else None)
+    }
+
+    version = now.strftime('%Y%m%d%H%M%S')
+    filename = f"readmission-{version}.joblib"
+    os.makedirs(path, exist_ok=True)
+    joblib.dump({'model': model, 'encoders': encoders, 'features': FEATURES},
+                os.path.join(path, filename))
+
+    manifest = {
+        'version': version,
+        'file': filename,
+        'trained_at': now.isoformat(timespec='seconds'),
+        'window_days': window.days,
+        'features': FEATURES,
+        'metrics': metrics
+    }
+    # Write then rename, so a worker never reads a half-written manifest
+    manifest_path = os.path.join(path, ReadmissionModel.MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+class ReadmissionModel:
+    """
+    Serves the latest trained readmission model.
+
+    The artifact named by the manifest is loaded on first use, once per
+    process; a missing or unreadable artifact disables predictions rather
+    than failing requests. Predictions whose confidence is below
+    ``threshold`` are reported as 'Uncertain'.
+    """
+
+    MANIFEST = 'readmission.json'
+
+    def __init__(self, path, threshold=0.7, batch_size=256):
+        self.path = path
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._artifact = None
+        self.manifest = None
+
+    def _load(self):
+        if self._loaded:
+            return self._artifact
+        with self._lock:
+            if not self._loaded:
+                try:
+                    with open(os.path.join(self.path, self.MANIFEST)) as f:
+                        manifest = json.load(f)
+                    self._artifact = joblib.load(os.path.join(self.path, manifest['file']))
+                    self.manifest = manifest
+                except FileNotFoundError:
+                    print("No trained readmission model found; run 'flask train-risk-model'")
+                except Exception as e:
+                    print(f"Error loading readmission model: {e}")
+                self._loaded = True
+        return self._artifact
+
+    def reload(self):
+        """Load the current manifest's artifact on next use"""
+        with self._lock:
+            self._loaded = False
+            self._artifact = None
+            self.manifest = None
+
+    @property
+    def available(self):
+        return self._load() is not None
+
+    def predict(self, patient_ids):
+        """
+        Readmission predictions for patients' latest admissions, as
+        {patient_id: prediction}. Patients never admitted are omitted.
+        """
+        artifact = self._load()
+        ids = list(dict.fromkeys(int(pid) for pid in patient_ids))
+        if artifact is None or not ids:
+            return {}
+
+        predictions = {}
+        now = datetime.now()
+        try:
+            for start in range(0, len(ids), self.batch_size):
+                chunk = ids[start:start + self.batch_size]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                rows = Database.execute_query(
+                    _SCORING_QUERY.format(placeholders=placeholders), tuple(chunk)
+                )
+                if not rows:
+                    continue
+                frame = pd.DataFrame(rows)
+                X = _feature_matrix(frame, artifact['encoders'], now)
+                probabilities = artifact['model'].predict_proba(X)[:, 1]
+                for pid, probability in zip(frame['patient_id'], probabilities):
+                    predictions[int(pid)] = self._describe(float(probability))
+        except Exception as e:
+            print(f"Error in readmission prediction: {e}")
+        return predictions
+
+    def _describe(self, probability):
+        confidence = max(probability, 1 - probability)
+        if confidence < self.threshold:
+            outcome = 'Uncertain'
+        else:
+            outcome = 'Likely' if probability >= 0.5 else 'Unlikely'
+        return {
+            'readmission_probability': round(probability, 3),
+            'confidence': round(confidence, 3),
+            'prediction': outcome,
+            'model_version': self.manifest['version']
+        }
+
+
+# Initialize global instance
+readmission_model = ReadmissionModel(
+    Config.AI_MODEL_PATH,
+    threshold=Config.PREDICTION_CONFIDENCE_THRESHOLD,
+    batch_size=Config.RISK_MODEL_BATCH_SIZE
+)
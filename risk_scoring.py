@@ -0,0 +1,128 @@
+# risk_scoring.py
+# Rule-based patient risk and health scores
+#
+# Kept free of database imports so both HealthAI (ai_features.py) and the
+# precomputed patient_risk table (database.PatientRiskModel) can use it.
+
+import numpy as np
+
+# Patients without a recorded age are scored as this age
+DEFAULT_AGE = 30
+
+LEVEL_COLORS = {
+    'High': 'danger',
+    'Medium': 'warning',
+    'Low': 'success',
+    'Unknown': 'secondary'
+}
+
+
+def age_points(age):
+    """Age factor (0-30 points)"""
+    if age > 70:
+        return 30
+    if age > 60:
+        return 20
+    if age > 50:
+        return 10
+    if age < 5:
+        return 15
+    return 0
+
+
+def risk_score(age, history_count, admission_count):
+    """Risk score (0-100) from age, medical history and admission counts"""
+    age = DEFAULT_AGE if age is None else age
+    score = age_points(age)
+    # Medical history factor (0-35 points)
+    score += min((history_count or 0) * 5, 35)
+    # Admission history factor (0-35 points)
+    score += min((admission_count or 0) * 7, 35)
+    return min(score, 100)
+
+
+def risk_level(score):
+    """Low / Medium / High band for a risk score"""
+    if score >= 70:
+        return 'High'
+    if score >= 40:
+        return 'Medium'
+    return 'Low'
+
+
+def risk_levels(scores):
+    """Vectorised risk_level() for an array of scores"""
+    scores = np.asarray(scores)
+    return np.select([scores >= 70, scores >= 40], ['High', 'Medium'], 'Low')
+
+
+def recommendations(score, age):
+    """Care recommendations for a risk score"""
+    age = DEFAULT_AGE if age is None else age
+    if score >= 70:
+        advice = ['Immediate medical attention recommended',
+                  'Consider ICU monitoring',
+                  'Frequent vital signs monitoring required']
+    elif score >= 40:
+        advice = ['Regular medical check-ups advised',
+                  'Monitor for any symptom changes',
+                  'Maintain prescribed medication schedule']
+    else:
+        advice = ['Maintain healthy lifestyle',
+                  'Annual check-up recommended',
+                  'Continue preventive care']
+    if age > 65:
+        advice.append('Age-specific health screening advised')
+    return advice
+
+
+def health_score(age, total_visits, total_admissions):
+    """Health score (40-100); the inverse view used by patient insights"""
+    age = DEFAULT_AGE if age is None else age
+    score = 100
+    if age > 70:
+        score -= 15
+    elif age > 60:
+        score -= 10
+    score -= min((total_visits or 0) * 3, 30)
+    score -= min((total_admissions or 0) * 5, 25)
+    return max(score, 40)
+
+
+def score_arrays(ages, history_counts, admission_counts):
+    """
+    Vectorised risk_score() for many patients at once. Takes equal-length
+    sequences (None ages are scored as DEFAULT_AGE) and returns the points of
+    each factor plus the capped total, all as integer arrays.
+    """
+    ages = np.asarray(ages, dtype=float)
+    ages = np.where(np.isnan(ages), DEFAULT_AGE, ages)
+    history = np.nan_to_num(np.asarray(history_counts, dtype=float))
+    admissions = np.nan_to_num(np.asarray(admission_counts, dtype=float))
+    
+    # Same bands as age_points(), first match wins
+    age_pts = np.select([ages > 70, ages > 60, ages > 50, ages < 5], [30, 20, 10, 15], 0)
+    history_pts = np.minimum(history * 5, 35).astype(int)
+    admission_pts = np.minimum(admissions * 7, 35).astype(int)
+    return {
+        'age': age_pts.astype(int),
+        'medical_history': history_pts,
+        'admissions': admission_pts,
+        'total': np.minimum(age_pts + history_pts + admission_pts, 100).astype(int)
+    }
+
+
+def describe(score, age, history_count, admission_count):
+    """The risk analysis dict shown on the patient detail page"""
+    level = risk_level(score)
+    return {
+        'risk_score': score,
+        'risk_level': level,
+        'color': LEVEL_COLORS[level],
+        'recommendations': recommendations(score, age),
+        'factors': {
+            'age': DEFAULT_AGE if age is None else age,
+            'history_count': history_count or 0,
+            'admission_count': admission_count or 0
+        }
+    }
@@ -281,12 +281,30 @@ function updateCurrentTime() {
 updateCurrentTime();
 
 /**
- * Fetch and update dashboard stats periodically
+ * Fetch and update dashboard stats periodically.
+ * The last ETag is sent back as If-None-Match, so unchanged stats cost a
+ * bodiless 304 and no DOM work.
  */
+let dashboardStatsEtag = null;
+
 function updateDashboardStats() {
-    fetch('/api/stats')
-        .then(response => response.json())
+    const headers = dashboardStatsEtag ? { 'If-None-Match': dashboardStatsEtag } : {};
+    // no-store: we revalidate ourselves, so keep the browser cache out of the way
+    fetch('/api/stats', { headers, cache: 'no-store' })
+        .then(response => {
+            if (response.status === 304) {
+                return null;
+            }
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            dashboardStatsEtag = response.headers.get('ETag');
+            return response.json();
+        })
         .then(data => {
+            if (!data) {
+                return;
+            }
             // Update stat cards if they exist
             const statElements = {
                 'total_patients': document.querySelector('[data-stat="total_patients"]'),
@@ -304,9 +322,18 @@ function updateDashboardStats() {
         .catch(err => console.error('Error fetching stats:', err));
 }
 
-// Update stats every 30 seconds if on dashboard
+// Update stats every 30 seconds if on dashboard (skipped while the tab is hidden)
 if (window.location.pathname === '/' || window.location.pathname === '/dashboard') {
-    setInterval(updateDashboardStats, 30000);
+    setInterval(() => {
+        if (!document.hidden) {
+            updateDashboardStats();
+        }
+    }, 30000);
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) {
+            updateDashboardStats();
+        }
+    });
 }
 
 /**
@@ -0,0 +1,56 @@
+# test_admin.py
+# Access to the admin endpoints and the bounded per-statement stats behind them
+
+import pytest
+
+from app import app
+from config import Config
+from query_stats import QueryStats
+
+LOCAL = {'REMOTE_ADDR': '127.0.0.1'}
+
+
+@pytest.fixture
+def client(db):
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_token_is_required_when_configured(client, monkeypatch):
+    monkeypatch.setattr(Config, 'ADMIN_API_TOKEN', 's3cret')
+    assert client.get('/api/db/stats', environ_base=LOCAL).status_code == 403
+    wrong = client.get('/api/db/stats', headers={'Authorization': 'Bearer nope'})
+    assert wrong.status_code == 403
+    allowed = client.get('/api/db/stats', headers={'Authorization': 'Bearer s3cret'})
+    assert allowed.status_code == 200 and 'queries_evicted' in allowed.get_json()
+
+
+def test_without_a_token_only_direct_local_requests_in_debug_mode(client, monkeypatch):
+    monkeypatch.setattr(Config, 'ADMIN_API_TOKEN', None)
+    monkeypatch.setitem(app.config, 'DEBUG', True)
+    assert client.get('/api/db/stats', environ_base=LOCAL).status_code == 200
+    assert client.get('/api/db/stats', environ_base={'REMOTE_ADDR': '10.0.0.8'}).status_code == 403
+    # A reverse proxy on the same host makes every request local
+    proxied = client.get('/api/db/stats', environ_base=LOCAL,
+                         headers={'X-Forwarded-For': '203.0.113.9'})
+    assert proxied.status_code == 403
+
+
+def test_without_a_token_the_endpoint_is_closed_outside_debug_mode(client, monkeypatch):
+    monkeypatch.setattr(Config, 'ADMIN_API_TOKEN', None)
+    monkeypatch.setitem(app.config, 'DEBUG', False)
+    assert client.get('/api/db/stats', environ_base=LOCAL).status_code == 403
+
+
+def test_statement_stats_are_bounded(monkeypatch):
+    monkeypatch.setattr(Config, 'QUERY_STATS_MAX_STATEMENTS', 3)
+    QueryStats.reset()
+    try:
+        for table in ('a', 'b', 'c', 'a', 'd'):
+            QueryStats.record(f"SELECT * FROM {table}", None, 0.001)
+        statements = {entry['statement'] for entry in QueryStats.snapshot()}
+        # b was the least recently executed when d arrived
+        assert statements == {'SELECT * FROM a', 'SELECT * FROM c', 'SELECT * FROM d'}
+        assert QueryStats.evicted() == 1
+    finally:
+        QueryStats.reset()
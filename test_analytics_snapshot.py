@@ -0,0 +1,57 @@
+# test_analytics_snapshot.py
+# Incremental Parquet export: appended rows, deletes and the periodic full rewrite
+
+import sqlite3
+
+import pytest
+
+import analytics_snapshot
+from analytics_snapshot import SnapshotAnalytics
+from config import Config
+from database import MedicalHistoryModel, PatientModel
+
+
+@pytest.fixture
+def history(db):
+    patient_id = PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+    return [MedicalHistoryModel.add_history(patient_id, 'Asthma', 'Inhaler', f'2026-0{i + 1}-10 09:00:00')
+            for i in range(3)]
+
+
+def exported_ids(path, table='medicalhistory', key='history_id'):
+    return sorted(SnapshotAnalytics(path)._table(table)[key].tolist())
+
+
+def delete_out_of_band(table, key, value):
+    """A delete the app never sees, so no data version moves"""
+    conn = sqlite3.connect(Config.SQLITE_PATH)
+    conn.execute("PRAGMA foreign_keys = OFF")
+    conn.execute(f"DELETE FROM {table} WHERE {key} = ?", (value,))
+    conn.commit()
+    conn.close()
+
+
+def test_new_rows_are_appended(history, tmp_path):
+    path = str(tmp_path / 'snapshot')
+    analytics_snapshot.export(path)
+    patient_id = PatientModel.add_patient('Ben', 51, 'Male', '555-0102')
+    added = MedicalHistoryModel.add_history(patient_id, 'Flu', 'Rest', '2026-05-01 08:00:00')
+
+    manifest = analytics_snapshot.export(path)
+    assert len(manifest['tables']['medicalhistory']['parts']) == 2
+    assert exported_ids(path) == sorted(history + [added])
+
+
+def test_untracked_delete_is_dropped_by_the_periodic_full_rewrite(history, tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot')
+    analytics_snapshot.export(path)
+    delete_out_of_band('medicalhistory', 'history_id', history[0])
+
+    # Version unchanged and no full rewrite due: the table is left alone
+    analytics_snapshot.export(path)
+    assert exported_ids(path) == history
+
+    monkeypatch.setattr(Config, 'ANALYTICS_SNAPSHOT_FULL_HOURS', 0)
+    manifest = analytics_snapshot.export(path)
+    assert exported_ids(path) == history[1:]
+    assert len(manifest['tables']['medicalhistory']['parts']) == 1
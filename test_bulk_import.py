@@ -0,0 +1,95 @@
+# test_bulk_import.py
+# BulkImporter: chunked inserts and resuming after a failed chunk
+
+import csv
+import os
+
+import pytest
+
+from bulk_import import BulkImporter
+from database import Database
+
+ROWS = 10
+
+
+def write_patients(path, count=ROWS):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'age', 'gender', 'contact_info'])
+        for i in range(count):
+            writer.writerow([f'Imported {i}', 30 + i, 'F' if i % 2 else 'M', f'555-{i:04d}'])
+
+
+def imported_names():
+    rows = Database.execute_query("SELECT name FROM patient ORDER BY patient_id")
+    return [row['name'] for row in rows]
+
+
+def progress_rows():
+    return Database.execute_query("SELECT rows_read FROM import_progress")
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = str(tmp_path / 'patients.csv')
+    write_patients(path)
+    return path
+
+
+@pytest.fixture
+def fail_third_chunk(monkeypatch):
+    execute_many = Database.execute_many
+    calls = []
+
+    def flaky(query, rows):
+        # PatientRiskModel.refresh() uses execute_many too; count chunk inserts only
+        if 'INSERT INTO patient (' in query:
+            calls.append(len(rows))
+            if len(calls) == 3:
+                raise RuntimeError('connection lost')
+        return execute_many(query, rows)
+
+    monkeypatch.setattr(Database, 'execute_many', staticmethod(flaky))
+    return monkeypatch
+
+
+def test_import_commits_every_chunk(db, source):
+    summary = BulkImporter('patients', source, chunk_size=4).run()
+    assert summary['completed'] and summary['inserted'] == ROWS
+    assert [chunk['rows'] for chunk in summary['chunks']] == [4, 4, 2]
+    assert imported_names() == [f'Imported {i}' for i in range(ROWS)]
+    assert progress_rows() == []
+
+
+def test_failed_chunk_resumes_without_duplicates(db, source, fail_third_chunk):
+    first = BulkImporter('patients', source, chunk_size=3).run()
+    assert not first['completed'] and 'connection lost' in first['error']
+    assert first['inserted'] == 6
+    assert progress_rows()[0]['rows_read'] == 6
+
+    fail_third_chunk.undo()
+    second = BulkImporter('patients', source, chunk_size=3).run()
+    assert second['completed'] and second['resumed_from_row'] == 6
+    assert second['inserted'] == 4
+    assert imported_names() == [f'Imported {i}' for i in range(ROWS)]
+    assert progress_rows() == []
+    # Every imported patient was scored in the chunk that inserted it
+    scored = Database.execute_query("SELECT COUNT(*) as n FROM patient_risk")[0]['n']
+    assert scored == ROWS
+
+
+def test_changed_file_is_not_resumed_until_restarted(db, source, fail_third_chunk):
+    BulkImporter('patients', source, chunk_size=3).run()
+    fail_third_chunk.undo()
+    write_patients(source, count=ROWS + 2)
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime, stat.st_mtime + 5))
+
+    importer = BulkImporter('patients', source, chunk_size=3)
+    with pytest.raises(RuntimeError, match='changed since'):
+        importer.run()
+
+    importer.clear_progress()
+    summary = importer.run()
+    assert summary['completed'] and summary['resumed_from_row'] == 0
+    assert summary['inserted'] == ROWS + 2
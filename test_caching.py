@@ -0,0 +1,89 @@
+# test_caching.py
+# Patient entity cache and staff reference data: invalidation by data version and primary-only fills
+
+import sqlite3
+
+from cache import LRUCache
+from config import Config
+from database import Database, PatientModel, StaffModel
+
+
+def patient_cache():
+    return LRUCache.registry['patients']
+
+
+def test_repeat_reads_are_served_from_cache(db):
+    patient_id = PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+    assert PatientModel.get_patient_by_id(patient_id)['name'] == 'Ana'
+    hits = patient_cache().stats()['hits']
+    assert PatientModel.get_patient_by_id(patient_id)['name'] == 'Ana'
+    assert patient_cache().stats()['hits'] == hits + 1
+
+
+def test_update_is_visible_after_commit_and_inside_the_transaction(db):
+    patient_id = PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+    PatientModel.get_patient_by_id(patient_id)
+    with Database.transaction():
+        PatientModel.update_patient(patient_id, 'Anna', 35, 'Female', '555-0101')
+        assert PatientModel.get_patient_by_id(patient_id)['name'] == 'Anna'
+    assert PatientModel.get_patient_by_id(patient_id)['name'] == 'Anna'
+
+
+def test_write_from_another_process_retires_cached_rows(db, monkeypatch):
+    # Versions are re-read on every call instead of every DATA_VERSION_TTL seconds
+    monkeypatch.setattr(Config, 'DATA_VERSION_TTL', 0)
+    patient_id = PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+    PatientModel.get_patient_by_id(patient_id)
+
+    # Another worker: writes and bumps the version without touching our cache
+    other = sqlite3.connect(Config.SQLITE_PATH)
+    other.execute("UPDATE patient SET name = 'Anna' WHERE patient_id = ?", (patient_id,))
+    other.execute("UPDATE data_version SET version = version + 1 WHERE table_name = 'patient'")
+    other.commit()
+    other.close()
+
+    assert PatientModel.get_patient_by_id(patient_id)['name'] == 'Anna'
+
+
+def lagging_replica(tmp_path, monkeypatch):
+    """Route replica reads to a copy of the database as it is now"""
+    replica_path = str(tmp_path / 'replica.db')
+    source = sqlite3.connect(Config.SQLITE_PATH)
+    target = sqlite3.connect(replica_path)
+    source.backup(target)
+    source.close()
+    target.close()
+    replica = Database._new_pool({'database': replica_path})
+    monkeypatch.setattr(Database, 'acquire_read', staticmethod(replica.acquire))
+    return replica
+
+
+def test_cache_is_filled_from_the_primary_not_a_lagging_replica(db, tmp_path, monkeypatch):
+    patient_id = PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+    # The replica stops here: it never sees the rename below
+    replica = lagging_replica(tmp_path, monkeypatch)
+    PatientModel.update_patient(patient_id, 'Anna', 35, 'Female', '555-0101')
+
+    try:
+        stale = Database.execute_query("SELECT name FROM patient WHERE patient_id = %s", (patient_id,))
+        assert stale[0]['name'] == 'Ana'
+
+        assert PatientModel.get_patient_by_id(patient_id)['name'] == 'Anna'
+        cached = [value for key, value in patient_cache()._entries.items() if key[0] == patient_id]
+        assert [entry[0]['name'] for entry in cached] == ['Anna']
+    finally:
+        replica.close_all()
+
+
+def test_staff_reference_data_is_loaded_from_the_primary(db, tmp_path, monkeypatch):
+    role_id = Database.execute_query("INSERT INTO staffrole (role_name) VALUES ('Doctor')", fetch=False)
+    StaffModel.add_staff('Dr. Old', role_id, 'Morning')
+    assert [member['name'] for member in StaffModel.get_all_staff()] == ['Dr. Old']
+
+    replica = lagging_replica(tmp_path, monkeypatch)
+    try:
+        StaffModel.add_staff('Dr. New', role_id, 'Evening')
+        names = [member['name'] for member in StaffModel.get_staff_by_role('Doctor')]
+        assert names == ['Dr. Old', 'Dr. New']
+    finally:
+        replica.close_all()
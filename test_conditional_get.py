@@ -0,0 +1,88 @@
+# test_conditional_get.py
+# ETag revalidation on the JSON endpoints, before and after a write
+
+import time
+
+import pytest
+
+from app import app
+from config import Config
+from database import Database
+
+
+@pytest.fixture
+def client(db):
+    app.config['TESTING'] = True
+    # Not used as a context manager: a preserved request context would make
+    # the test's own queries join that request's (finished) session
+    return app.test_client()
+
+
+def add_patient(client, name):
+    response = client.post('/patient/add', data={
+        'name': name, 'age': '40', 'gender': 'Female', 'contact_info': '555-0100'
+    })
+    assert response.status_code == 302
+
+
+@pytest.mark.parametrize('path', ['/api/patients/search?q=Pat', '/api/stats'])
+def test_unchanged_data_is_answered_with_304(client, path):
+    add_patient(client, 'Pat One')
+    first = client.get(path)
+    assert first.status_code == 200 and first.headers['ETag']
+
+    again = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['ETag'] == first.headers['ETag']
+
+
+@pytest.mark.parametrize('path', ['/api/patients/search?q=Pat', '/api/stats'])
+def test_write_changes_the_etag(client, path):
+    add_patient(client, 'Pat One')
+    first = client.get(path)
+
+    add_patient(client, 'Pat Two')
+    after = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200
+    assert after.headers['ETag'] != first.headers['ETag']
+
+
+def test_search_results_include_the_new_patient(client):
+    add_patient(client, 'Pat One')
+    first = client.get('/api/patients/search?q=Pat')
+    add_patient(client, 'Pat Two')
+    after = client.get('/api/patients/search?q=Pat',
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert sorted(row['name'] for row in after.get_json()) == ['Pat One', 'Pat Two']
+
+
+def test_stats_count_the_new_patient(client):
+    add_patient(client, 'Pat One')
+    assert client.get('/api/stats').get_json()['total_patients'] == 1
+    add_patient(client, 'Pat Two')
+    assert client.get('/api/stats').get_json()['total_patients'] == 2
+
+
+def test_if_modified_since_expires_with_the_revalidation_period(client, monkeypatch):
+    add_patient(client, 'Pat One')
+    first = client.get('/api/patients/search?q=Pat')
+    since = {'If-Modified-Since': first.headers['Last-Modified']}
+    assert client.get('/api/patients/search?q=Pat', headers=since).status_code == 304
+
+    # Same data, but the next period: the ETag changes, so the date must too
+    later = time.time() + Config.ANALYTICS_CACHE_TTL
+    monkeypatch.setattr(time, 'time', lambda: later)
+    after = client.get('/api/patients/search?q=Pat', headers=since)
+    assert after.status_code == 200
+    assert after.headers['ETag'] != first.headers['ETag']
+
+
+def test_bed_forecast_revalidates_after_capacity_changes(client):
+    path = '/api/ai/bed-occupancy-forecast?ward=icu&days=2'
+    first = client.get(path)
+    assert first.get_json()[0]['capacity'] == 0
+
+    Database.execute_query("INSERT INTO icu (bed_device_id) VALUES ('ICU-1')", fetch=False)
+    after = client.get(path, headers={'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()[0]['capacity'] == 1
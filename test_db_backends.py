@@ -0,0 +1,36 @@
+# test_db_backends.py
+# SQLite backend: MySQL date arithmetic rewritten with MySQL's semantics
+
+import pytest
+
+from database import Database
+
+
+def scalar(query, params=()):
+    return list(Database.execute_query(query, params)[0].values())[0]
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ("DATE_SUB('2026-03-02 12:00:00', INTERVAL 1 DAY)", '2026-03-01 12:00:00'),
+    ("DATE_ADD('2026-03-02', INTERVAL 1 DAY)", '2026-03-03'),
+    ("DATE_SUB('2026-03-31', INTERVAL 1 MONTH)", '2026-02-28'),
+    ("DATE_ADD('2024-02-29 08:15:00', INTERVAL 1 YEAR)", '2025-02-28 08:15:00'),
+    ("DATE_SUB('2026-01-10', INTERVAL -2 DAY)", '2026-01-12'),
+])
+def test_interval_arithmetic(db, expression, expected):
+    assert scalar(f"SELECT {expression} as value") == expected
+
+
+def test_datetime_window_keeps_the_time_of_day(db):
+    patient_id = Database.execute_query(
+        "INSERT INTO patient (name, age, gender, contact_info) VALUES ('Ana', 34, 'Female', '555-0101')",
+        fetch=False
+    )
+    for when in ('2026-03-01 11:00:00', '2026-03-01 13:00:00', '2026-03-02 09:00:00'):
+        Database.execute_query(
+            "INSERT INTO patientreport (patient_id, diagnosis, treatment, in_date_time) "
+            "VALUES (%s, 'fever', 'rest', %s)", (patient_id, when), fetch=False
+        )
+    count = scalar("SELECT COUNT(*) as n FROM patientreport "
+                   "WHERE in_date_time >= DATE_SUB(%s, INTERVAL 1 DAY)", ('2026-03-02 12:00:00',))
+    assert count == 2
@@ -0,0 +1,73 @@
+# test_disease_aggregator.py
+# DiseaseAggregator: catch-up past the watermark and seeding from the snapshot
+
+import sqlite3
+
+import pytest
+
+import analytics_snapshot
+from analytics_snapshot import SnapshotAnalytics
+from config import Config
+from database import Database, DiseaseAggregator, PatientModel
+
+
+@pytest.fixture
+def patient_id(db):
+    return PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+
+
+def add_history(patient_id, disease, history_id=None):
+    if history_id is None:
+        return Database.execute_query(
+            "INSERT INTO medicalhistory (patient_id, disease, treatment, date_time) "
+            "VALUES (%s, %s, 'rest', '2026-03-01 09:00:00')", (patient_id, disease), fetch=False
+        )
+    return Database.execute_query(
+        "INSERT INTO medicalhistory (history_id, patient_id, disease, treatment, date_time) "
+        "VALUES (%s, %s, %s, 'rest', '2026-03-01 09:00:00')", (history_id, patient_id, disease), fetch=False
+    )
+
+
+def frequencies():
+    return {row['disease']: row['frequency'] for row in DiseaseAggregator.top(10)}
+
+
+def test_new_rows_are_counted_once(patient_id, monkeypatch):
+    monkeypatch.setattr(Config, 'DATA_VERSION_TTL', 0)
+    add_history(patient_id, 'Flu')
+    assert frequencies() == {'Flu': 1}
+    add_history(patient_id, 'Flu')
+    add_history(patient_id, 'Asthma')
+    assert frequencies() == {'Flu': 2, 'Asthma': 1}
+    assert frequencies() == {'Flu': 2, 'Asthma': 1}
+
+
+def test_row_committed_below_the_watermark_is_counted(patient_id, monkeypatch):
+    monkeypatch.setattr(Config, 'DATA_VERSION_TTL', 0)
+    add_history(patient_id, 'Flu', history_id=1)
+    add_history(patient_id, 'Flu', history_id=3)
+    assert frequencies() == {'Flu': 2}
+
+    # Id 2 was handed out before id 3 but its transaction committed later
+    add_history(patient_id, 'Asthma', history_id=2)
+    assert frequencies() == {'Flu': 2, 'Asthma': 1}
+
+
+def test_snapshot_source_seeds_from_the_snapshot_then_live_rows(patient_id, tmp_path, monkeypatch):
+    path = str(tmp_path / 'snapshot')
+    old = add_history(patient_id, 'Flu')
+    add_history(patient_id, 'Flu')
+    analytics_snapshot.export(path)
+    monkeypatch.setattr(analytics_snapshot, 'snapshot_analytics', SnapshotAnalytics(path))
+    monkeypatch.setattr(Config, 'ANALYTICS_SOURCE', 'snapshot')
+
+    # Deleted out of band: still in the snapshot, which is what gets counted
+    conn = sqlite3.connect(Config.SQLITE_PATH)
+    conn.execute("DELETE FROM medicalhistory WHERE history_id = ?", (old,))
+    conn.commit()
+    conn.close()
+    add_history(patient_id, 'Asthma')
+
+    DiseaseAggregator.invalidate()
+    assert frequencies() == {'Flu': 2, 'Asthma': 1}
+    assert DiseaseAggregator.top(1)[0]['avg_age'] == 34
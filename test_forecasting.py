@@ -0,0 +1,44 @@
+# test_forecasting.py
+# Bed occupancy forecast: capacity per ward and occupancy bounds
+
+from datetime import datetime, timedelta
+
+from config import Config
+from database import Database, WardModel
+from forecasting import occupancy_forecaster
+
+
+def add_beds(table, count):
+    for _ in range(count):
+        if table == 'generalward':
+            Database.execute_query("INSERT INTO generalward (patient_id) VALUES (NULL)", fetch=False)
+        else:
+            Database.execute_query("INSERT INTO icu (bed_device_id) VALUES ('monitor')", fetch=False)
+
+
+def test_capacity_is_counted_from_the_bed_tables(db, monkeypatch):
+    monkeypatch.setattr(Config, 'GENERAL_WARD_BEDS', 4)
+    assert occupancy_forecaster.capacity('general') == 4
+    add_beds('generalward', 6)
+    add_beds('icu', 2)
+    assert occupancy_forecaster.capacity('general') == 6
+    assert occupancy_forecaster.capacity('icu') == 2
+    assert WardModel.get_available_beds()['total'] == 6
+
+
+def test_forecast_occupancy_never_exceeds_full(db, monkeypatch):
+    patient_id = Database.execute_query(
+        "INSERT INTO patient (name, age, gender, contact_info) VALUES ('Ana', 34, 'Female', '555-0101')",
+        fetch=False
+    )
+    # Five patients in the general ward for the last month, one bed
+    admitted = datetime.now() - timedelta(days=30)
+    for _ in range(5):
+        Database.execute_query(
+            "INSERT INTO patientreport (patient_id, diagnosis, treatment, in_date_time) "
+            "VALUES (%s, 'fever', 'rest', %s)", (patient_id, admitted), fetch=False
+        )
+    monkeypatch.setattr(Config, 'GENERAL_WARD_BEDS', 1)
+    forecast = occupancy_forecaster.forecast('general', 3)
+    assert all(entry['predicted_count'] > 1 for entry in forecast)
+    assert all(entry['predicted_occupancy'] == 100 for entry in forecast)
@@ -0,0 +1,91 @@
+# test_pagination.py
+# Keyset pagination (Database.fetch_page) and the cursors it hands out
+
+import pytest
+
+from config import Config
+from database import (
+    Database, PatientModel, PatientReportModel, decode_cursor, encode_cursor
+)
+
+
+def add_patient(name, age=40):
+    return Database.execute_query(
+        "INSERT INTO patient (name, age, gender, contact_info) VALUES (%s, %s, 'Female', '555-0100')",
+        (name, age), fetch=False
+    )
+
+
+def add_report(patient_id, in_date_time):
+    return Database.execute_query(
+        "INSERT INTO patientreport (patient_id, diagnosis, treatment, in_date_time) "
+        "VALUES (%s, 'fever', 'rest', %s)",
+        (patient_id, in_date_time), fetch=False
+    )
+
+
+def walk(get_page, limit):
+    """Every page's ids, following next_cursor to the end"""
+    pages, cursor = [], None
+    while True:
+        page = get_page(cursor=cursor, limit=limit)
+        pages.append([row['report_id'] if 'report_id' in row else row['patient_id']
+                      for row in page['items']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    values = ['2026-03-01 09:30:00', 42]
+    assert decode_cursor(encode_cursor(values)) == values
+    assert decode_cursor(encode_cursor([None, 7])) == [None, 7]
+
+
+@pytest.mark.parametrize('token', ['not-a-cursor', encode_cursor([1, 2, 3]), encode_cursor({'a': 1})])
+def test_malformed_cursor_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token)
+
+
+def test_patient_pages_cover_every_row_once(db):
+    ids = [add_patient(f'P{i}') for i in range(7)]
+    pages = walk(PatientModel.get_patients_page, limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert sum(pages, []) == sorted(ids, reverse=True)
+
+
+def test_report_pages_break_ties_by_id_and_end_with_undated_rows(db):
+    patient_id = add_patient('P')
+    same_time = '2026-03-01 09:00:00'
+    dated = [add_report(patient_id, when) for when in
+             ('2026-02-01 08:00:00', same_time, same_time, same_time, '2026-04-01 10:00:00')]
+    undated = [add_report(patient_id, None) for _ in range(3)]
+
+    pages = walk(PatientReportModel.get_reports_page, limit=2)
+    expected = [dated[4], dated[3], dated[2], dated[1], dated[0]] + sorted(undated, reverse=True)
+    assert sum(pages, []) == expected
+    assert all(len(page) == 2 for page in pages[:-1])
+
+
+def test_cursor_from_an_undated_row_continues_with_older_undated_rows(db):
+    patient_id = add_patient('P')
+    add_report(patient_id, '2026-02-01 08:00:00')
+    undated = [add_report(patient_id, None) for _ in range(3)]
+    page = PatientReportModel.get_reports_page(cursor=encode_cursor([None, undated[2]]), limit=5)
+    assert [row['report_id'] for row in page['items']] == [undated[1], undated[0]]
+    assert page['next_cursor'] is None
+
+
+def test_risk_filtered_pages(db):
+    ids = [PatientModel.add_patient(f'P{i}', 80 - i, 'Male', '555-0100') for i in range(5)]
+    pages = walk(lambda **kw: PatientModel.get_patients_page(risk_level='Low', **kw), limit=2)
+    assert sorted(sum(pages, [])) == sorted(ids)
+
+
+def test_search_is_capped(db, monkeypatch):
+    for i in range(6):
+        add_patient(f'Match {i}')
+    assert len(PatientModel.search_patients('Match', limit=4)) == 4
+    monkeypatch.setattr(Config, 'SEARCH_RESULTS_LIMIT', 5)
+    assert len(PatientModel.search_patients('Match')) == 5
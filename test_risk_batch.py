@@ -0,0 +1,86 @@
+# test_risk_batch.py
+# Batch risk scoring agrees with the single-patient prediction
+
+import itertools
+from datetime import datetime
+
+import pytest
+
+import risk_scoring
+from ai_features import HealthAI
+from app import app
+from database import (
+    Database, MedicalHistoryModel, PatientModel, PatientReportModel, PatientRiskModel
+)
+
+
+@pytest.fixture
+def patients(db):
+    young = PatientModel.add_patient('Young', 25, 'Female', '555-0101')
+    old = PatientModel.add_patient('Old', 78, 'Male', '555-0102')
+    frequent = PatientModel.add_patient('Frequent', 55, 'Female', '555-0103')
+    for i in range(4):
+        MedicalHistoryModel.add_history(frequent, 'Hypertension', 'Medication', f'2026-0{i + 1}-10 09:00:00')
+    for i in range(3):
+        PatientReportModel.add_report(frequent, 'Chest pain', 'Observation', f'2026-0{i + 1}-12 10:00:00')
+    MedicalHistoryModel.add_history(old, 'Diabetes', 'Insulin', '2026-05-01 08:00:00')
+    return [young, old, frequent]
+
+
+def without_batch_fields(entry):
+    return {key: value for key, value in entry.items() if key not in ('patient_id', 'breakdown')}
+
+
+def test_batch_matches_single_predictions(patients):
+    batch = HealthAI.predict_patient_risk_batch(patients)
+    assert [entry['patient_id'] for entry in batch] == patients
+    for patient_id, entry in zip(patients, batch):
+        assert without_batch_fields(entry) == HealthAI.predict_patient_risk(patient_id)
+        assert sum(entry['breakdown'].values()) == entry['risk_score']
+
+
+def test_batch_reports_the_stored_score(patients):
+    # The batch reads patient_risk like the single prediction does, rather
+    # than rescoring from its own aggregates
+    Database.execute_query("UPDATE patient_risk SET risk_score = 42 WHERE patient_id = %s",
+                           (patients[0],), fetch=False)
+    entry = HealthAI.predict_patient_risk_batch([patients[0]])[0]
+    assert entry['risk_score'] == 42
+    assert entry['risk_score'] == HealthAI.predict_patient_risk(patients[0])['risk_score']
+
+
+def test_patient_without_a_stored_row_is_scored(patients):
+    expected = HealthAI.predict_patient_risk_batch(patients)
+    Database.execute_query("DELETE FROM patient_risk WHERE patient_id = %s", (patients[2],), fetch=False)
+    assert HealthAI.predict_patient_risk_batch(patients) == expected
+    stored = Database.execute_query("SELECT COUNT(*) as n FROM patient_risk")[0]['n']
+    assert stored == len(patients)
+
+
+def test_vectorised_scores_match_the_scoring_rules():
+    rows = [{'patient_id': i, 'age': age, 'history_count': history, 'admission_count': admissions,
+             'last_visit': None, 'last_admission': None}
+            for i, (age, history, admissions) in enumerate(itertools.product(
+                [None, 2, 30, 55, 65, 80], [0, 3, 7, 12], [0, 2, 5, 9]))]
+    for row, scored in zip(rows, PatientRiskModel._score(rows, datetime(2026, 1, 1))):
+        score = risk_scoring.risk_score(row['age'], row['history_count'], row['admission_count'])
+        assert scored['risk_score'] == score
+        assert scored['risk_level'] == risk_scoring.risk_level(score)
+
+
+def test_unknown_ids_keep_their_place(patients):
+    batch = HealthAI.predict_patient_risk_batch([999, patients[1], 999])
+    assert [entry['patient_id'] for entry in batch] == [999, patients[1]]
+    assert batch[0]['risk_level'] == 'Unknown' and batch[0]['recommendations'] == []
+
+
+def test_backfill_command_scores_patients_added_before_the_table(db):
+    for name in ('Ana', 'Ben'):
+        Database.execute_query(
+            "INSERT INTO patient (name, age, gender, contact_info) VALUES (%s, 70, 'Other', '555-0100')",
+            (name,), fetch=False
+        )
+    runner = app.test_cli_runner()
+    assert 'Scored 2 patients' in runner.invoke(args=['backfill-patient-risk']).output
+    assert Database.execute_query("SELECT COUNT(*) as n FROM patient_risk")[0]['n'] == 2
+    assert 'already populated' in runner.invoke(args=['backfill-patient-risk']).output
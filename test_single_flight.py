@@ -0,0 +1,94 @@
+# test_single_flight.py
+# SingleFlight: coalesced results are copies, private to writers, and bounded in wait
+
+import threading
+
+import pytest
+
+from cache import SingleFlight
+from config import Config
+from database import Database, DatabaseSession, PatientModel
+
+
+@pytest.fixture
+def flight(db):
+    return SingleFlight('test')
+
+
+def run_with_waiter(flight, leader_func, waiter_func):
+    """
+    Start a leader running ``leader_func`` in its own unit of work (rolled
+    back afterwards) and, once it is inside, a second caller for the same
+    key. Returns (leader result, waiter result).
+    """
+    inside, release = threading.Event(), threading.Event()
+    results = {}
+
+    def leader_body():
+        inside.set()
+        release.wait(5)
+        return leader_func()
+
+    def leader():
+        session = Database._local.session = DatabaseSession()
+        try:
+            results['leader'] = flight.do('key', leader_body)
+        finally:
+            Database._local.session = None
+            session.rollback()
+            session.close()
+
+    def waiter():
+        results['waiter'] = flight.do('key', waiter_func)
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    inside.wait(5)
+    waiter_thread = threading.Thread(target=waiter)
+    waiter_thread.start()
+    while flight.stats()['coalesced'] == 0 and waiter_thread.is_alive():
+        pass
+    release.set()
+    leader_thread.join(5)
+    waiter_thread.join(5)
+    return results['leader'], results['waiter']
+
+
+def test_waiter_gets_a_copy_of_the_leaders_result(flight):
+    leader, waiter = run_with_waiter(flight, lambda: {'rows': [1, 2]}, lambda: {'rows': ['own']})
+    assert waiter == leader == {'rows': [1, 2]}
+    assert waiter is not leader and waiter['rows'] is not leader['rows']
+    assert flight.stats()['coalesced'] == 1
+
+
+def test_leader_with_uncommitted_writes_does_not_share(flight):
+    def leader_func():
+        # Still uncommitted when the leader finishes, and later rolled back
+        PatientModel.add_patient('Uncommitted', 40, 'Female', '555-0100')
+        return 'leader saw its write'
+
+    leader, waiter = run_with_waiter(flight, leader_func, lambda: 'computed alone')
+    assert leader == 'leader saw its write'
+    assert waiter == 'computed alone'
+
+
+def test_caller_with_pending_writes_is_not_coalesced(flight):
+    with Database.transaction():
+        PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+        assert flight.do('key', lambda: 'mine') == 'mine'
+    assert flight.stats()['bypassed'] == 1 and flight.stats()['calls'] == 0
+
+
+def test_waiter_stops_waiting_for_a_hung_leader(flight, monkeypatch):
+    monkeypatch.setattr(Config, 'DB_POOL_TIMEOUT', 0.05)
+    hung = threading.Event()
+    leader = threading.Thread(target=flight.do, args=('key', lambda: hung.wait(5)))
+    leader.start()
+    while flight.stats()['in_flight'] == 0:
+        pass
+    try:
+        assert flight.do('key', lambda: 'fallback') == 'fallback'
+        assert flight.stats()['timeouts'] == 1
+    finally:
+        hung.set()
+        leader.join(5)
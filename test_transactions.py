@@ -0,0 +1,64 @@
+# test_transactions.py
+# Database.transaction(): commit, rollback and joining an outer unit of work
+
+import pytest
+
+from database import Database, DatabaseSession, PatientModel
+
+
+def patient_count():
+    return Database.execute_query("SELECT COUNT(*) as n FROM patient")[0]['n']
+
+
+def test_transaction_commits_block(db):
+    with Database.transaction():
+        PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+        PatientModel.add_patient('Ben', 51, 'Male', '555-0102')
+    assert patient_count() == 2
+
+
+def test_transaction_rolls_back_when_block_raises(db):
+    with pytest.raises(RuntimeError):
+        with Database.transaction():
+            PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+            raise RuntimeError('boom')
+    assert patient_count() == 0
+    assert Database.current_session() is None
+
+
+def test_joined_block_that_raises_rolls_back_outer_session(db):
+    # A route catches the error and answers normally; its session must not
+    # commit the half-finished block
+    session = DatabaseSession()
+    Database._local.session = session
+    try:
+        PatientModel.add_patient('Kept only if committed', 60, 'Male', '555-0103')
+        try:
+            with Database.transaction():
+                PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+                raise ValueError('bad input')
+        except ValueError:
+            pass
+        assert session.failed
+        session.commit()
+    finally:
+        Database._local.session = None
+        session.close()
+    assert patient_count() == 0
+
+
+def test_release_returns_connections_and_keeps_session_usable(db):
+    session = DatabaseSession()
+    Database._local.session = session
+    try:
+        PatientModel.add_patient('Ana', 34, 'Female', '555-0101')
+        session.release()
+        assert session.conn is None
+        assert Database.pool_stats()['primary']['in_use'] == 0
+        # Released work is committed; later queries borrow again
+        PatientModel.add_patient('Ben', 51, 'Male', '555-0102')
+        session.commit()
+    finally:
+        Database._local.session = None
+        session.close()
+    assert patient_count() == 2